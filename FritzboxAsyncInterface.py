@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+  FritzboxAsyncInterface - asyncio access to the AVM Fritzbox web interface
+  Like Munin, this plugin is licensed under the GNU GPL v2 license
+  http://www.opensource.org/licenses/GPL-2.0
+
+  Fetches independent pages of the Fritzbox concurrently, sharing the
+  keep-alive session and the session id of FritzboxInterface. At most
+  env.fritzbox_pool_size requests run at the same time, so the box is not
+  overloaded.
+"""
+
+import asyncio
+from FritzboxInterface import FritzboxInterface
+
+class FritzboxAsyncInterface:
+  __interface = None
+  __semaphore = None
+
+  # default constructor
+  def __init__(self):
+    self.__interface = FritzboxInterface()
+    self.__semaphore = asyncio.Semaphore(self.__interface.config.poolSize)
+
+  async def getPageWithLogin(self, page, data={}):
+    return await self.__call(self.__interface.getPageWithLogin, page, data)
+
+  async def postPageWithLogin(self, page, data={}):
+    return await self.__call(self.__interface.postPageWithLogin, page, data)
+
+  async def __call(self, method, page, data):
+    """Runs a blocking request of FritzboxInterface in a worker thread.
+
+    :param method: getPageWithLogin or postPageWithLogin of the interface
+    :param page: the page you are requesting
+    :param data: GET parameters or POST data in a map
+    :return: the content of the page
+    """
+    def request():
+      try:
+        return method(page, data)
+      except SystemExit as e:
+        # FritzboxInterface exits on errors, which must not tear down the event loop
+        raise Exception("Couldn't request " + page) from e
+
+    async with self.__semaphore:
+      loop = asyncio.get_running_loop()
+      return await loop.run_in_executor(None, request)
+
+def fetchPages(requests):
+  """Fetches several pages concurrently and waits for all of them.
+
+  :param requests: a list of ('get' or 'post', page, data) tuples
+  :return: the contents of the pages in the order of requests
+  """
+  async def fetch():
+    interface = FritzboxAsyncInterface()
+    calls = []
+    for method, page, data in requests:
+      if method == 'post':
+        calls.append(interface.postPageWithLogin(page, data))
+      else:
+        calls.append(interface.getPageWithLogin(page, data))
+    return await asyncio.gather(*calls)
+
+  return asyncio.run(fetch())
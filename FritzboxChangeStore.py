@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+  FritzboxChangeStore - remembers values derived from the AVM Fritzbox
+  together with what they were derived from, shared by all plugin processes
+  Like Munin, this plugin is licensed under the GNU GPL v2 license
+  http://www.opensource.org/licenses/GPL-2.0
+
+  Some values change rarely, like the external addresses of the box. A plugin
+  stores them with whatever tells that they are still the same, e.g. the
+  start of the connection, and derives them again only when that changed.
+
+  Entries are kept in MUNIN_PLUGSTATE/fritzbox/changes/<box>, one JSON file
+  per key.
+"""
+
+import json
+import os
+
+from FritzboxStateFile import writeStateFile
+
+class FritzboxChangeStore:
+  __statedir = ""
+
+  def __init__(self, config):
+    self.__statedir = os.getenv('MUNIN_PLUGSTATE') + '/fritzbox/changes/' + config.server + '__' + str(config.port)
+
+  def get(self, key):
+    """Returns the stored entry, None if there is none
+
+    :param key: the name of the entry, e.g. energy
+    :return: the map stored with put()
+    """
+    try:
+      with open(self.__getFilename(key), 'r') as entryfile:
+        return json.load(entryfile)
+    except (OSError, ValueError):
+      return None
+
+  def put(self, key, entry):
+    """Stores an entry
+
+    :param key: the name of the entry, e.g. energy
+    :param entry: a map that can be written as JSON
+    """
+    if not os.path.exists(self.__statedir):
+      os.makedirs(self.__statedir)
+    filename = self.__getFilename(key)
+    writeStateFile(filename, json.dumps(entry))
+
+  def __getFilename(self, key):
+    return self.__statedir + '/' + key.replace('/', '_') + '.json'
@@ -0,0 +1,359 @@
+#!/usr/bin/env python3
+"""
+  FritzboxCollector - a collector daemon for the AVM Fritzbox munin plugins
+  Like Munin, this plugin is licensed under the GNU GPL v2 license
+  http://www.opensource.org/licenses/GPL-2.0
+
+  Loads all plugin modules once and runs their fetch in a single long-running
+  process every polling interval. Each page of the Fritzbox is requested only
+  once per interval, even if several plugins need it. The output of every
+  plugin is written to MUNIN_PLUGSTATE/fritzbox/collector, one file per box
+  and plugin, from where the plugins serve their fetch without touching the
+  box.
+
+  Run it with the same environment as the [fritzbox_*] section of munin-node,
+  either as a service or with --once from cron:
+
+  MUNIN_PLUGSTATE [munin plugin state directory]
+  fritzbox_collector_plugins [fritzbox_dsl] [fritzbox_ecostat] ... (optional, default all)
+  fritzbox_collector_interval [seconds between two collections, optional, default 300]
+  fritzbox_collector_jitter [maximum seconds a box is polled late, optional, default 10]
+
+  The config output of the plugins is kept by FritzboxConfigCache and only
+  generated again when something it depends on changed.
+
+  The plugins use the collected output as long as it is younger than
+  env.fritzbox_collector_maxage seconds (optional, default 330) and fall back
+  to querying the box themselves otherwise.
+
+  With env.fritzbox_targets, the collector, the plugins and the munin-node
+  server poll all boxes listed in that file, see FritzboxTargets.
+
+  Every box is polled after a random delay of up to the jitter, so boxes and
+  collectors started at the same instant do not all send their requests at
+  once. --timings prints how long every endpoint of the boxes took, as
+  recorded by FritzboxScheduler.
+"""
+
+import importlib
+import io
+import os
+import random
+import sys
+import threading
+import time
+
+import FritzboxStatistics
+
+INTERVAL = 300
+MAXAGE = 330
+JITTER = 10
+
+# plugin module -> function printing the plugin's fetch output
+FETCH = {
+  'fritzbox_collector_stats': lambda m: m.print_collector_stats(),
+  'fritzbox_connection_uptime': lambda m: m.FritzboxConnectionUptime().printUptime(),
+  'fritzbox_dsl': lambda m: m.print_dsl_stats(),
+  'fritzbox_ecostat': lambda m: m.print_system_stats(),
+  'fritzbox_energy': lambda m: m.print_energy_stats(),
+  'fritzbox_link_saturation': lambda m: m.print_link_saturation(),
+  'fritzbox_smart_home_temperature': lambda m: m.printSmartHomeTemperature(),
+  'fritzbox_traffic': lambda m: m.FritzboxTraffic().printTraffic(),
+  'fritzbox_wifi_load': lambda m: m.print_wifi_load(),
+}
+
+# plugin module -> function printing the plugin's config output
+CONFIG = {
+  'fritzbox_collector_stats': lambda m: m.print_config(),
+  'fritzbox_connection_uptime': lambda m: m.FritzboxConnectionUptime().printConfig(),
+  'fritzbox_dsl': lambda m: m.print_config(),
+  'fritzbox_ecostat': lambda m: m.print_config(),
+  'fritzbox_energy': lambda m: m.print_config(),
+  'fritzbox_link_saturation': lambda m: m.print_config(),
+  'fritzbox_smart_home_temperature': lambda m: m.printConfig(),
+  'fritzbox_traffic': lambda m: m.FritzboxTraffic().printConfig(),
+  'fritzbox_wifi_load': lambda m: m.print_config(),
+}
+
+# plugin module -> independent pages requested by its fetch, these are
+# requested concurrently before the plugins run
+PREFETCH = {
+  'fritzbox_dsl': lambda m: [m.get_request()],
+  'fritzbox_ecostat': lambda m: [('post', m.PAGE, m.PARAMS)],
+  'fritzbox_energy': lambda m: [('post', m.PAGE, m.PARAMS)],
+  'fritzbox_link_saturation': lambda m: [('get', m.PAGE, m.PARAMS)],
+}
+
+def get_cache_filename(plugin, config):
+  return os.getenv('MUNIN_PLUGSTATE') + '/fritzbox/collector/' + config.server + '__' + str(config.port) + '__' + plugin + '.fetch'
+
+def printCachedFetch(plugin, config=None):
+  """print the fetch output of a plugin collected by the daemon
+
+  :param plugin: the plugin module name, e.g. fritzbox_dsl
+  :param config: the FritzboxConfig of the box, None for the box of the environment
+  :return: True if fresh output was printed, False if the plugin has to fetch itself
+  """
+  if config is None:
+    from FritzboxConfig import FritzboxConfig
+    config = FritzboxConfig()
+  filename = get_cache_filename(plugin, config)
+  maxage = int(os.getenv('fritzbox_collector_maxage', MAXAGE))
+  try:
+    if time.time() - os.path.getmtime(filename) > maxage:
+      return False
+    with open(filename, 'r') as cachefile:
+      output = cachefile.read()
+  except OSError:
+    return False
+  sys.stdout.write(output)
+  return True
+
+# the buffer of every thread capturing plugin output, see capture
+_captured = threading.local()
+
+class _CapturingStdout:
+  """sys.stdout while plugins are captured, what a capturing thread prints
+  goes to its buffer, what any other thread prints to the real stdout"""
+  __stdout = None
+
+  def __init__(self, stdout):
+    self.__stdout = stdout
+
+  def __getattr__(self, name):
+    return getattr(self.__stdout, name)
+
+  def write(self, text):
+    buffer = getattr(_captured, 'buffer', None)
+    if buffer is None:
+      return self.__stdout.write(text)
+    return buffer.write(text)
+
+def capture(function, module):
+  """run a plugin function and return everything it printed, None on failure.
+  Several threads may capture at the same time."""
+  if not isinstance(sys.stdout, _CapturingStdout):
+    sys.stdout = _CapturingStdout(sys.stdout)
+  buffer = io.StringIO()
+  _captured.buffer = buffer
+  try:
+    function(module)
+  except (Exception, SystemExit) as e:
+    print("Couldn't collect " + module.__name__ + ": " + str(e), file=sys.stderr)
+    return None
+  finally:
+    _captured.buffer = None
+  return buffer.getvalue()
+
+def get_targets():
+  """the boxes of env.fritzbox_targets, None to poll the box of the environment"""
+  if not os.getenv('fritzbox_targets'):
+    return None
+  from FritzboxTargets import getTargets
+  return getTargets()
+
+def join_targets(plugin, targets, outputs, config=False):
+  """the output of a plugin for all boxes, None if it failed for every box"""
+  from FritzboxTargets import targetOutput
+
+  sections = [targetOutput(t, plugin, o, config) for t, o in zip(targets, outputs) if o is not None]
+  if not sections:
+    return None
+  return ''.join(sections)
+
+def capture_config(plugin, module=None):
+  """the config output of a plugin for the box of the current thread, from
+  the config cache unless something it depends on changed, see FritzboxConfigCache
+
+  :param module: the plugin module, None to import it only if the output is generated
+  :return: the config output, None on failure
+  """
+  from FritzboxConfig import FritzboxConfig
+  from FritzboxConfigCache import FritzboxConfigCache
+
+  cache = FritzboxConfigCache(FritzboxConfig(), plugin)
+  output = cache.get()
+  if output is None:
+    output = capture(CONFIG[plugin], module or importlib.import_module(plugin))
+    if output is not None:
+      cache.put(output)
+  return output
+
+def run(plugin, module, config=False):
+  """run config or fetch of a plugin for the box of the environment or, with
+  env.fritzbox_targets, for all boxes
+
+  :param module: the plugin module, for the config None to import it only if it is not cached
+  :return: everything printed, None on failure
+  """
+  def execute():
+    if config:
+      return capture_config(plugin, module)
+    return capture(FETCH[plugin], module)
+
+  from FritzboxScheduler import flush
+
+  targets = get_targets()
+  try:
+    if targets is None:
+      return execute()
+
+    from FritzboxTargets import forEachTarget
+    outputs = forEachTarget(targets, lambda target: execute())
+    return join_targets(plugin, targets, outputs, config)
+  finally:
+    # the munin-node server runs for long, so its timings are not left until it exits
+    flush()
+
+def printCachedConfig(plugin):
+  """print the config output of a plugin for the box of the environment or,
+  with env.fritzbox_targets, for all boxes, from the config cache if possible
+
+  :param plugin: the plugin module name, e.g. fritzbox_dsl
+  """
+  output = run(plugin, None, config=True)
+  if output is None:
+    sys.exit("Couldn't get the config of " + plugin)
+  sys.stdout.write(output)
+
+def printTargets(plugin):
+  """print the fetch output of a plugin for all boxes of env.fritzbox_targets
+
+  :param plugin: the plugin module name, e.g. fritzbox_dsl
+  :return: True if printed, False if the plugin polls the box of the environment itself
+  """
+  if not os.getenv('fritzbox_targets'):
+    return False
+  output = run(plugin, importlib.import_module(plugin))
+  if output is None:
+    sys.exit("Couldn't run " + plugin + " for any box")
+  sys.stdout.write(output)
+  return True
+
+def write_cache(plugin, config, output):
+  from FritzboxStateFile import writeStateFile
+
+  filename = get_cache_filename(plugin, config)
+  statedir = os.path.dirname(filename)
+  if not os.path.exists(statedir):
+    os.makedirs(statedir)
+  writeStateFile(filename, output)
+
+def get_plugins():
+  if os.getenv('fritzbox_collector_plugins'):
+    return os.getenv('fritzbox_collector_plugins').split(' ')
+  return list(FETCH.keys())
+
+def load_modules(plugins):
+  # a long running process can afford importing NumPy for the statistics
+  FritzboxStatistics.useNumpy()
+  modules = {}
+  for plugin in plugins:
+    try:
+      modules[plugin] = importlib.import_module(plugin)
+    except Exception as e:
+      print("Couldn't load " + plugin + ": " + str(e), file=sys.stderr)
+  return modules
+
+def prefetch(modules):
+  """request the pages of all plugins concurrently, filling the page cache"""
+  from FritzboxAsyncInterface import fetchPages
+
+  requests = []
+  for plugin, module in modules.items():
+    if plugin in PREFETCH:
+      for request in PREFETCH[plugin](module):
+        if request not in requests:
+          requests.append(request)
+  try:
+    fetchPages(requests)
+  except (Exception, SystemExit) as e:
+    # the plugins request the pages again and report the error themselves
+    print("Couldn't prefetch pages: " + str(e), file=sys.stderr)
+
+def collect_box(modules, jitter=0):
+  """fetch all plugins once for the box of the current thread
+
+  :param jitter: the maximum seconds to wait before the first request
+  :return: a map of plugin -> output, None for plugins that failed
+  """
+  time.sleep(random.uniform(0, jitter))
+  prefetch(modules)
+  return {plugin: capture(FETCH[plugin], module) for plugin, module in modules.items()}
+
+def collect(modules, jitter=0):
+  """fetch all plugins once, requesting every page of every box only once"""
+  from FritzboxConfig import FritzboxConfig
+  from FritzboxInterface import FritzboxInterface
+  from FritzboxScheduler import flush
+
+  # the box of the environment, the plugins look for their output under it
+  # with env.fritzbox_targets as well
+  config = FritzboxConfig()
+  targets = get_targets()
+  FritzboxInterface.enablePageCache()
+  try:
+    if targets is None:
+      outputs = collect_box(modules, jitter)
+    else:
+      from FritzboxTargets import forEachTarget
+      boxes = forEachTarget(targets, lambda target: collect_box(modules, jitter))
+      outputs = {plugin: join_targets(plugin, targets, [box[plugin] for box in boxes]) for plugin in modules}
+    for plugin, output in outputs.items():
+      if output is not None:
+        write_cache(plugin, config, output)
+  finally:
+    FritzboxInterface.disablePageCache()
+    flush()
+
+def print_timings():
+  """print the time every endpoint of every box took"""
+  from FritzboxConfig import FritzboxConfig
+  from FritzboxScheduler import FritzboxScheduler
+
+  def timings():
+    config = FritzboxConfig()
+    return config.server, FritzboxScheduler(config).getTimings()
+
+  targets = get_targets()
+  if targets is None:
+    boxes = [timings()]
+  else:
+    from FritzboxTargets import forEachTarget
+    boxes = forEachTarget(targets, lambda target: timings())
+
+  def mean(timing, key, count='count', scale=1000):
+    return timing.get(key, 0) / timing[count] * scale if timing.get(count) else 0
+
+  print('{:<16} {:<36} {:>6} {:>6} {:>8} {:>8} {:>8} {:>8} {:>8} {:>8} {:>8} {:>6}'.format(
+    'box', 'endpoint', 'count', 'errors', 'mean ms', 'max ms', 'conn ms', 'tls ms', 'ttfb ms', 'parse ms', 'bytes', 'reused'))
+  for server, endpoints in boxes:
+    for endpoint, timing in sorted(endpoints.items()):
+      # TR-064 actions have no requests of their own
+      count, total = ('actions', 'action') if not timing.get('count') and timing.get('actions') else ('count', 'total')
+      # only requests keep their maximum
+      maximum = '{:.1f}'.format(timing['max'] * 1000) if 'max' in timing else '-'
+      print('{:<16} {:<36} {:>6} {:>6} {:>8.1f} {:>8} {:>8.1f} {:>8.1f} {:>8.1f} {:>8.1f} {:>8.0f} {:>6}'.format(
+        server, endpoint, timing.get(count, 0), timing.get('errors', 0), mean(timing, total, count), maximum,
+        mean(timing, 'connect'), mean(timing, 'tls'), mean(timing, 'ttfb'), mean(timing, 'parse', 'parses'),
+        mean(timing, 'bytes', scale=1), timing.get('reused', 0)))
+
+def main():
+  if len(sys.argv) == 2 and sys.argv[1] == '--timings':
+    print_timings()
+    return
+
+  modules = load_modules(get_plugins())
+  jitter = float(os.getenv('fritzbox_collector_jitter', JITTER))
+  if len(sys.argv) == 2 and sys.argv[1] == '--once':
+    collect(modules, jitter)
+    return
+
+  interval = int(os.getenv('fritzbox_collector_interval', INTERVAL))
+  while True:
+    started = time.time()
+    collect(modules, jitter)
+    time.sleep(max(0, interval - (time.time() - started)))
+
+if __name__ == "__main__":
+  main()
@@ -1,4 +1,5 @@
 import os
+import threading
 
 class FritzboxConfig:
   """the server address of the Fritzbox (ip or name)"""
@@ -11,14 +12,49 @@ class FritzboxConfig:
   password = ""
   useTls = True
   certificateFile = os.getenv('MUNIN_CONFDIR') + '/box.cer'
+  """seconds to wait for the Fritzbox to connect and to answer a request"""
+  timeout = 30
+  """number of keep-alive connections kept open to the Fritzbox"""
+  poolSize = 2
+  # settings of the box the current thread polls, see FritzboxTargets
+  __target = threading.local()
+  # the fritzbox_* variables of the box this config is for
+  __settings = None
 
   # default constructor
   def __init__(self):
-      if os.getenv('fritzbox_ip'):
-        self.server = os.getenv('fritzbox_ip')
-      self.user = os.getenv('fritzbox_user')
-      self.password = os.getenv('fritzbox_password')
-      if os.getenv('fritzbox_certificate'):
-        self.certificateFile = os.getenv('fritzbox_certificate')
-      if os.getenv('fritzbox_use_tls'):
-        self.useTls = os.getenv('fritzbox_use_tls') == 'true'
\ No newline at end of file
+      self.__settings = getattr(FritzboxConfig.__target, 'settings', None) or {}
+      getenv = self.getenv
+
+      if getenv('fritzbox_ip'):
+        self.server = getenv('fritzbox_ip')
+      self.user = getenv('fritzbox_user')
+      self.password = getenv('fritzbox_password')
+      if getenv('fritzbox_certificate'):
+        self.certificateFile = getenv('fritzbox_certificate')
+      if getenv('fritzbox_use_tls'):
+        self.useTls = getenv('fritzbox_use_tls') == 'true'
+      if getenv('fritzbox_port'):
+        self.port = int(getenv('fritzbox_port'))
+      if getenv('fritzbox_timeout'):
+        self.timeout = float(getenv('fritzbox_timeout'))
+      if getenv('fritzbox_pool_size'):
+        self.poolSize = int(getenv('fritzbox_pool_size'))
+
+  def getenv(self, name, default=None):
+    """Returns a fritzbox_* variable of the box, from its section of the
+    targets file if it is one of several, else from the environment
+
+    :param name: the name of the variable, e.g. fritzbox_max_requests
+    :param default: the value if it is not set
+    """
+    return self.__settings.get(name, os.getenv(name, default))
+
+  @staticmethod
+  def setTarget(settings):
+    """Makes every config created by the current thread use settings before
+    the environment, so the thread polls another box.
+
+    :param settings: a map of fritzbox_* variables, None for the box of the environment
+    """
+    FritzboxConfig.__target.settings = settings
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+  FritzboxConfigCache - keeps the config output of the plugins, so that
+  munin's config runs do not query the AVM Fritzbox
+  Like Munin, this plugin is licensed under the GNU GPL v2 license
+  http://www.opensource.org/licenses/GPL-2.0
+
+  [fritzbox_*]
+  env.fritzbox_config_maxage [seconds a config output is served, optional, default 86400]
+
+  The config output of a plugin is generated once per box and kept in
+  MUNIN_PLUGSTATE/fritzbox/config/<box>. It is generated again when
+
+  - a setting of the plugins changed, i.e. any lower case environment
+    variable like dsl_modes, or the plugin file was replaced,
+  - the fetch of the plugin found that the capabilities of the box the config
+    depends on changed: the line sync rate for fritzbox_dsl, the link rate
+    for fritzbox_traffic, a reconnect for fritzbox_connection_uptime, the
+    devices for fritzbox_smart_home_temperature and the recorded endpoints for
+    fritzbox_collector_stats,
+  - it is older than the maximum age, in case a change was not noticed.
+"""
+
+import json
+import os
+import time
+
+from FritzboxStateFile import writeStateFile
+
+MAXAGE = 86400
+
+def getSettingsDigest(plugin):
+  """a digest of the settings of munin-node's configuration and of the plugin file"""
+  import hashlib
+  from importlib.util import find_spec
+
+  # munin-node's env.* settings are lower case, unlike PATH, MUNIN_* and the like
+  settings = sorted((name, value) for name, value in os.environ.items() if name.islower())
+  source = plugin
+  spec = find_spec(plugin)
+  try:
+    stat = os.stat(spec.origin)
+    source = [spec.origin, stat.st_mtime, stat.st_size]
+  except (AttributeError, TypeError, OSError):
+    pass
+  return hashlib.blake2b(json.dumps([settings, source]).encode('utf-8'), digest_size=16).hexdigest()
+
+class FritzboxConfigCache:
+  __filename = ""
+  __plugin = ""
+  __maxage = MAXAGE
+
+  def __init__(self, config, plugin):
+    """
+    :param config: the FritzboxConfig of the box
+    :param plugin: the plugin module name, e.g. fritzbox_dsl
+    """
+    self.__filename = os.getenv('MUNIN_PLUGSTATE') + '/fritzbox/config/' + config.server + '__' + str(config.port) + '/' + plugin
+    self.__plugin = plugin
+    self.__maxage = int(config.getenv('fritzbox_config_maxage', MAXAGE))
+
+  def get(self):
+    """Returns the stored config output, None if it has to be generated again"""
+    entry = self.__load('.config')
+    if entry is None:
+      return None
+    if (time.time() - entry['time'] > self.__maxage or entry['settings'] != getSettingsDigest(self.__plugin)
+        or entry['capabilities'] != self.getCapabilities()):
+      return None
+    return entry['output']
+
+  def put(self, output):
+    """Stores the config output generated for the current settings and capabilities"""
+    self.__save('.config', {'time': time.time(), 'settings': getSettingsDigest(self.__plugin),
+                            'capabilities': self.getCapabilities(), 'output': output})
+
+  def getCapabilities(self):
+    """Returns the capabilities last recorded by the fetch of the plugin, None if there are none"""
+    return self.__load('.capabilities')
+
+  def setCapabilities(self, capabilities):
+    """Records what the config output depends on, a change makes it generated again
+
+    :param capabilities: anything that can be written as JSON, e.g. the line sync rate
+    """
+    # JSON has no tuples, compare what will be read back
+    capabilities = json.loads(json.dumps(capabilities))
+    if capabilities != self.getCapabilities():
+      self.__save('.capabilities', capabilities)
+
+  def __load(self, suffix):
+    try:
+      with open(self.__filename + suffix, 'r') as entryfile:
+        return json.load(entryfile)
+    except (OSError, ValueError):
+      return None
+
+  def __save(self, suffix, entry):
+    statedir = os.path.dirname(self.__filename)
+    if not os.path.exists(statedir):
+      os.makedirs(statedir)
+    writeStateFile(self.__filename + suffix, json.dumps(entry))
@@ -14,6 +14,13 @@
   env.fritzbox_password [fritzbox password]
   env.fritzbox_user [fritzbox user, set any value if not required]
   env.fritzbox_use_tls [true or false, optional]
+  env.fritzbox_port [port of the web interface, optional, default 443]
+  env.fritzbox_timeout [seconds to wait for the box, optional, default 30]
+  env.fritzbox_pool_size [keep-alive connections to the box, optional, default 2]
+  env.fritzbox_cache_ttl [endpoint=seconds ..., optional, see FritzboxResponseCache]
+  env.fritzbox_endpoint_timeouts [endpoint=seconds ..., optional, see FritzboxScheduler]
+  env.fritzbox_max_requests [requests at the same time, optional, see FritzboxScheduler]
+  env.fritzbox_trace [file to trace every request to, optional, see FritzboxTrace]
 
   This plugin supports the following munin configuration parameters:
   #%# family=auto contrib
@@ -24,22 +31,41 @@
   framp at linux-tips-and-tricks dot de
 """
 
-import hashlib
 import sys
-import os
+import threading
+import time
+from contextlib import contextmanager
 
-import requests
-from lxml import etree
+# requests, lxml and hashlib are imported where they are used, so plugins that
+# do not talk to the box (autoconf, most configs) do not pay for importing them
 from FritzboxConfig import FritzboxConfig
+from FritzboxResponseCache import FritzboxResponseCache
+from FritzboxScheduler import FritzboxScheduler, getEndpoint
+import FritzboxTrace
+from FritzboxSessionStore import FritzboxSessionStore
 
 class FritzboxInterface:
   config = None
   __baseUri = ""
+  __session = None
+  __sessionStore = None
+  __responseCache = None
+  __scheduler = None
+  # keep-alive sessions shared by all interfaces of this process, by base uri
+  __sessions = {}
+  # page contents shared by all interfaces of this process while enabled
+  __pageCache = None
+  # only one thread of this process logs into a box at a time, by base uri
+  __loginLocks = {}
 
   # default constructor
   def __init__(self):
     self.config = FritzboxConfig()
     self.__baseUri = self.__getBaseUri()
+    self.__session = self.__getSession()
+    self.__sessionStore = FritzboxSessionStore(self.config)
+    self.__responseCache = FritzboxResponseCache(self.config)
+    self.__scheduler = FritzboxScheduler(self.config)
 
   def __getBaseUri(self):
     DEFAULT_PORTS = (80, 443)
@@ -49,59 +75,148 @@ class FritzboxInterface:
     else:
         return '{}://{}'.format(SCHEMES[self.config.useTls], self.config.server)
 
+  def __getSession(self):
+    """Returns the keep-alive session for the Fritzbox, so login, GET and POST
+    requests of this process share one TCP/TLS connection pool.
+
+    :return: a configured requests session
+    """
+    if self.__baseUri in FritzboxInterface.__sessions:
+      return FritzboxInterface.__sessions[self.__baseUri]
+
+    import requests
+
+    session = requests.Session()
+    adapter = FritzboxTrace.createAdapter(self.config.poolSize)
+    session.mount(self.__baseUri, adapter)
+    # threads polling the same box concurrently keep the first session
+    return FritzboxInterface.__sessions.setdefault(self.__baseUri, session)
+
+  @staticmethod
+  def enablePageCache():
+    """Remembers every page requested from now on, so a page requested again
+    by any interface of this process is served without a request to the box.
+    """
+    FritzboxInterface.__pageCache = {}
+
+  @staticmethod
+  def disablePageCache():
+    FritzboxInterface.__pageCache = None
+
+  @contextmanager
+  def parsing(self, page, data={}):
+    """Records how long the plugin takes to parse a page within the block
+
+    :param page: the page parsed
+    :param data: the GET parameters or POST data it was requested with
+    """
+    started = time.perf_counter()
+    yield
+    self.__scheduler.recordEvent('parse', getEndpoint(page, data), time.perf_counter() - started)
+
   def getPageWithLogin(self, page, data={}):
-    return self.__callPageWithLogin(self.__get, page, data)
+    return self.__callPageWithCache(self.__get, page, data)
 
   def postPageWithLogin(self, page, data={}):
-    return self.__callPageWithLogin(self.__post, page, data)
-
-  def __saveSessionId(self, session_id):
-    if '__' in self.config.server or '__' in self.config.user:
-      raise Exception("Reserved string \"__\" in server or user name")
-    statedir = os.getenv('MUNIN_PLUGSTATE') + '/fritzbox'
-    if not os.path.exists(statedir):
-      os.makedirs(statedir)
-    statefilename = statedir + '/' + self.config.server + '__' + str(self.config.port) + '__' + self.config.user + '.sid'
-    with open(statefilename, 'w') as statefile:
-      statefile.write(session_id)
-
-  def __loadSessionId(self):
-    statedir = os.getenv('MUNIN_PLUGSTATE') + '/fritzbox'
-    statefilename = statedir + '/' + self.config.server + '__' + str(self.config.port) + '__' + self.config.user + '.sid'
-    if not os.path.exists(statefilename):
-      return None
-    with open(statefilename, 'r') as statefile:
-      session_id = statefile.readline()
-      return session_id
+    return self.__callPageWithCache(self.__post, page, data)
+
+  def __callPageWithCache(self, method, page, data={}):
+    # the session id is added to data by the request itself, so leave it out
+    key = (self.__baseUri, method.__name__, page, tuple(sorted((k, str(v)) for k, v in data.items() if k != 'sid')))
+
+    if FritzboxInterface.__pageCache is None:
+      return self.__callPageWithResponseCache(key, method, page, data)
+
+    if key not in FritzboxInterface.__pageCache:
+      FritzboxInterface.__pageCache[key] = self.__callPageWithResponseCache(key, method, page, data)
+    return FritzboxInterface.__pageCache[key]
+
+  def __callPageWithResponseCache(self, key, method, page, data={}):
+    ttl = self.__responseCache.getTtl(page, data)
+    if ttl <= 0:
+      return self.__callPageWithLogin(method, page, data)
+
+    content = self.__responseCache.get(key, ttl)
+    if content is None:
+      content = self.__callPageWithLogin(method, page, data)
+      self.__responseCache.put(key, content)
+    return content
+
+  def __getDerivedKey(self, iter1, salt1):
+    """Calculates the first, expensive PBKDF2 hash of a challenge, which only
+    depends on the password and a static salt.
+
+    :param iter1: the iterations of the first hash
+    :param salt1: the static salt
+    :return: the hash
+    """
+    import hashlib
+
+    return hashlib.pbkdf2_hmac('sha256', self.config.password.encode('utf-8'), bytes.fromhex(salt1), int(iter1))
+
+  def __getPbkdf2Response(self, challenge, key):
+    """Calculates the response to a PBKDF2 challenge of FRITZ!OS 7.24 and later.
+
+    :param challenge: the challenge in the form 2$iter1$salt1$iter2$salt2
+    :param key: the first hash, see __getDerivedKey
+    :return: the response for login_sid.lua
+    """
+    import hashlib
 
-  def __getSessionId(self):
+    _, _, _, iter2, salt2 = challenge.split('$')
+    hash2 = hashlib.pbkdf2_hmac('sha256', key, bytes.fromhex(salt2), int(iter2))
+    return '{}${}'.format(salt2, hash2.hex())
+
+  def __getMd5Response(self, challenge):
+    """Calculates the response to a legacy MD5 challenge.
+
+    :param challenge: the challenge
+    :return: the response for login_sid.lua
+    """
+    import hashlib
+
+    challenge_bf = ('{}-{}'.format(challenge, self.config.password)).encode('utf-16le')
+    m = hashlib.md5()
+    m.update(challenge_bf)
+    return '{}-{}'.format(challenge, m.hexdigest().lower())
+
+  def __getSessionId(self, useCache=True):
     """Obtains the session id after login into the Fritzbox.
     See https://avm.de/fileadmin/user_upload/Global/Service/Schnittstellen/AVM_Technical_Note_-_Session_ID.pdf
     for details (in German).
 
+    :param useCache: False to ignore a stored PBKDF2 hash
     :return: the session id
     """
+    import requests
+    from lxml import etree
 
+    started = time.perf_counter()
     headers = {"Accept": "application/xml", "Content-Type": "text/plain"}
 
-    url = '{}/login_sid.lua'.format(self.__baseUri)
+    # version 2 offers PBKDF2 challenges, older firmware ignores it and sends MD5 challenges
+    params = {'version': 2}
     try:
-      r = requests.get(url, headers=headers, verify=self.config.certificateFile)
-      r.raise_for_status()
+      r = self.__request(self.__session.get, 'login_sid.lua', params, headers=headers, params=params)
     except (requests.exceptions.HTTPError, requests.exceptions.SSLError) as err:
       print(err)
       sys.exit(1)
 
-    params = {}
     root = etree.fromstring(r.content)
     session_id = root.xpath('//SessionInfo/SID/text()')[0]
     if session_id == "0000000000000000":
+      self.__checkBlockTime(root)
       challenge = root.xpath('//SessionInfo/Challenge/text()')[0]
-      challenge_bf = ('{}-{}'.format(challenge, self.config.password)).encode('utf-16le')
-      m = hashlib.md5()
-      m.update(challenge_bf)
-      response_bf = '{}-{}'.format(challenge, m.hexdigest().lower())
-      params['response'] = response_bf
+      isPbkdf2 = challenge.startswith('2$')
+      if isPbkdf2:
+        # the first hash is stored once a login with it succeeded, so later
+        # logins only calculate the cheap second one
+        _, iter1, salt1, _, _ = challenge.split('$')
+        storedKey = self.__sessionStore.loadDerivedKey(iter1, salt1) if useCache else None
+        key = storedKey if storedKey is not None else self.__getDerivedKey(iter1, salt1)
+        params['response'] = self.__getPbkdf2Response(challenge, key)
+      else:
+        params['response'] = self.__getMd5Response(challenge)
     else:
       return session_id
 
@@ -109,10 +224,8 @@ class FritzboxInterface:
 
     headers = {"Accept": "text/html,application/xhtml+xml,application/xml", "Content-Type": "application/x-www-form-urlencoded"}
 
-    url = '{}/login_sid.lua'.format(self.__baseUri)
     try:
-      r = requests.get(url, headers=headers, params=params, verify=self.config.certificateFile)
-      r.raise_for_status()
+      r = self.__request(self.__session.get, 'login_sid.lua', params, headers=headers, params=params)
     except (requests.exceptions.HTTPError, requests.exceptions.SSLError) as err:
       print(err)
       sys.exit(1)
@@ -120,65 +233,128 @@ class FritzboxInterface:
     root = etree.fromstring(r.content)
     session_id = root.xpath('//SessionInfo/SID/text()')[0]
     if session_id == "0000000000000000":
+      if isPbkdf2 and storedKey is not None:
+        # the stored hash may be outdated by a password change, try once with the password
+        self.__sessionStore.clearDerivedKey()
+        return self.__getSessionId(useCache=False)
+      self.__checkBlockTime(root)
       print("ERROR - No SID received because of invalid password")
       sys.exit(0)
 
-    self.__saveSessionId(session_id)
+    if isPbkdf2 and storedKey is None:
+      self.__sessionStore.saveDerivedKey(iter1, salt1, key)
+    self.__sessionStore.save(session_id)
+    # the time of both requests and of hashing the password
+    self.__scheduler.recordEvent('login', 'login_sid.lua', time.perf_counter() - started)
 
     return session_id
 
+  def __checkBlockTime(self, root):
+    """Backs off and exits if the box refuses logins for a while, as further
+    attempts would only prolong the block.
+
+    :param root: the parsed answer of login_sid.lua
+    """
+    blockTime = root.xpath('//SessionInfo/BlockTime/text()')
+    if blockTime and int(blockTime[0]) > 0:
+      self.__scheduler.recordFailure(int(blockTime[0]))
+      print("The box refuses logins for " + blockTime[0] + " seconds", file=sys.stderr)
+      sys.exit(1)
+
+  def __request(self, method, page, fields, session=None, **kwargs):
+    """Sends a request to the Fritzbox within the limits of the scheduler
+
+    :param method: get or post of the session
+    :param page: the page you are requesting
+    :param fields: GET parameters or POST data in a map
+    :param session: 'stored' or 'new' for the session id the request uses, None for none
+    :return: the response
+    """
+    url = '{}/{}'.format(self.__baseUri, page)
+    with self.__scheduler.request(page, fields) as record:
+      if session:
+        record['session'] = session
+      # verify is passed with every request, requests lets REQUESTS_CA_BUNDLE
+      # take precedence over the verify of a session
+      r = method(url, timeout=self.__scheduler.getTimeout(page, fields), verify=self.config.certificateFile, **kwargs)
+      record['status'] = r.status_code
+      # elapsed ends with the headers of the answer and includes connecting
+      record['ttfb'] = max(0.0, r.elapsed.total_seconds() - record['connect'] - record['tls'])
+      record['bytes'] = len(r.content)
+      r.raise_for_status()
+    return r
+
   def __callPageWithLogin(self, method, page, data={}):
-    session_id = self.__loadSessionId()
+    import requests
+
+    session_id = self.__sessionStore.load()
 
     if session_id != None:
       try:
-        return method(session_id, page, data)
+        content = method(session_id, page, data, 'stored')
+        # every request renews the session on the box, the no_sidrenew=None
+        # of some plugins is dropped by requests and never reaches it
+        self.__sessionStore.touch()
+        return content
       except (requests.exceptions.HTTPError,
              requests.exceptions.SSLError) as e:
         code = e.response.status_code
+        if code == 404:
+          # a page this firmware or user lacks, the caller may fall back to another one
+          raise
         if code != 403:
-          print(e)
+          # stdout is the plugin output parsed by munin
+          print(e, file=sys.stderr)
           sys.exit(1)
 
-    session_id = self.__getSessionId()
-    return method(session_id, page, data)
+    session_id = self.__renewSessionId(session_id)
+    return method(session_id, page, data, 'new')
+
+  def __renewSessionId(self, expired_session_id):
+    """Logs in again, unless another thread or process has done so in the meantime.
 
-  def __post(self, session_id, page, data={}):
+    :param expired_session_id: the session id rejected by the Fritzbox, None if there was none
+    :return: a valid session id
+    """
+    loginLock = FritzboxInterface.__loginLocks.setdefault(self.__baseUri, threading.Lock())
+    with loginLock, self.__sessionStore.lock():
+      session_id = self.__sessionStore.load()
+      if session_id != None and session_id != expired_session_id:
+        return session_id
+      return self.__getSessionId()
+
+  def __post(self, session_id, page, data={}, session=None):
     """Sends a POST request to the Fritzbox and returns the response
 
     :param session_id: a valid session id
     :param page: the page you are regquesting
     :param data: POST data in a map
+    :param session: 'stored' or 'new' for the origin of the session id
     :return: the content of the page
     """
 
-    data['sid'] = session_id
+    # plugins pass module level maps, which threads polling other boxes share
+    data = dict(data, sid=session_id)
 
     headers = {"Accept": "application/json", "Content-Type": "application/x-www-form-urlencoded"}
 
-    url = '{}/{}'.format(self.__baseUri, page)
-
-    r = requests.post(url, headers=headers, data=data, verify=self.config.certificateFile)
-    r.raise_for_status()
+    r = self.__request(self.__session.post, page, data, session, headers=headers, data=data)
 
     return r.content
 
-  def __get(self, session_id, page, data={}):
+  def __get(self, session_id, page, data={}, session=None):
       """Fetches a page from the Fritzbox and returns its content
 
       :param session_id: a valid session id
       :param page: the page you are regquesting
       :param params: GET parameters in a map
+      :param session: 'stored' or 'new' for the origin of the session id
       :return: the content of the page
       """
 
       headers = {"Accept": "application/xml", "Content-Type": "text/plain"}
 
-      params = data
-      params["sid"] = session_id
-      url = '{}/{}'.format(self.__baseUri, page)
-
-      r = requests.get(url, headers=headers, params=params, verify=self.config.certificateFile)
-      r.raise_for_status()
+      params = dict(data, sid=session_id)
+      r = self.__request(self.__session.get, page, params, session, headers=headers, params=params)
 
       return r.content
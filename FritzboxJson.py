@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+  FritzboxJson - reads single values from the JSON responses of the AVM
+  Fritzbox web interface without decoding the whole document
+  Like Munin, this plugin is licensed under the GNU GPL v2 license
+  http://www.opensource.org/licenses/GPL-2.0
+
+  data.lua sends the complete history of every series, while the plugins
+  only print the latest measurement. Decoding the whole response builds a
+  Python object for every value of the history; here the document is only
+  searched for the requested key and just its value, or the last elements of
+  each of its series, are decoded.
+"""
+
+import json
+import re
+
+# characters which may start or end a nested value, or a string within it
+TOKENS = re.compile(rb'[][{}"]')
+WHITESPACE = re.compile(rb'\s*')
+SCALAR = re.compile(rb'[^,\]}\s]*')
+STRING = re.compile(rb'(?:[^"\\]|\\.)*"', re.S)
+
+def findValue(content, key):
+  """decode the value of the first occurrence of a key
+
+  :param content: the JSON document as returned by FritzboxInterface
+  :param key: the name of the key
+  :return: the decoded value
+  """
+  content = _toBytes(content)
+  start = _findKey(content, key)
+  return json.loads(content[start:_findEnd(content, start)])
+
+def lastSeriesValues(content, key):
+  """return the last element of every series of an object, e.g. of
+  {"cpuutil": {"series": [[1, 2, 3]], "labels": [...]}}
+
+  :param content: the JSON document as returned by FritzboxInterface
+  :param key: the name of the key of the object with the series
+  :return: a list with the latest value of each series, None for empty ones
+  """
+  return [tail[-1] if tail else None for tail in seriesTails(content, key, 1)]
+
+def seriesTails(content, key, count):
+  """return the last elements of every series of an object
+
+  :param content: the JSON document as returned by FritzboxInterface
+  :param key: the name of the key of the object with the series
+  :param count: the number of elements to return per series
+  :return: a list with the latest values of each series, oldest first
+  """
+  content = _toBytes(content)
+  pos = _findKey(content, key)
+  pos = _findKey(content, 'series', pos)
+  if content[pos:pos + 1] != b'[':
+    raise ValueError("series of " + key + " is not a list")
+
+  tails = []
+  pos = _skipWhitespace(content, pos + 1)
+  if content[pos:pos + 1] == b']':
+    return tails
+  while True:
+    if content[pos:pos + 1] != b'[':
+      raise ValueError("series of " + key + " contains no list at " + str(pos))
+    end = content.find(b']', pos)
+    if end < 0:
+      raise ValueError("unterminated series of " + key)
+    if TOKENS.search(content, pos + 1, end):
+      # nested values or strings, which might contain a bracket
+      end = _findEnd(content, pos)
+      series = json.loads(content[pos:end])
+      tails.append(series[-count:] if count else [])
+    else:
+      end += 1
+      # only decode the elements after the count-th comma from the end
+      start = end - 1
+      for _ in range(count):
+        start = content.rfind(b',', pos, start)
+        if start < 0:
+          start = pos
+          break
+      tails.append(json.loads(b'[' + content[start + 1:end]) if count else [])
+
+    pos = _skipWhitespace(content, end)
+    if content[pos:pos + 1] == b']':
+      return tails
+    if content[pos:pos + 1] != b',':
+      raise ValueError("series of " + key + " is malformed at " + str(pos))
+    pos = _skipWhitespace(content, pos + 1)
+
+def _toBytes(content):
+  if isinstance(content, str):
+    return content.encode('utf-8')
+  return content
+
+def _skipWhitespace(content, pos):
+  return WHITESPACE.match(content, pos).end()
+
+def _findKey(content, key, pos=0):
+  """the position of the value of a key"""
+  match = re.compile(rb'"' + re.escape(key.encode('utf-8')) + rb'"\s*:\s*').search(content, pos)
+  if match is None:
+    raise ValueError("no " + key + " in response")
+  return match.end()
+
+def _findEnd(content, start):
+  """the position behind the value starting at start"""
+  if content[start:start + 1] not in (b'[', b'{', b'"'):
+    # a number, true, false or null
+    return SCALAR.match(content, start).end()
+
+  depth = 0
+  pos = start
+  while True:
+    match = TOKENS.search(content, pos)
+    if match is None:
+      raise ValueError("unterminated value at " + str(start))
+    token = match.group()
+    pos = match.end()
+    if token == b'"':
+      # skip the string, including escaped quotes
+      match = STRING.match(content, pos)
+      if match is None:
+        raise ValueError("unterminated string at " + str(pos))
+      pos = match.end()
+    elif token in (b'[', b'{'):
+      depth += 1
+    else:
+      depth -= 1
+    if depth == 0:
+      return pos
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+  FritzboxMuninNode - a munin-node compatible server for the AVM Fritzbox plugins
+  Like Munin, this plugin is licensed under the GNU GPL v2 license
+  http://www.opensource.org/licenses/GPL-2.0
+
+  Speaks the munin-node protocol and answers config and fetch requests of the
+  munin master straight from the plugin modules, which are loaded once into
+  this process instead of starting one Python interpreter per plugin and poll.
+  Several masters may be connected at the same time, the plugins themselves
+  run one after another so the box is not queried in parallel.
+
+  Run it with the same environment as the [fritzbox_*] section of munin-node:
+
+  fritzbox_node_host [address to listen on, optional, default 127.0.0.1]
+  fritzbox_node_port [port to listen on, optional, default 4949]
+  fritzbox_node_name [node name reported to the master, optional, default fqdn]
+  fritzbox_collector_plugins [fritzbox_dsl] [fritzbox_ecostat] ... (optional, default all)
+  fritzbox_targets [file listing several boxes, optional, see FritzboxTargets]
+
+  and point the master's host entry to it, e.g. in /etc/munin/munin.conf:
+
+  [home.yourhost.net;fritzbox]
+      address 127.0.0.1
+      port 4949
+      use_node_name yes
+"""
+
+import asyncio
+import os
+import socket
+from concurrent.futures import ThreadPoolExecutor
+
+from FritzboxCollector import get_plugins, load_modules, run
+
+VERSION = 'fritzbox-munin-fast'
+
+class FritzboxMuninNode:
+  __modules = None
+  __name = ""
+  # plugins run one at a time, so the box is not queried in parallel
+  __executor = None
+
+  def __init__(self, modules, name):
+    self.__modules = modules
+    self.__name = name
+    self.__executor = ThreadPoolExecutor(max_workers=1)
+
+  async def __run(self, plugin, config):
+    """run config or fetch of a plugin and return its output terminated by '.'"""
+    if plugin not in self.__modules:
+      return "# Unknown service\n.\n"
+    loop = asyncio.get_running_loop()
+    output = await loop.run_in_executor(self.__executor, run, plugin, self.__modules[plugin], config)
+    if output is None:
+      return "# Bad exit\n.\n"
+    if output and not output.endswith("\n"):
+      output += "\n"
+    return output + ".\n"
+
+  async def __answer(self, line):
+    """answer a single command line of the master, None closes the connection"""
+    parts = line.split()
+    command = parts[0] if parts else ""
+    argument = parts[1] if len(parts) > 1 else ""
+
+    if command == 'list':
+      return ' '.join(self.__modules.keys()) + "\n"
+    if command == 'nodes':
+      return self.__name + "\n.\n"
+    if command == 'config':
+      return await self.__run(argument, True)
+    if command == 'fetch':
+      return await self.__run(argument, False)
+    if command == 'version':
+      return "munins node on " + self.__name + " version: " + VERSION + "\n"
+    if command == 'cap':
+      capabilities = [c for c in parts[1:] if c == 'multigraph']
+      return "cap " + ' '.join(capabilities) + "\n"
+    if command in ('quit', '.'):
+      return None
+    return "# Unknown command. Try cap, list, nodes, config, fetch, version or quit\n"
+
+  async def handle(self, reader, writer):
+    writer.write(("# munin node at " + self.__name + "\n").encode())
+    try:
+      await writer.drain()
+      while True:
+        line = await reader.readline()
+        if not line:
+          break
+        answer = await self.__answer(line.decode(errors='replace').strip())
+        if answer is None:
+          break
+        writer.write(answer.encode())
+        await writer.drain()
+    except ConnectionError:
+      pass
+    finally:
+      writer.close()
+
+async def serve():
+  host = os.getenv('fritzbox_node_host', '127.0.0.1')
+  port = int(os.getenv('fritzbox_node_port', 4949))
+  node = FritzboxMuninNode(load_modules(get_plugins()), os.getenv('fritzbox_node_name', socket.getfqdn()))
+  server = await asyncio.start_server(node.handle, host, port)
+  async with server:
+    await server.serve_forever()
+
+if __name__ == "__main__":
+  asyncio.run(serve())
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+  FritzboxOutput - renders the config and fetch output of the AVM Fritzbox
+  munin plugins
+  Like Munin, this plugin is licensed under the GNU GPL v2 license
+  http://www.opensource.org/licenses/GPL-2.0
+
+  A plugin declares its graphs as Graph and Field specs, e.g.
+
+  Graph('uptime', [Field('uptime', label='uptime', draw='AREA')],
+        title='Uptime', vlabel='uptime in days', category='system')
+
+  The config text of a graph is rendered when it is first needed and kept
+  with it, plugins that keep their graphs per settings (see getGraphs of the
+  plugins) render it once per process, which the collector daemon and the
+  munin-node server run for long. The output of a config or fetch is
+  collected in an OutputBuffer and written with a single write, instead of
+  two per print().
+"""
+
+import sys
+
+# graph attributes without the graph_ prefix
+UNPREFIXED = ('update_rate',)
+
+class Field:
+  name = ""
+  attributes = None
+
+  def __init__(self, name, **attributes):
+    """
+    :param name: the field name, e.g. recv
+    :param attributes: the attributes in the order they are printed, e.g.
+                       label='receive', type='GAUGE', None values are left out
+    """
+    self.name = name
+    self.attributes = attributes
+
+class Graph:
+  name = None
+  fields = None
+  attributes = None
+  __config = None
+
+  def __init__(self, name, fields, **attributes):
+    """
+    :param name: the name of the multigraph, None for the graph of a single graph plugin
+    :param fields: the Fields of the graph
+    :param attributes: the graph attributes in the order they are printed,
+                       without the graph_ prefix, e.g. title='Uptime', None
+                       values are left out
+    """
+    self.name = name
+    self.fields = fields
+    self.attributes = attributes
+
+  def config(self):
+    """the config text of the graph, rendered once"""
+    if self.__config is None:
+      lines = [] if self.name is None else ['multigraph ' + self.name]
+      for key, value in self.attributes.items():
+        if value is not None:
+          lines.append((key if key in UNPREFIXED else 'graph_' + key) + ' ' + str(value))
+      for field in self.fields:
+        prefix = field.name + '.'
+        for key, value in field.attributes.items():
+          if value is not None:
+            lines.append(prefix + key + ' ' + str(value))
+      self.__config = '\n'.join(lines) + '\n'
+    return self.__config
+
+class OutputBuffer:
+  """collects the output of a config or fetch and writes it at once
+
+  with OutputBuffer() as output:
+    output.multigraph('uptime')
+    output.value('uptime', '3.17')
+
+  Nothing is written if the block raises, munin gets no partial output.
+  """
+  __chunks = None
+
+  def __init__(self):
+    self.__chunks = []
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, excType, excValue, traceback):
+    if excType is None:
+      self.write()
+
+  def config(self, graphs):
+    """add the config of graphs
+
+    :param graphs: a Graph or a list of them
+    """
+    if isinstance(graphs, Graph):
+      graphs = [graphs]
+    for graph in graphs:
+      self.__chunks.append(graph.config())
+
+  def multigraph(self, name):
+    self.__chunks.append('multigraph ' + name + '\n')
+
+  def value(self, field, value):
+    """add a value, strings as they are, anything else with str()"""
+    self.__chunks.append(field + '.value ' + (value if isinstance(value, str) else str(value)) + '\n')
+
+  def line(self, text):
+    """add any other line, e.g. a comment"""
+    self.__chunks.append(text + '\n')
+
+  def write(self):
+    if self.__chunks:
+      sys.stdout.write(''.join(self.__chunks))
+      self.__chunks = []
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+  FritzboxResponseCache - an on-disk cache for pages of the AVM Fritzbox web
+  interface, shared by all plugin processes
+  Like Munin, this plugin is licensed under the GNU GPL v2 license
+  http://www.opensource.org/licenses/GPL-2.0
+
+  Only endpoints given a time to live are cached, e.g.
+
+  [fritzbox_*]
+  env.fritzbox_cache_ttl energy=240 ecoStat=240 internet/inetstat_monitor.lua=60
+  env.fritzbox_cache_max_entries [number of cached pages, optional, default 32]
+
+  An endpoint is the page parameter of data.lua requests and the path of the
+  page otherwise. Hits and misses are counted in
+  MUNIN_PLUGSTATE/fritzbox/cache/<box>/stats and graphed by
+  fritzbox_collector_stats.
+"""
+
+import fcntl
+import json
+import os
+import sys
+import time
+
+from FritzboxStateFile import writeStateFile
+
+MAX_ENTRIES = 32
+
+class FritzboxResponseCache:
+  __cachedir = ""
+  __ttls = None
+  __maxEntries = MAX_ENTRIES
+
+  def __init__(self, config):
+    self.__cachedir = os.getenv('MUNIN_PLUGSTATE') + '/fritzbox/cache/' + config.server + '__' + str(config.port)
+    self.__ttls = {}
+    for entry in config.getenv('fritzbox_cache_ttl', '').split():
+      endpoint, ttl = entry.rsplit('=', 1)
+      self.__ttls[endpoint] = int(ttl)
+    if config.getenv('fritzbox_cache_max_entries'):
+      self.__maxEntries = int(config.getenv('fritzbox_cache_max_entries'))
+
+  def getTtl(self, page, data):
+    """Returns the time to live in seconds configured for a request, 0 if it is not cached"""
+    if 'page' in data and data['page'] in self.__ttls:
+      return self.__ttls[data['page']]
+    return self.__ttls.get(page, 0)
+
+  def get(self, key, ttl):
+    """Returns the cached content of a request, None if there is none younger than ttl seconds"""
+    filename = self.__getFilename(key)
+    try:
+      if time.time() - os.path.getmtime(filename) <= ttl:
+        with open(filename, 'rb') as cachefile:
+          content = cachefile.read()
+        self.__count('hits')
+        return content
+    except OSError:
+      pass
+    self.__count('misses')
+    return None
+
+  def put(self, key, content):
+    """Stores the content of a request and evicts the oldest entries beyond the size limit"""
+    try:
+      if not os.path.exists(self.__cachedir):
+        os.makedirs(self.__cachedir, exist_ok=True)
+      writeStateFile(self.__getFilename(key), content)
+      self.__evict()
+    except OSError as e:
+      # the page was fetched, a full disk or the like only costs the next hit
+      print("Couldn't cache the page: " + str(e), file=sys.stderr)
+
+  def getStats(self):
+    """Returns the number of hits and misses of all processes"""
+    try:
+      with open(self.__cachedir + '/stats', 'r') as statsfile:
+        return json.load(statsfile)
+    except (OSError, ValueError):
+      return {'hits': 0, 'misses': 0}
+
+  def __getFilename(self, key):
+    import hashlib
+
+    return self.__cachedir + '/' + hashlib.sha1(repr(key).encode('utf-8')).hexdigest() + '.page'
+
+  def __evict(self):
+    entries = []
+    for name in os.listdir(self.__cachedir):
+      if name.endswith('.page'):
+        filename = self.__cachedir + '/' + name
+        try:
+          entries.append((os.path.getmtime(filename), filename))
+        except OSError:
+          pass
+    entries.sort()
+    for _, filename in entries[:max(0, len(entries) - self.__maxEntries)]:
+      try:
+        os.remove(filename)
+      except OSError:
+        pass
+
+  def __count(self, counter):
+    if not os.path.exists(self.__cachedir):
+      os.makedirs(self.__cachedir)
+    with open(self.__cachedir + '/stats', 'a+') as statsfile:
+      fcntl.flock(statsfile, fcntl.LOCK_EX)
+      statsfile.seek(0)
+      try:
+        stats = json.load(statsfile)
+      except ValueError:
+        stats = {'hits': 0, 'misses': 0}
+      stats[counter] = stats.get(counter, 0) + 1
+      statsfile.seek(0)
+      statsfile.truncate()
+      json.dump(stats, statsfile)
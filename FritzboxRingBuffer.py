@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+  FritzboxRingBuffer - a fixed-size on-disk store for the recent samples of
+  a metric, shared by all plugin processes
+  Like Munin, this plugin is licensed under the GNU GPL v2 license
+  http://www.opensource.org/licenses/GPL-2.0
+
+  Every metric is kept in MUNIN_PLUGSTATE/fritzbox/ring/<box>__<name>.ring,
+  a header followed by a fixed number of records, which is memory-mapped.
+  The header holds the number of records ever appended, the latest record is
+  therefore at that number modulo the capacity. A record is the timestamp
+  and the values of a sample as little endian doubles.
+
+  Appending overwrites the oldest record and takes constant time, reading a
+  range of time finds its start by bisection. Appends hold an exclusive and
+  reads a shared flock on the file, so processes never see a half written
+  record. Samples have to be appended in the order of their timestamps.
+"""
+
+import fcntl
+import mmap
+import os
+import struct
+
+MAGIC = b'FBRB'
+VERSION = 1
+# magic, version, values per record, capacity, number of records appended
+HEADER = struct.Struct('<4sHHIQ')
+# a day of samples every minute
+CAPACITY = 1440
+
+class FritzboxRingBuffer:
+  __filename = ""
+  __fields = 1
+  __capacity = CAPACITY
+  __record = None
+  __fd = None
+  __map = None
+
+  def __init__(self, config, name, fields=1, capacity=CAPACITY):
+    """
+    :param config: the FritzboxConfig of the box
+    :param name: the name of the metric
+    :param fields: the number of values per sample
+    :param capacity: the number of samples kept
+    """
+    self.__filename = os.getenv('MUNIN_PLUGSTATE') + '/fritzbox/ring/' + config.server + '__' + name + '.ring'
+    self.__fields = fields
+    self.__capacity = capacity
+    self.__record = struct.Struct('<' + 'd' * (fields + 1))
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *args):
+    self.close()
+
+  def close(self):
+    if self.__map is not None:
+      self.__map.close()
+      os.close(self.__fd)
+      self.__map = None
+      self.__fd = None
+
+  def append(self, timestamp, values):
+    """add a sample, replacing the oldest one if the buffer is full
+
+    :param timestamp: the time of the sample in seconds since the epoch
+    :param values: a tuple of numbers, as many as fields
+    """
+    self.__open()
+    fcntl.flock(self.__fd, fcntl.LOCK_EX)
+    try:
+      count = HEADER.unpack_from(self.__map, 0)[4]
+      self.__record.pack_into(self.__map, self.__offset(count), timestamp, *values)
+      HEADER.pack_into(self.__map, 0, MAGIC, VERSION, self.__fields, self.__capacity, count + 1)
+    finally:
+      fcntl.flock(self.__fd, fcntl.LOCK_UN)
+
+  def read(self, since=None, until=None):
+    """return the samples of a range of time
+
+    :param since: only samples after this timestamp, None for all
+    :param until: only samples up to this timestamp, None for all
+    :return: a list of (timestamp, values) tuples, oldest first
+    """
+    self.__open()
+    fcntl.flock(self.__fd, fcntl.LOCK_SH)
+    try:
+      count = HEADER.unpack_from(self.__map, 0)[4]
+      first = max(0, count - self.__capacity)
+      if since is not None:
+        # the first sample after since
+        low = first
+        high = count
+        while low < high:
+          middle = (low + high) // 2
+          if self.__timestamp(middle) <= since:
+            low = middle + 1
+          else:
+            high = middle
+        first = low
+
+      samples = []
+      for i in range(first, count):
+        record = self.__record.unpack_from(self.__map, self.__offset(i))
+        if until is not None and record[0] > until:
+          break
+        samples.append((record[0], record[1:]))
+      return samples
+    finally:
+      fcntl.flock(self.__fd, fcntl.LOCK_UN)
+
+  def __offset(self, index):
+    return HEADER.size + (index % self.__capacity) * self.__record.size
+
+  def __timestamp(self, index):
+    return struct.unpack_from('<d', self.__map, self.__offset(index))[0]
+
+  def __open(self):
+    if self.__map is not None:
+      return
+    if not os.path.exists(os.path.dirname(self.__filename)):
+      os.makedirs(os.path.dirname(self.__filename))
+    size = HEADER.size + self.__capacity * self.__record.size
+    fd = os.open(self.__filename, os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+      fcntl.flock(fd, fcntl.LOCK_EX)
+      header = os.pread(fd, HEADER.size, 0)
+      if (os.fstat(fd).st_size != size or len(header) != HEADER.size
+          or HEADER.unpack(header)[:4] != (MAGIC, VERSION, self.__fields, self.__capacity)):
+        # new or of another layout, start empty
+        os.ftruncate(fd, 0)
+        os.ftruncate(fd, size)
+        os.pwrite(fd, HEADER.pack(MAGIC, VERSION, self.__fields, self.__capacity, 0), 0)
+      fcntl.flock(fd, fcntl.LOCK_UN)
+      self.__map = mmap.mmap(fd, size)
+    except OSError:
+      os.close(fd)
+      raise
+    self.__fd = fd
@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+  FritzboxScheduler - keeps the requests of all plugin processes within
+  limits the AVM Fritzbox can bear
+  Like Munin, this plugin is licensed under the GNU GPL v2 license
+  http://www.opensource.org/licenses/GPL-2.0
+
+  [fritzbox_*]
+  env.fritzbox_endpoint_timeouts energy=10 internet/inetstat_monitor.lua=5 (optional,
+                                 seconds per endpoint, default env.fritzbox_timeout)
+  env.fritzbox_max_requests [requests to the box at the same time from all
+                            processes, optional, default env.fritzbox_pool_size]
+
+  An endpoint is the page parameter of data.lua requests and the path of the
+  page otherwise, like for the response cache. Every request holds one of
+  max_requests slot files locked while it runs, so the box never serves more
+  requests of the plugins at once, however many processes are started.
+
+  When the box answers 503 or refuses logins for a BlockTime, all processes
+  stop sending requests to it for BACKOFF_BASE seconds, or the BlockTime if it
+  is longer. Every further failure doubles the time up to BACKOFF_MAX, the
+  first successful request resets it.
+
+  The time every endpoint takes is recorded in
+  MUNIN_PLUGSTATE/fritzbox/scheduler/<box>/timings, FritzboxCollector.py
+  --timings prints it. Besides the count, errors and total, max and last
+  seconds of the requests, the file sums the phases measured by FritzboxTrace,
+  the parse times of the plugins and how often they found a value unchanged,
+  see FritzboxChangeStore. The sums are kept in memory and added to the file
+  by flush(), when the process exits and after every cycle of the collector
+  and poll of the munin-node server.
+"""
+
+import atexit
+import fcntl
+import json
+import os
+import random
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+import FritzboxTrace
+from FritzboxStateFile import writeStateFile
+
+BACKOFF_BASE = 30
+BACKOFF_MAX = 3600
+
+# the sums not yet added to the timings files, per file and endpoint
+_pending = {}
+_pendingLock = threading.Lock()
+
+def getEndpoint(page, data):
+  """the endpoint of a request, the page parameter of data.lua requests and the page otherwise"""
+  if 'page' in data:
+    return str(data['page'])
+  return page
+
+def addTimings(timings, endpoint, values):
+  """add to the sums of an endpoint in a map of timings, keeping the larger 'max' and the later 'last'"""
+  timing = timings.setdefault(endpoint, {})
+  for key, value in values.items():
+    if key == 'max':
+      timing['max'] = max(timing.get('max', 0.0), value)
+    elif key == 'last':
+      timing['last'] = value
+    else:
+      timing[key] = timing.get(key, 0) + value
+
+def flush():
+  """add the sums recorded by this process to the timings files"""
+  with _pendingLock:
+    pending = dict(_pending)
+    _pending.clear()
+  for filename, endpoints in pending.items():
+    statedir = os.path.dirname(filename)
+    if not os.path.exists(statedir):
+      os.makedirs(statedir)
+    with open(filename, 'a+') as timingsfile:
+      fcntl.flock(timingsfile, fcntl.LOCK_EX)
+      timingsfile.seek(0)
+      try:
+        timings = json.load(timingsfile)
+      except ValueError:
+        timings = {}
+      for endpoint, values in endpoints.items():
+        addTimings(timings, endpoint, values)
+      timingsfile.seek(0)
+      timingsfile.truncate()
+      json.dump(timings, timingsfile)
+
+atexit.register(flush)
+
+class FritzboxScheduler:
+  __server = ""
+  __statedir = ""
+  __timeout = 30
+  __timeouts = None
+  __maxRequests = 2
+  __trace = None
+
+  def __init__(self, config):
+    """
+    :param config: the FritzboxConfig of the box
+    """
+    self.__server = config.server
+    self.__statedir = os.getenv('MUNIN_PLUGSTATE') + '/fritzbox/scheduler/' + config.server + '__' + str(config.port)
+    self.__timeout = config.timeout
+    self.__timeouts = {}
+    for entry in config.getenv('fritzbox_endpoint_timeouts', '').split():
+      endpoint, timeout = entry.rsplit('=', 1)
+      self.__timeouts[endpoint] = float(timeout)
+    self.__maxRequests = max(1, config.poolSize)
+    maxRequests = config.getenv('fritzbox_max_requests')
+    if maxRequests:
+      try:
+        maxRequests = int(maxRequests)
+      except ValueError:
+        maxRequests = 0
+      if maxRequests >= 1:
+        self.__maxRequests = maxRequests
+      else:
+        # no slot at all would never let a request through
+        print("fritzbox_max_requests must be at least 1, using " + str(self.__maxRequests), file=sys.stderr)
+    self.__trace = config.getenv('fritzbox_trace')
+
+  def getTimeout(self, page, data):
+    """Returns the seconds to wait for the box to answer a request"""
+    return self.__timeouts.get(getEndpoint(page, data), self.__timeout)
+
+  @contextmanager
+  def request(self, page, data):
+    """Runs a request to the box: exits if the box is backed off, waits for a
+    free slot, then records the time the request takes and whether it failed.
+
+    :param page: the page requested
+    :param data: GET parameters or POST data in a map
+    :return: the record of the request in the trace, the caller may add to it
+    """
+    failures, openUntil = self.__loadBreaker()
+    if openUntil > time.time():
+      print("Backing off from the box for another {:.0f} seconds".format(openUntil - time.time()), file=sys.stderr)
+      sys.exit(1)
+
+    record = {'box': self.__server, 'event': 'request', 'endpoint': getEndpoint(page, data), 'connect': 0.0, 'tls': 0.0}
+    with self.__slot():
+      FritzboxTrace.begin(record)
+      started = time.perf_counter()
+      try:
+        yield record
+      except Exception as e:
+        response = getattr(e, 'response', None)
+        self.__finish(record, time.perf_counter() - started, response.status_code if response is not None else None)
+        if response is not None and response.status_code == 503:
+          self.recordFailure()
+        raise
+      finally:
+        FritzboxTrace.end()
+    self.__finish(record, time.perf_counter() - started, record.get('status', 200))
+    if failures:
+      self.__saveBreaker(0, 0)
+
+  def record(self, endpoint, values):
+    """Adds measurements to the sums of an endpoint
+
+    :param endpoint: the endpoint, e.g. ecoStat
+    :param values: a map of names to numbers, a 'total' also updates 'max' and 'last'
+    """
+    if 'total' in values:
+      values = dict(values, max=values['total'], last=values['total'])
+    with _pendingLock:
+      addTimings(_pending.setdefault(self.__statedir + '/timings', {}), endpoint, values)
+
+  def recordEvent(self, event, endpoint, seconds, values={}):
+    """Records something other than a request to the web interface, in the
+    sums of the endpoint and the trace
+
+    :param event: the kind of event, e.g. parse
+    :param endpoint: the endpoint, e.g. ecoStat
+    :param seconds: how long it took
+    :param values: a map of names to numbers added to the sums of the endpoint
+    """
+    self.record(endpoint, dict(values, **{event: seconds, event + 's': 1}))
+    FritzboxTrace.write({'box': self.__server, 'event': event, 'endpoint': endpoint, 'total': seconds}, self.__trace)
+
+  def __finish(self, record, seconds, status):
+    record['status'] = status
+    record['total'] = seconds
+    failed = status is None or status >= 400
+    values = {'count': 1, 'errors': int(failed), 'total': seconds, 'connect': record['connect'], 'tls': record['tls']}
+    for key in ('ttfb', 'bytes'):
+      if key in record:
+        values[key] = record[key]
+    if record.get('session') == 'stored' and not failed:
+      values['reused'] = 1
+    self.record(record['endpoint'], values)
+    FritzboxTrace.write(record, self.__trace)
+
+  def recordFailure(self, blockTime=0):
+    """Backs off from the box after it refused a request
+
+    :param blockTime: the seconds the box refuses logins, 0 if it did not say
+    """
+    failures, _ = self.__loadBreaker()
+    backoff = min(BACKOFF_BASE * 2 ** failures, BACKOFF_MAX)
+    self.__saveBreaker(failures + 1, time.time() + max(backoff, blockTime))
+
+  def getTimings(self):
+    """Returns the timings recorded by all processes, a map of endpoint ->
+    {'count', 'errors', 'total', 'max', 'last', 'connect', 'tls', 'ttfb',
+    'bytes', 'reused', 'parse', 'parses', 'unchanged', ...} with times in seconds"""
+    flush()
+    try:
+      with open(self.__statedir + '/timings', 'r') as timingsfile:
+        return json.load(timingsfile)
+    except (OSError, ValueError):
+      return {}
+
+  @contextmanager
+  def __slot(self):
+    """Holds one of the slot files locked, waiting if all are taken"""
+    self.__makeStatedir()
+    slots = list(range(self.__maxRequests))
+    random.shuffle(slots)
+    for i, slot in enumerate(slots):
+      slotfile = open(self.__statedir + '/slot' + str(slot), 'w')
+      try:
+        # wait for the last slot tried if all others are taken
+        fcntl.flock(slotfile, fcntl.LOCK_EX if i == len(slots) - 1 else fcntl.LOCK_EX | fcntl.LOCK_NB)
+      except BlockingIOError:
+        slotfile.close()
+        continue
+      try:
+        yield
+      finally:
+        fcntl.flock(slotfile, fcntl.LOCK_UN)
+        slotfile.close()
+      return
+
+  def __loadBreaker(self):
+    """Returns the number of failures in a row and until when the box is backed off"""
+    try:
+      with open(self.__statedir + '/breaker', 'r') as breakerfile:
+        failures, openUntil = breakerfile.read().split()
+      return int(failures), float(openUntil)
+    except (OSError, ValueError):
+      return 0, 0
+
+  def __saveBreaker(self, failures, openUntil):
+    self.__makeStatedir()
+    if failures == 0:
+      try:
+        os.remove(self.__statedir + '/breaker')
+      except OSError:
+        pass
+      return
+    writeStateFile(self.__statedir + '/breaker', '{} {}\n'.format(failures, openUntil))
+
+  def __makeStatedir(self):
+    if not os.path.exists(self.__statedir):
+      os.makedirs(self.__statedir)
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+  FritzboxSessionStore - shares the session id of the AVM Fritzbox web
+  interface between all plugin processes
+  Like Munin, this plugin is licensed under the GNU GPL v2 license
+  http://www.opensource.org/licenses/GPL-2.0
+
+  The session id is kept in MUNIN_PLUGSTATE/fritzbox, one file per box and
+  user. The modification time of the file records when the session was last
+  renewed by a request; the box only drops idle sessions, whatever their age.
+  Sessions idle for almost as long as the box keeps them are dropped
+  proactively, and a lock file makes sure only one process logs in while the
+  others wait and reuse the new session id.
+"""
+
+import fcntl
+import os
+import time
+from contextlib import contextmanager
+
+from FritzboxStateFile import writeStateFile
+
+# the box drops sessions after 20 minutes without a request, keep a margin
+MAX_IDLE = 18 * 60
+
+class FritzboxSessionStore:
+  __filename = ""
+
+  def __init__(self, config):
+    if '__' in config.server or '__' in config.user:
+      raise Exception("Reserved string \"__\" in server or user name")
+    statedir = os.getenv('MUNIN_PLUGSTATE') + '/fritzbox'
+    self.__filename = statedir + '/' + config.server + '__' + str(config.port) + '__' + config.user + '.sid'
+
+  def load(self):
+    """Returns the stored session id, None if there is none or it is about to expire"""
+    try:
+      if time.time() - os.path.getmtime(self.__filename) > MAX_IDLE:
+        return None
+      with open(self.__filename, 'r') as statefile:
+        session_id = statefile.readline().strip()
+    except OSError:
+      return None
+    return session_id or None
+
+  def save(self, session_id):
+    """Stores a freshly issued session id"""
+    statedir = os.path.dirname(self.__filename)
+    if not os.path.exists(statedir):
+      os.makedirs(statedir)
+    writeStateFile(self.__filename, session_id + '\n', 0o600)
+
+  def touch(self):
+    """Records that the stored session was renewed by a request"""
+    try:
+      os.utime(self.__filename)
+    except OSError:
+      pass
+
+  def loadDerivedKey(self, iterations, salt):
+    """Returns the stored PBKDF2 hash of the password for the given salt, None if there is none"""
+    try:
+      with open(self.__filename + '.pbkdf2', 'r') as keyfile:
+        stored_iterations, stored_salt, key = keyfile.readline().strip().split('$')
+    except (OSError, ValueError):
+      return None
+    if stored_iterations != iterations or stored_salt != salt:
+      return None
+    return bytes.fromhex(key)
+
+  def saveDerivedKey(self, iterations, salt, key):
+    """Stores the PBKDF2 hash of the password, it grants access to the box like the password itself"""
+    statedir = os.path.dirname(self.__filename)
+    if not os.path.exists(statedir):
+      os.makedirs(statedir)
+    writeStateFile(self.__filename + '.pbkdf2', iterations + '$' + salt + '$' + key.hex() + '\n', 0o600)
+
+  def clearDerivedKey(self):
+    try:
+      os.remove(self.__filename + '.pbkdf2')
+    except OSError:
+      pass
+
+  @contextmanager
+  def lock(self):
+    """Holds an exclusive lock on the session of this box and user"""
+    statedir = os.path.dirname(self.__filename)
+    if not os.path.exists(statedir):
+      os.makedirs(statedir)
+    with open(self.__filename + '.lock', 'w') as lockfile:
+      fcntl.flock(lockfile, fcntl.LOCK_EX)
+      try:
+        yield
+      finally:
+        fcntl.flock(lockfile, fcntl.LOCK_UN)
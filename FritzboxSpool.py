@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+  FritzboxSpool - keeps the samples a plugin took between two munin fetches
+  Like Munin, this plugin is licensed under the GNU GPL v2 license
+  http://www.opensource.org/licenses/GPL-2.0
+
+  A sampler appends timestamped values to a FritzboxRingBuffer, fetch prints
+  the samples appended since its last run in munin's "field.value
+  epoch:value" format. The ring buffer keeps the latest MAX_SAMPLES, so the
+  spool does not grow while munin is not fetching.
+
+  Plugins whose pages already contain a history print it instead of a spool,
+  remembering only the timestamp of the latest value printed.
+"""
+
+import os
+from FritzboxRingBuffer import FritzboxRingBuffer
+from FritzboxStateFile import writeStateFile
+
+MAX_SAMPLES = 1440
+
+class FritzboxSpool:
+  __filename = ""
+  __ring = None
+
+  def __init__(self, config, name, fields=1, size=MAX_SAMPLES):
+    """
+    :param config: the FritzboxConfig of the box
+    :param name: the name of the spool, e.g. the plugin
+    :param fields: the number of values per sample
+    :param size: the maximum number of samples kept
+    """
+    self.__filename = os.getenv('MUNIN_PLUGSTATE') + '/fritzbox/spool/' + config.server + '__' + name
+    self.__ring = FritzboxRingBuffer(config, name, fields, size)
+
+  def append(self, timestamp, values):
+    """add a sample
+
+    :param timestamp: the time of the sample in seconds since the epoch
+    :param values: a tuple of numbers
+    """
+    with self.__ring:
+      self.__ring.append(int(timestamp), values)
+
+  def drain(self):
+    """return all samples appended since the last drain
+
+    :return: a list of (timestamp, values) tuples, oldest first
+    """
+    with self.__ring:
+      samples = self.__ring.read(since=self.lastEmitted())
+    if samples:
+      self.setLastEmitted(samples[-1][0])
+    return [(int(timestamp), values) for timestamp, values in samples]
+
+  def lastEmitted(self):
+    """the timestamp of the latest sample printed by fetch, None if there is none"""
+    try:
+      with open(self.__filename + '.last', 'r') as lastfile:
+        return int(lastfile.read())
+    except (OSError, ValueError):
+      return None
+
+  def setLastEmitted(self, timestamp):
+    if not os.path.exists(os.path.dirname(self.__filename)):
+      os.makedirs(os.path.dirname(self.__filename))
+    writeStateFile(self.__filename + '.last', str(int(timestamp)))
+
+def getSpoolAttributes(interval):
+  """the graph attributes for samples every interval seconds, none without spool,
+  see FritzboxOutput.Graph"""
+  if not interval:
+    return {}
+  # full resolution for a day, then the usual munin resolutions
+  return {'update_rate': interval, 'data_size': 'custom 1d, 5m for 1w, 30m for 31d, 1d for 2y'}
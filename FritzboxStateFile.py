@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""
+  FritzboxStateFile - replaces the files below MUNIN_PLUGSTATE that several
+  plugin processes read and write at the same time
+  Like Munin, this plugin is licensed under the GNU GPL v2 license
+  http://www.opensource.org/licenses/GPL-2.0
+
+  The content is written to a temporary file of its own in the directory of
+  the target, which then replaces the target. Readers see either the old or
+  the new content, never a half written file, and writers of the same file
+  never share a temporary file.
+"""
+
+import os
+
+def writeStateFile(filename, content, mode=0o644):
+  """replace a file atomically
+
+  :param filename: the file to replace, its directory must exist
+  :param content: a str or bytes
+  :param mode: the permissions of the file, 0o600 for secrets
+  """
+  # tempfile is only needed by plugins which write state
+  import tempfile
+
+  directory, name = os.path.split(filename)
+  # hidden and with a random end, so listings of the directory by suffix never see it
+  fd, tmpfilename = tempfile.mkstemp(prefix='.' + name + '.', dir=directory)
+  try:
+    with open(fd, 'wb' if isinstance(content, bytes) else 'w') as tmpfile:
+      os.fchmod(tmpfile.fileno(), mode)
+      tmpfile.write(content)
+    os.replace(tmpfilename, filename)
+  except BaseException:
+    try:
+      os.remove(tmpfilename)
+    except OSError:
+      pass
+    raise
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+  FritzboxStatistics - parses and summarizes the numeric series sent by the
+  AVM Fritzbox web interface
+  Like Munin, this plugin is licensed under the GNU GPL v2 license
+  http://www.opensource.org/licenses/GPL-2.0
+
+  Series are decoded in one pass into arrays with NumPy if it has been
+  loaded and into lists with int() otherwise. Importing NumPy takes longer
+  than summarizing a few hundred values in Python, so only the long running
+  collector and munin-node server load it, see useNumpy().
+
+  RunningStatistics summarizes series value by value instead, without any
+  copy of the series.
+"""
+
+import heapq
+import math
+
+numpy = None
+
+def useNumpy():
+  """use NumPy for the following series, if it is installed
+
+  :return: True if NumPy is used
+  """
+  global numpy
+  try:
+    import numpy
+  except ImportError:
+    numpy = None
+  return numpy is not None
+
+def parsePairs(text, skip=0, count=None, separator=':'):
+  """decode a comma separated list of pairs like "12:3,14:0"
+
+  :param text: the list as sent by the Fritzbox
+  :param skip: number of leading fields which are no pairs
+  :param count: maximum number of pairs, None for all
+  :param separator: the separator within a pair
+  :return: two arrays or lists with the first and the second values of all pairs
+  """
+  fields = text.split(',')
+  fields = fields[skip:] if count is None else fields[skip:skip + count]
+  if fields == ['']:
+    fields = []
+  # all values interleaved, the first of every pair at even positions
+  text = ','.join(fields).replace(separator, ',')
+  if numpy is not None:
+    values = numpy.fromstring(text, dtype=numpy.int64, sep=',') if fields else numpy.zeros(0, dtype=numpy.int64)
+  else:
+    values = list(map(int, text.split(','))) if fields else []
+  if len(values) != 2 * len(fields):
+    raise ValueError("series contains an incomplete pair")
+  return (values[0::2], values[1::2])
+
+def summarize(values, percentile=95, meanOnly=False):
+  """mean, maximum and percentile of a series
+
+  The mean is rounded down like the plugins always did, the percentile is the
+  nearest rank, i.e. an element of the series.
+
+  :param values: an array or list of integers
+  :param percentile: the percentile to compute
+  :param meanOnly: skip the maximum and the percentile, which are None then
+  :return: a tuple (mean, max, percentile), None for an empty series
+  """
+  length = len(values)
+  if length == 0:
+    return None
+  isArray = numpy is not None and isinstance(values, numpy.ndarray)
+  mean = (int(values.sum()) if isArray else sum(values)) // length
+  if meanOnly:
+    return (mean, None, None)
+  rank = max(0, math.ceil(percentile / 100 * length) - 1)
+  if isArray:
+    return (mean, int(values.max()), int(numpy.partition(values, rank)[rank]))
+  return (mean, max(values), sorted(values)[rank])
+
+class RunningStatistics:
+  """mean, minimum, maximum and an exact percentile of a series, computed in
+  a single pass without copying the series
+
+  Only the values above the percentile are kept, in a heap. Their number
+  follows from the length of the series, which has to be known in advance.
+  """
+  count = 0
+  total = 0
+  minimum = None
+  maximum = None
+  __size = 0
+  __largest = None
+
+  def __init__(self, length, percentile=95):
+    # the percentile is the smallest of the values from the nearest rank on
+    self.__size = length - max(0, math.ceil(percentile / 100 * length) - 1)
+    self.__largest = []
+
+  def update(self, values):
+    """add values of the series"""
+    count = self.count
+    total = self.total
+    low = self.minimum
+    high = self.maximum
+    largest = self.__largest
+    size = self.__size
+    for value in values:
+      count += 1
+      total += value
+      if low is None or value < low:
+        low = value
+      if high is None or value > high:
+        high = value
+      # once the heap is full, only larger values replace its smallest one
+      if len(largest) < size:
+        heapq.heappush(largest, value)
+      elif value > largest[0]:
+        heapq.heapreplace(largest, value)
+    self.count = count
+    self.total = total
+    self.minimum = low
+    self.maximum = high
+
+  def mean(self):
+    """the mean, rounded down for integers like the plugins always did"""
+    return self.total // self.count if self.count else None
+
+  def percentile(self):
+    return self.__largest[0] if self.__largest else None
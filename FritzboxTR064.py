@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+  FritzboxTR064 - TR-064 connections to the AVM Fritzbox for the
+  fritzconnection based plugins
+  Like Munin, this plugin is licensed under the GNU GPL v2 license
+  http://www.opensource.org/licenses/GPL-2.0
+
+  Connecting with fritzconnection downloads and parses the device description
+  and the description of every service before the first action is called.
+  The parsed descriptions are kept in MUNIN_PLUGSTATE/fritzbox instead, and
+  are only downloaded again after the model or firmware version of the box
+  has changed.
+
+  Connecting and every action are recorded like the requests of
+  FritzboxInterface, see FritzboxTrace, and the firmware version of the box
+  is remembered for the trace.
+"""
+
+import os
+import time
+
+import FritzboxTrace
+from FritzboxScheduler import FritzboxScheduler
+
+# the connection class, defined when the first connection is made
+_connectionClass = None
+
+def getConnection(config):
+  """connect to the box, reusing the stored service descriptions
+
+  :param config: the FritzboxConfig of the box
+  :return: a FritzConnection
+  """
+  global _connectionClass
+  if _connectionClass is None:
+    _connectionClass = _defineConnection()
+
+  statedir = os.getenv('MUNIN_PLUGSTATE') + '/fritzbox'
+  if not os.path.exists(statedir):
+    os.makedirs(statedir)
+  scheduler = FritzboxScheduler(config)
+  started = time.perf_counter()
+  connection = _connectionClass(address=config.server, password=config.password, use_tls=config.useTls,
+                                timeout=config.timeout, use_cache=True, cache_directory=statedir)
+  scheduler.recordEvent('action', 'tr064desc.xml', time.perf_counter() - started)
+  connection.scheduler = scheduler
+  FritzboxTrace.setFirmware(config.server, connection.system_version)
+  return connection
+
+def _defineConnection():
+  from fritzconnection import FritzConnection
+
+  class TimedFritzConnection(FritzConnection):
+    scheduler = None
+
+    def call_action(self, service_name, action_name, *, arguments=None, **kwargs):
+      started = time.perf_counter()
+      failed = True
+      try:
+        result = super().call_action(service_name, action_name, arguments=arguments, **kwargs)
+        failed = False
+        return result
+      finally:
+        self.scheduler.recordEvent('action', service_name + ':' + action_name, time.perf_counter() - started,
+                                   {'errors': int(failed)})
+
+  return TimedFritzConnection
+
+def getStatus(config):
+  """connect to the box for reading its status
+
+  :param config: the FritzboxConfig of the box
+  :return: a FritzStatus
+  """
+  from fritzconnection.lib.fritzstatus import FritzStatus
+
+  return FritzStatus(fc=getConnection(config))
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+  FritzboxTargets - polls many Fritzboxes from a single plugin process
+  Like Munin, this plugin is licensed under the GNU GPL v2 license
+  http://www.opensource.org/licenses/GPL-2.0
+
+  Instead of symlinking every plugin once per box, list the boxes in a file
+  and point the [fritzbox_*] section of munin-node to it:
+
+  env.fritzbox_targets [path of the file, optional]
+  env.fritzbox_targets_workers [boxes polled at the same time, optional, default 8]
+
+  The file has a section per box, named after the munin host the graphs of
+  the box belong to, with the fritzbox_* variables of the box:
+
+  [branch01.example.com]
+  fritzbox_ip = 10.1.0.1
+  fritzbox_password = secret
+  fritzbox_certificate = /etc/munin/branch01.cer
+
+  Variables missing in a section are taken from a [DEFAULT] section of the
+  file or else from the environment, fritzbox_ip defaults to the name of the
+  section. All settings of a box are read with FritzboxConfig.getenv, e.g.
+  fritzbox_max_requests, fritzbox_cache_ttl or fritzbox_trace. Those of the
+  process, fritzbox_targets*, fritzbox_collector_* and fritzbox_node_*, and
+  the plugin variables, e.g. dsl_modes, are the same for all boxes.
+
+  Every plugin then prints the graphs of all boxes, one multigraph section per
+  graph and box, assigned to the box by host_name. The boxes are polled by a
+  bounded pool of threads, each box with its own keep-alive session and
+  session id, so a cycle takes about as long as polling the number of boxes
+  divided by the workers.
+"""
+
+import configparser
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+from FritzboxConfig import FritzboxConfig
+
+WORKERS = 8
+
+class FritzboxTarget:
+  """the munin host name of the box"""
+  hostName = ""
+  """the prefix of the graph names of the box"""
+  graphPrefix = ""
+  """the fritzbox_* variables of the box"""
+  settings = None
+
+  def __init__(self, hostName, settings):
+    self.hostName = hostName
+    self.graphPrefix = re.sub('[^A-Za-z0-9_]', '_', hostName)
+    self.settings = settings
+
+def getTargets():
+  """read the boxes of env.fritzbox_targets
+
+  :return: a list of FritzboxTarget, None if no file is configured
+  """
+  filename = os.getenv('fritzbox_targets')
+  if not filename:
+    return None
+  # passwords may contain %, so take all values literally
+  parser = configparser.ConfigParser(interpolation=None)
+  if not parser.read(filename):
+    raise Exception("Couldn't read " + filename)
+  targets = []
+  for section in parser.sections():
+    settings = dict(parser.items(section))
+    settings.setdefault('fritzbox_ip', section)
+    targets.append(FritzboxTarget(section, settings))
+  return targets
+
+def forEachTarget(targets, function):
+  """call a function for every box in a bounded pool of threads, every
+  FritzboxConfig created by a call is that of its box
+
+  :param targets: a list of FritzboxTarget
+  :param function: called with the FritzboxTarget
+  :return: the results in the order of targets
+  """
+  def call(target):
+    FritzboxConfig.setTarget(target.settings)
+    try:
+      return function(target)
+    finally:
+      FritzboxConfig.setTarget(None)
+
+  workers = max(1, min(int(os.getenv('fritzbox_targets_workers', WORKERS)), len(targets)))
+  with ThreadPoolExecutor(max_workers=workers) as executor:
+    return list(executor.map(call, targets))
+
+def targetOutput(target, plugin, output, config=False):
+  """turn the output a plugin printed for a box into multigraph sections of the box
+
+  :param target: the FritzboxTarget
+  :param plugin: the plugin module name, e.g. fritzbox_dsl
+  :param output: the config or fetch output
+  :param config: True for config output, which assigns every graph to the host of the box
+  :return: the sections
+  """
+  lines = output.splitlines()
+  if not lines:
+    return ''
+  if not lines[0].startswith('multigraph '):
+    # a plugin with a single graph, munin names it after the plugin
+    lines.insert(0, 'multigraph ' + plugin)
+  sections = []
+  for line in lines:
+    if line.startswith('multigraph '):
+      # graph names of all boxes end up in the same plugin output, so keep them apart
+      sections.append('multigraph ' + target.graphPrefix + '_' + line[len('multigraph '):])
+      if config:
+        sections.append('host_name ' + target.hostName)
+    else:
+      sections.append(line)
+  return '\n'.join(sections) + '\n'
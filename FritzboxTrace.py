@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+  FritzboxTrace - measures every request to the AVM Fritzbox phase by phase
+  Like Munin, this plugin is licensed under the GNU GPL v2 license
+  http://www.opensource.org/licenses/GPL-2.0
+
+  [fritzbox_*]
+  env.fritzbox_trace [file to append a JSON line per event to, optional]
+
+  A request to the web interface records the seconds it took to connect
+  (DNS and TCP), for the TLS handshake, until the first byte of the answer
+  and in total, as well as its status, the bytes received and whether it used
+  a stored session id or one of a login it had to do first. Connect and TLS
+  are 0 on a kept-alive connection. Plugins record how long parsing a page
+  took, the TR-064 plugins every action of fritzconnection.
+
+  The sums per endpoint are kept by FritzboxScheduler and graphed by
+  fritzbox_collector_stats, the trace holds every single event, e.g.
+
+  {"time": 1700000000.1, "box": "fritz.box", "event": "request", "endpoint": "ecoStat",
+   "status": 200, "connect": 0.0, "tls": 0.0, "ttfb": 0.0412, "total": 0.0425,
+   "bytes": 10321, "session": "stored", "firmware": "7.57"}
+"""
+
+import json
+import os
+import threading
+import time
+
+from FritzboxStateFile import writeStateFile
+
+# the record of the request the current thread is sending
+_current = threading.local()
+# the adapter class, defined when the first session is created
+_adapterClass = None
+
+def begin(record):
+  """make record the one the connections of the current thread add their times to"""
+  _current.record = record
+
+def end():
+  _current.record = None
+
+def _add(key, seconds):
+  record = getattr(_current, 'record', None)
+  if record is not None:
+    record[key] = record.get(key, 0.0) + seconds
+
+def write(record, filename):
+  """append an event to the trace, if there is one
+
+  :param record: a map with at least 'box' and 'event'
+  :param filename: the env.fritzbox_trace of the box, None if it is not traced
+  """
+  if not filename:
+    return
+  record = dict(record, time=round(time.time(), 3))
+  firmware = getFirmware(record['box'])
+  if firmware:
+    record['firmware'] = firmware
+  for key, value in record.items():
+    if isinstance(value, float):
+      record[key] = round(value, 6)
+  # a single write of a line to a file opened for appending is not interleaved with those of other processes
+  fd = os.open(filename, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+  try:
+    os.write(fd, (json.dumps(record) + '\n').encode('utf-8'))
+  finally:
+    os.close(fd)
+
+def getFirmwareFilename(server):
+  return os.getenv('MUNIN_PLUGSTATE') + '/fritzbox/' + server + '__firmware'
+
+def getFirmware(server):
+  """the firmware version of a box last seen by a TR-064 plugin, None if unknown"""
+  try:
+    with open(getFirmwareFilename(server), 'r') as firmwarefile:
+      return firmwarefile.read().strip() or None
+  except OSError:
+    return None
+
+def setFirmware(server, firmware):
+  if not firmware or firmware == getFirmware(server):
+    return
+  writeStateFile(getFirmwareFilename(server), firmware + '\n')
+
+def createAdapter(poolSize):
+  """a requests HTTPAdapter whose connections add the time to connect and
+  for the TLS handshake to the record of the current thread
+
+  :param poolSize: the number of keep-alive connections
+  """
+  global _adapterClass
+  if _adapterClass is None:
+    _adapterClass = _defineAdapter()
+  return _adapterClass(pool_connections=1, pool_maxsize=poolSize)
+
+def _defineAdapter():
+  from requests.adapters import HTTPAdapter
+  from urllib3.connection import HTTPConnection, HTTPSConnection
+  from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+  class TimedHTTPConnection(HTTPConnection):
+    def _new_conn(self):
+      started = time.perf_counter()
+      sock = super()._new_conn()
+      _add('connect', time.perf_counter() - started)
+      return sock
+
+  class TimedHTTPSConnection(HTTPSConnection):
+    __connect = 0.0
+
+    def _new_conn(self):
+      started = time.perf_counter()
+      sock = super()._new_conn()
+      self.__connect = time.perf_counter() - started
+      _add('connect', self.__connect)
+      return sock
+
+    def connect(self):
+      started = time.perf_counter()
+      super().connect()
+      # connect() opens the socket with _new_conn() and then does the handshake
+      _add('tls', time.perf_counter() - started - self.__connect)
+
+  class TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+  class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+  class TimedAdapter(HTTPAdapter):
+    def init_poolmanager(self, *args, **kwargs):
+      super().init_poolmanager(*args, **kwargs)
+      self.poolmanager.pool_classes_by_scheme = {'http': TimedHTTPConnectionPool, 'https': TimedHTTPSConnectionPool}
+
+  return TimedAdapter
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+  fritzbox_collector_stats - A munin plugin for Linux to monitor how long the
+  AVM Fritzbox plugins wait for the box
+  Like Munin, this plugin is licensed under the GNU GPL v2 license
+  http://www.opensource.org/licenses/GPL-2.0
+
+  Add the following section to your munin-node's plugin configuration:
+
+  [fritzbox_*]
+  env.fritzbox_ip [ip address of the fritzbox]
+
+  Graphs the timings all other plugins recorded for the box, see
+  FritzboxScheduler and FritzboxTrace: the mean time of the requests to every
+  endpoint and of the TR-064 actions, the mean time of every phase of a
+  request and how many requests, errors, logins and actions there were, how
+  often a page or value had not changed and was not parsed again, and the
+  hits and misses of the response cache, see FritzboxResponseCache.
+  Sums are printed as counters and divided by the number of requests in the
+  graph, so the means are those of the requests of each munin interval.
+
+  This plugin supports the following munin configuration parameters:
+  #%# family=auto contrib
+  #%# capabilities=autoconf
+"""
+
+import re
+import sys
+from functools import lru_cache
+from FritzboxConfig import FritzboxConfig
+from FritzboxConfigCache import FritzboxConfigCache
+from FritzboxOutput import Field, Graph, OutputBuffer
+from FritzboxResponseCache import FritzboxResponseCache
+from FritzboxScheduler import FritzboxScheduler
+from FritzboxCollector import printCachedConfig, printCachedFetch, printTargets
+
+# phase -> label, the phases of a request add up to its total time
+PHASES = {
+  'connect': 'connect (DNS and TCP)',
+  'tls': 'TLS handshake',
+  'ttfb': 'time to first byte',
+  'transfer': 'transfer',
+}
+COUNTERS = {
+  'requests': 'requests',
+  'errors': 'errors',
+  'reused': 'stored session id reused',
+  'logins': 'logins',
+  'actions': 'TR-064 actions',
+  'unchanged': 'unchanged, not asked again',
+}
+# counter of FritzboxResponseCache -> label
+CACHE_COUNTERS = {
+  'hits': 'served from the response cache',
+  'misses': 'not in the response cache',
+}
+
+def get_field(endpoint):
+  """a munin field name for an endpoint"""
+  return '_' + re.sub('[^A-Za-z0-9_]', '_', endpoint)
+
+def get_timed(timings):
+  """the endpoints with requests or actions, mapped to (seconds, number)"""
+  timed = {}
+  for endpoint, timing in sorted(timings.items()):
+    if timing.get('count'):
+      timed[endpoint] = (timing['total'], timing['count'])
+    elif timing.get('actions'):
+      timed[endpoint] = (timing['action'], timing['actions'])
+  return timed
+
+def microseconds(seconds):
+  # DERIVE only takes integers
+  return str(int(seconds * 1e6))
+
+def print_collector_stats():
+  """print the sums of the timings recorded for the box"""
+  config = FritzboxConfig()
+  timings = FritzboxScheduler(config).getTimings()
+  timed = get_timed(timings)
+  cacheStats = FritzboxResponseCache(config).getStats()
+  # the config has a field per endpoint, it is generated again when there are new ones
+  FritzboxConfigCache(config, 'fritzbox_collector_stats').setCapabilities(list(timed))
+
+  requests = sum(t.get('count', 0) for t in timings.values())
+  sums = {phase: sum(t.get(phase, 0.0) for t in timings.values()) for phase in ('connect', 'tls', 'ttfb', 'total', 'parse')}
+  sums['transfer'] = max(0.0, sums['total'] - sums['connect'] - sums['tls'] - sums['ttfb'])
+
+  with OutputBuffer() as output:
+    output.multigraph("fritzbox_request_time")
+    for endpoint, (seconds, number) in timed.items():
+      output.value(get_field(endpoint), microseconds(seconds))
+      output.value(get_field(endpoint) + '_n', number)
+
+    output.multigraph("fritzbox_request_phases")
+    for phase in PHASES:
+      output.value(phase, microseconds(sums[phase]))
+    output.value("requests", requests)
+    output.value("parse", microseconds(sums['parse']))
+    output.value("parses", sum(t.get('parses', 0) for t in timings.values()))
+
+    output.multigraph("fritzbox_requests")
+    output.value("requests", requests)
+    for counter in ('errors', 'reused', 'logins', 'actions', 'unchanged'):
+      output.value(counter, sum(t.get(counter, 0) for t in timings.values()))
+    for counter in CACHE_COUNTERS:
+      output.value('cache_' + counter, cacheStats.get(counter, 0))
+
+@lru_cache()
+def get_time_graph(endpoints):
+  """the graph of the request time per endpoint, kept per endpoints so its config is rendered once"""
+  fields = []
+  for endpoint in endpoints:
+    field = get_field(endpoint)
+    fields.append(Field(field, label=endpoint, type='DERIVE', min=0, cdef=field + ',' + field + '_n,/,1000,/'))
+    fields.append(Field(field + '_n', label=endpoint + ' requests', type='DERIVE', min=0, graph='no'))
+  return Graph('fritzbox_request_time', fields,
+    title='Request time per endpoint', vlabel='milliseconds', args='--base 1000 --lower-limit 0', category='network',
+    info='The mean time of the requests to every endpoint of the web interface and of the TR-064 actions.')
+
+GRAPHS = [
+  Graph('fritzbox_request_phases',
+    [Field(phase, label=label, type='DERIVE', min=0, draw='AREASTACK', cdef=phase + ',requests,/,1000,/') for phase, label in PHASES.items()] + [
+      Field('requests', label='requests', type='DERIVE', min=0, graph='no'),
+      Field('parse', label='parse', type='DERIVE', min=0, draw='LINE1', cdef='parse,parses,/,1000,/'),
+      Field('parses', label='parses', type='DERIVE', min=0, graph='no')],
+    title='Request time per phase', vlabel='milliseconds', args='--base 1000 --lower-limit 0', category='network',
+    info='The mean time of a request in every phase, connect and TLS are 0 on kept-alive connections, and the mean time to parse a page.'),
+  Graph('fritzbox_requests',
+    [Field(counter, label=label, type='DERIVE', min=0) for counter, label in COUNTERS.items()] +
+    [Field('cache_' + counter, label=label, type='DERIVE', min=0) for counter, label in CACHE_COUNTERS.items()],
+    title='Requests to the box', vlabel='number per ${graph_period}', args='--base 1000 --lower-limit 0', category='network'),
+]
+
+def print_config():
+  timings = FritzboxScheduler(FritzboxConfig()).getTimings()
+  with OutputBuffer() as output:
+    output.config([get_time_graph(tuple(get_timed(timings)))] + GRAPHS)
+
+if __name__ == "__main__":
+  if len(sys.argv) == 2 and sys.argv[1] == 'config':
+    printCachedConfig('fritzbox_collector_stats')
+  elif len(sys.argv) == 2 and sys.argv[1] == 'autoconf':
+    print("yes")  # Some docs say it'll be called with fetch, some say no arg at all
+  elif len(sys.argv) == 1 or (len(sys.argv) == 2 and sys.argv[1] == 'fetch'):
+    try:
+      if not printCachedFetch('fritzbox_collector_stats') and not printTargets('fritzbox_collector_stats'):
+        print_collector_stats()
+    except Exception as e:
+      sys.exit("Couldn't retrieve fritzbox collector stats: " + str(e))
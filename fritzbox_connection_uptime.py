@@ -13,46 +13,85 @@
   [fritzbox_*]
   env.fritzbox_ip [ip address of the fritzbox]
 
+  The external addresses in the graph info are only read again after the box
+  reconnected, which the connection uptime tells. The fetch records when the
+  connection started, so the config is generated again after a reconnect.
+
   This plugin supports the following munin configuration parameters:
   #%# family=auto contrib
   #%# capabilities=autoconf
 """
 
-import os
 import sys
-from fritzconnection.lib.fritzstatus import FritzStatus
+import time
+from FritzboxChangeStore import FritzboxChangeStore
 from FritzboxConfig import FritzboxConfig
+from FritzboxConfigCache import FritzboxConfigCache
+from FritzboxOutput import Field, Graph, OutputBuffer
+from FritzboxScheduler import FritzboxScheduler
+from FritzboxTR064 import getStatus
+from FritzboxCollector import printCachedConfig, printCachedFetch, printTargets
+
+# seconds the start of the connection computed from its uptime may differ between two runs
+RECONNECT_TOLERANCE = 10
 
 class FritzboxConnectionUptime:
+  __config = None
   __connection = None
 
   def __init__(self):
-    config = FritzboxConfig()
+    self.__config = FritzboxConfig()
     try:
-      self.__connection = FritzStatus(address=config.server, password=config.password, use_tls=config.useTls)
+      self.__connection = getStatus(self.__config)
     except Exception as e:
       sys.exit("Couldn't get connection uptime: " + str(e))
 
   def printUptime(self):
-    print('uptime.value %.2f' % (int(self.__connection.uptime) / 3600.0))
+    uptime = int(self.__connection.connection_uptime)
+    self.recordConnection(uptime)
+    with OutputBuffer() as output:
+      output.value('uptime', '%.2f' % (uptime / 3600.0))
+
+  def recordConnection(self, uptime):
+    """Records when the connection started, after a reconnect the config
+    with the external addresses is generated again"""
+    cache = FritzboxConfigCache(self.__config, 'fritzbox_connection_uptime')
+    connected = time.time() - uptime
+    recorded = cache.getCapabilities()
+    if recorded is None or abs(recorded - connected) > RECONNECT_TOLERANCE:
+      cache.setCapabilities(connected)
+
+  def getExternalIps(self):
+    """Returns the external ipv4 and ipv6 address, the stored ones if the box
+    did not reconnect since they were read"""
+    store = FritzboxChangeStore(self.__config)
+    uptime = int(self.__connection.connection_uptime)
+    self.recordConnection(uptime)
+    connected = time.time() - uptime
+    entry = store.get('external_ips')
+    if entry is not None and abs(entry['connected'] - connected) <= RECONNECT_TOLERANCE:
+      FritzboxScheduler(self.__config).record('WANIPConn:GetExternalIPAddress', {'unchanged': 1})
+      return entry['ipv4'], entry['ipv6']
+    ipv4, ipv6 = self.__connection.external_ip, self.__connection.external_ipv6
+    store.put('external_ips', {'connected': connected, 'ipv4': ipv4, 'ipv6': ipv6})
+    return ipv4, ipv6
 
   def printConfig(self):
-    print("graph_title Connection Uptime")
-    print("graph_args --base 1000 -l 0")
-    print("graph_vlabel uptime in hours")
-    print("graph_scale no")
-    print("graph_category network")
-    print("uptime.label uptime")
-    print("uptime.draw AREA")
-    print("graph_info The uptime in hours after the last disconnect.<br />Public IP address (ipv4): " + self.__connection.external_ip + ", Public IP address (ipv6): " + self.__connection.external_ipv6)
+    ipv4, ipv6 = self.getExternalIps()
+    with OutputBuffer() as output:
+      output.config(Graph(None, [Field('uptime', label='uptime', draw='AREA')],
+        title='Connection Uptime', args='--base 1000 -l 0', vlabel='uptime in hours', scale='no', category='network',
+        info='The uptime in hours after the last disconnect.<br />Public IP address (ipv4): ' + ipv4 + ', Public IP address (ipv6): ' + ipv6))
 
 if __name__ == "__main__":
-  uptime = FritzboxConnectionUptime()
   if len(sys.argv) == 2 and sys.argv[1] == 'config':
-    uptime.printConfig()
+    printCachedConfig('fritzbox_connection_uptime')
   elif len(sys.argv) == 2 and sys.argv[1] == 'autoconf':
     print("yes")  # Some docs say it'll be called with fetch, some say no arg at all
   elif len(sys.argv) == 1 or (len(sys.argv) == 2 and sys.argv[1] == 'fetch'):
+    if printCachedFetch('fritzbox_connection_uptime') or printTargets('fritzbox_connection_uptime'):
+      sys.exit(0)
+    uptime = FritzboxConnectionUptime()
     try:
       uptime.printUptime()
     except Exception as e:
@@ -15,6 +15,9 @@
   env.fritzbox_user [fritzbox user, set any value if not required]
   env.dsl_modes [capacity] [snr] [damping] [errors] [crc]
 
+  The statistics are read as JSON from data.lua if the firmware provides
+  them, and from the HTML page internet/dsl_stats_tab.lua otherwise.
+
   This plugin supports the following munin configuration parameters:
   #%# family=auto contrib
   #%# capabilities=autoconf
@@ -23,11 +26,21 @@
 import os
 import sys
 import json
-import lxml.html as html
+import time
+from functools import lru_cache
+from FritzboxConfig import FritzboxConfig
+from FritzboxConfigCache import FritzboxConfigCache
 from FritzboxInterface import FritzboxInterface
+from FritzboxOutput import Field, Graph, OutputBuffer
+from FritzboxCollector import printCachedConfig, printCachedFetch, printTargets
 
 PAGE = 'internet/dsl_stats_tab.lua'
 PARAMS = {'update':'mainDiv', 'useajax':1, 'xhr':1}
+# the same statistics as JSON, on newer firmware
+JSON_PAGE = 'data.lua'
+JSON_PARAMS = {'xhr':1, 'lang':'de', 'page':'dslStat', 'xhrId':'all', 'useajax':1, 'no_sidrenew':None}
+# firmware without the JSON page is asked again after a day, it might have been updated
+UNSUPPORTED_MAXAGE = 86400
 
 TITLES = {
   'capacity': 'Link Capacity',
@@ -43,6 +56,19 @@ TYPES = {
   'errors': 'DERIVE',
   'crc': 'GAUGE'
 }
+# labels of the rows with the values on German and English firmware, and the
+# position of the row in the layout of FRITZ!OS 7.20 as a fallback: table,
+# row and the receive and send columns, counted from 1 like in XPath
+ROWS = {
+  'capacity': (['Leitungskapazität', 'Line Capacity'], (1, 4, 3, 4)),
+  'snr': (['Störabstandsmarge', 'Signal-to-Noise Ratio Margin', 'Signal-to-Noise Ratio'], (1, 13, 3, 4)),
+  'damping': (['Leitungsdämpfung', 'Line Attenuation', 'Line Loss'], (1, 15, 3, 4)),
+  'es': (['Sekunden mit Fehlern', 'Errored Seconds', 'Seconds with Errors'], (2, 3, 2, 3)),
+  'ses': (['Sekunden mit vielen Fehlern', 'Severely Errored Seconds', 'Seconds with Many Errors'], (2, 4, 2, 3)),
+  'crc': (['Nicht behebbare Fehler (CRC)', 'Uncorrectable Errors (CRC)', 'Non-correctable Errors (CRC)'], (2, 7, 2, 3)),
+  # the line sync rate, the config is generated again when it changed
+  'sync': (['Aktuelle Datenrate', 'Current Data Rate', 'Actual Data Rate'], (1, 5, 3, 4)),
+}
 VLABELS = {
   'capacity': 'bit/s',
   'snr': 'dB',
@@ -54,104 +80,243 @@ VLABELS = {
 def get_modes():
   return os.getenv('dsl_modes').split(' ')
 
-def print_graph(name, recv, send, prefix=""):
+def print_graph(output, name, recv, send, prefix=""):
   if name:
-    print("multigraph " + name)
-  print(prefix + "recv.value " + recv)
-  print(prefix + "send.value " + send)
+    output.multigraph(name)
+  output.value(prefix + "recv", recv)
+  output.value(prefix + "send", send)
+
+def parse_dsl_stats(data):
+  """index the rows of all tables of the DSL page in a single pass
+
+  :param data: the DSL page
+  :return: a tuple of the rows by lower case label and the rows of each table,
+           a row being the list of the texts of its td cells
+  """
+  from lxml import etree
+
+  if isinstance(data, bytes):
+    # the labels contain umlauts, lxml would guess latin-1 without a declaration
+    data = data.decode('utf-8', 'replace')
+  labels = {}
+  tables = []
+  root = etree.HTML(data)
+  if root is None:
+    return (labels, tables)
+  for table in root.iter('table'):
+    rows = []
+    for tr in table.iter('tr'):
+      # itertext() is only needed for cells with markup inside
+      cells = [(''.join(td.itertext()) if len(td) else td.text or '').strip() for td in tr if td.tag == 'td']
+      rows.append(cells)
+      if len(cells) >= 3 and cells[0]:
+        labels.setdefault(cells[0].lower(), cells)
+    tables.append(rows)
+  return (labels, tables)
+
+def parse_dsl_json(data):
+  """index the values of the JSON DSL page like parse_dsl_stats
+
+  Every object with a title and downstream and upstream values, either
+  directly or in the first element of its val list, becomes a row
+  [title, ds, us]. There are no positions to fall back to.
+
+  :param data: the response of data.lua for the dslStat page
+  :return: a tuple of the rows by lower case label and an empty list of tables
+  """
+  labels = {}
+  pending = [json.loads(data)]
+  while pending:
+    item = pending.pop()
+    if isinstance(item, list):
+      pending.extend(reversed(item))
+      continue
+    if not isinstance(item, dict):
+      continue
+    title = item.get('title')
+    values = item.get('val', item)
+    if isinstance(values, list) and values:
+      values = values[0]
+    if isinstance(title, str) and isinstance(values, dict) and 'ds' in values and 'us' in values:
+      labels.setdefault(title.strip().lower(), [title.strip(), str(values['ds']).strip(), str(values['us']).strip()])
+    pending.extend(reversed(list(item.values())))
+  return (labels, [])
+
+def find_row(index, name):
+  """the cells of a row, found by its label, None if there is none"""
+  labels = index[0]
+  for label in ROWS[name][0]:
+    if label.lower() in labels:
+      return labels[label.lower()]
+  return None
+
+def get_row(index, name):
+  """the receive and send values of a row, found by its label"""
+  cells = find_row(index, name)
+  if cells is not None:
+    # the values are in the last two columns, after the label and the unit
+    return (cells[-2], cells[-1])
+
+  tables = index[1]
+  candidates, position = ROWS[name]
+  table, row, recv, send = position
+  print("No row labelled " + candidates[0] + ", reading row " + str(row) + " of table " + str(table), file=sys.stderr)
+  cells = tables[table - 1][row - 1]
+  return (cells[recv - 1], cells[send - 1])
+
+def get_rows(modes):
+  """the rows needed for the modes"""
+  rows = []
+  for mode in modes:
+    rows += ['es', 'ses'] if mode == 'errors' else [mode] if mode in ROWS else []
+  return rows
+
+def get_unsupported_filename():
+  return os.getenv('MUNIN_PLUGSTATE') + '/fritzbox/' + FritzboxConfig().server + '__dsl_json_unsupported'
+
+def json_supported():
+  """False if the firmware recently lacked the JSON page"""
+  try:
+    return time.time() - os.path.getmtime(get_unsupported_filename()) > UNSUPPORTED_MAXAGE
+  except OSError:
+    return True
+
+def set_json_unsupported():
+  filename = get_unsupported_filename()
+  if not os.path.exists(os.path.dirname(filename)):
+    os.makedirs(os.path.dirname(filename))
+  with open(filename, 'w'):
+    pass
+
+def get_request():
+  """the request for the DSL statistics, as used by the collector"""
+  if json_supported():
+    return ('post', JSON_PAGE, JSON_PARAMS)
+  return ('get', PAGE, PARAMS)
+
+def retrieve_dsl_stats(modes):
+  """the DSL statistics indexed by row label, from JSON if the firmware supports it"""
+  if json_supported():
+    from requests.exceptions import HTTPError
+
+    interface = FritzboxInterface()
+    try:
+      data = interface.postPageWithLogin(JSON_PAGE, data=JSON_PARAMS)
+    except HTTPError as e:
+      # only a missing page tells about the firmware, a busy box or a
+      # rejected login is passed on and the JSON page is asked for next time
+      if e.response is None or e.response.status_code != 404:
+        raise
+      data = None
+    index = None
+    if data is not None:
+      try:
+        with interface.parsing(JSON_PAGE, JSON_PARAMS):
+          index = parse_dsl_json(data)
+      except ValueError:
+        # no JSON at all
+        pass
+    if index is not None and all(find_row(index, row) is not None for row in get_rows(modes)):
+      return index
+    print("No DSL statistics as JSON, falling back to " + PAGE, file=sys.stderr)
+    set_json_unsupported()
+
+  interface = FritzboxInterface()
+  data = interface.getPageWithLogin(PAGE, data=PARAMS)
+  with interface.parsing(PAGE, PARAMS):
+    return parse_dsl_stats(data)
 
 def print_dsl_stats():
     """print the current DSL statistics"""
-    
+
     modes = get_modes()
 
-    # download the table
-    data = FritzboxInterface().getPageWithLogin(PAGE, data=PARAMS)
-    root = html.fragments_fromstring(data)
-    
-    if 'capacity' in modes:
-      capacity_recv = root[1].xpath('tr[position() = 4]/td[position() = 3]')[0].text
-      capacity_send = root[1].xpath('tr[position() = 4]/td[position() = 4]')[0].text
-      print_graph("dsl_capacity", capacity_recv, capacity_send)
-
-    if 'snr' in modes: # Störabstandsmarge
-      snr_recv = root[1].xpath('tr[position() = 13]/td[position() = 3]')[0].text
-      snr_send = root[1].xpath('tr[position() = 13]/td[position() = 4]')[0].text
-      print_graph("dsl_snr", snr_recv, snr_send)
-
-    if 'damping' in modes: # Leitungsdämpfung
-      damping_recv = root[1].xpath('tr[position() = 15]/td[position() = 3]')[0].text
-      damping_send = root[1].xpath('tr[position() = 15]/td[position() = 4]')[0].text
-      print_graph("dsl_damping", damping_recv, damping_send)
-
-    if 'errors' in modes:    
-      es_recv = root[4].xpath('tr[position() = 3]/td[position() = 2]')[0].text
-      es_send = root[4].xpath('tr[position() = 3]/td[position() = 3]')[0].text
-      ses_recv = root[4].xpath('tr[position() = 4]/td[position() = 2]')[0].text
-      ses_send = root[4].xpath('tr[position() = 4]/td[position() = 3]')[0].text
-      print_graph("dsl_errors", es_recv, es_send, prefix="es_")
-      print_graph(None, ses_recv, ses_send, prefix="ses_")
-
-    if 'crc' in modes:    
-      crc_recv = root[4].xpath('tr[position() = 7]/td[position() = 2]')[0].text
-      crc_send = root[4].xpath('tr[position() = 7]/td[position() = 3]')[0].text
-      print_graph("dsl_crc", crc_recv, crc_send)
+    # download the statistics
+    index = retrieve_dsl_stats(modes)
+
+    sync = find_row(index, 'sync')
+    if sync is not None:
+      FritzboxConfigCache(FritzboxConfig(), 'fritzbox_dsl').setCapabilities(sync[-2:])
+
+    with OutputBuffer() as output:
+      if 'capacity' in modes:
+        capacity_recv, capacity_send = get_row(index, 'capacity')
+        print_graph(output, "dsl_capacity", capacity_recv, capacity_send)
+
+      if 'snr' in modes: # Störabstandsmarge
+        snr_recv, snr_send = get_row(index, 'snr')
+        print_graph(output, "dsl_snr", snr_recv, snr_send)
+
+      if 'damping' in modes: # Leitungsdämpfung
+        damping_recv, damping_send = get_row(index, 'damping')
+        print_graph(output, "dsl_damping", damping_recv, damping_send)
+
+      if 'errors' in modes:
+        es_recv, es_send = get_row(index, 'es')
+        ses_recv, ses_send = get_row(index, 'ses')
+        print_graph(output, "dsl_errors", es_recv, es_send, prefix="es_")
+        print_graph(output, None, ses_recv, ses_send, prefix="ses_")
+
+      if 'crc' in modes:
+        crc_recv, crc_send = get_row(index, 'crc')
+        print_graph(output, "dsl_crc", crc_recv, crc_send)
 
 def retrieve_max_values():
     max = {}
     page = 'internet/inetstat_monitor.lua'
     params = {'useajax':1, 'action':'get_graphic', 'xhr':1, 'myXhr':1}
-    data = FritzboxInterface().getPageWithLogin(page, data=params)
+    interface = FritzboxInterface()
+    data = interface.getPageWithLogin(page, data=params)
 
     # Retrieve max values
-    jsondata = json.loads(data)[0]
+    with interface.parsing(page, params):
+      jsondata = json.loads(data)[0]
     max['send'] = int(float(jsondata['upstream']))
     max['recv'] = int(float(jsondata['downstream']))
 
     return max
 
-def print_config():
-    modes = get_modes()
-    max = retrieve_max_values()
+@lru_cache()
+def get_graphs(modes, maxRecv, maxSend):
+    """the graphs of the modes, kept per settings and line capacity so their config is rendered once"""
+    max = {'recv': maxRecv, 'send': maxSend}
+    graphs = []
 
     for mode in ['capacity', 'snr', 'damping', 'crc']:
       if not mode in modes:
         continue
-      print("multigraph dsl_" + mode)
-      print("graph_title " + TITLES[mode])
-      print("graph_vlabel " + VLABELS[mode])
-      print("graph_args --lower-limit 0")
-      print("graph_category network")
+      fields = []
       for p,l in {'recv' : 'receive', 'send': 'send'}.items():
-        print(p + ".label " + l)
-        print(p + ".type " + TYPES[mode])
-        print(p + ".graph LINE1")
-        print(p + ".min 0")
         if mode == 'capacity':
-          print(p + ".cdef " + p + ",1000,*")
-          print(p + ".warning " + str(max[p]))
+          fields.append(Field(p, label=l, type=TYPES[mode], graph='LINE1', min=0, cdef=p + ',1000,*', warning=max[p]))
+        else:
+          fields.append(Field(p, label=l, type=TYPES[mode], graph='LINE1', min=0))
+      graphs.append(Graph('dsl_' + mode, fields,
+        title=TITLES[mode], vlabel=VLABELS[mode], args='--lower-limit 0', category='network'))
 
     if 'errors' in modes:
-      print("multigraph dsl_errors")
-      print("graph_title " + TITLES['errors'])
-      print("graph_vlabel " + VLABELS['errors'])
-      print("graph_args --lower-limit 0")
-      print("graph_category network")
-      print("graph_order es_recv es_send ses_recv ses_send")
+      fields = []
       for p,l in {'es_recv' : 'receive errored', 'es_send': 'send errored', 'ses_recv' : 'receive severely errored', 'ses_send': 'send severely errored'}.items():
-        print(p + ".label " + l)
-        print(p + ".type " + TYPES['errors'])
-        print(p + ".graph LINE1")
-        print(p + ".min 0")
-        print(p + ".warning 1")
+        fields.append(Field(p, label=l, type=TYPES['errors'], graph='LINE1', min=0, warning=1))
+      graphs.append(Graph('dsl_errors', fields,
+        title=TITLES['errors'], vlabel=VLABELS['errors'], args='--lower-limit 0', category='network',
+        order='es_recv es_send ses_recv ses_send'))
+
+    return graphs
+
+def print_config():
+    max = retrieve_max_values()
+    with OutputBuffer() as output:
+      output.config(get_graphs(tuple(get_modes()), max['recv'], max['send']))
 
 if __name__ == "__main__":
   if len(sys.argv) == 2 and sys.argv[1] == 'config':
-    print_config()
+    printCachedConfig('fritzbox_dsl')
   elif len(sys.argv) == 2 and sys.argv[1] == 'autoconf':
     print("yes")  # Some docs say it'll be called with fetch, some say no arg at all
   elif len(sys.argv) == 1 or (len(sys.argv) == 2 and sys.argv[1] == 'fetch'):
     try:
-      print_dsl_stats()
+      if not printCachedFetch('fritzbox_dsl') and not printTargets('fritzbox_dsl'):
+        print_dsl_stats()
     except Exception as e:
       sys.exit("Couldn't retrieve fritzbox dsl stats: " + str(e))
@@ -14,6 +14,8 @@
   env.fritzbox_password [fritzbox password]
   env.fritzbox_user [fritzbox user, set any value if not required]
   env.ecostat_modes [cpu] [temp] [ram]
+  env.ecostat_spool [seconds between two values of the ecoStat history]
+                    (optional, prints all values since the last fetch)
 
   This plugin supports the following munin configuration parameters:
   #%# family=auto contrib
@@ -21,35 +23,49 @@
 """
 
 import os
-import re
 import sys
-import json
+import time
+from functools import lru_cache
+from FritzboxConfig import FritzboxConfig
 from FritzboxInterface import FritzboxInterface
+from FritzboxJson import seriesTails
+from FritzboxOutput import Field, Graph, OutputBuffer
+from FritzboxSpool import FritzboxSpool, getSpoolAttributes
+from FritzboxCollector import printCachedConfig, printCachedFetch, printTargets
 
 PAGE = 'data.lua'
 PARAMS = {'xhr':1, 'lang':'de', 'page':'ecoStat', 'xhrId':'all', 'useajax':1, 'no_sidrenew':None}
 RAMLABELS = ['strict', 'cache', 'free']
+# values printed at most per fetch in spool mode
+MAX_SPOOLED = 360
 
 def get_modes():
   return os.getenv('ecostat_modes').split(' ')
 
-def print_simple_series(data, name, graph, low=None, high=None):
-  """print last value of first json data series"""
-  print_multi_series(data, [name], graph, low, high)
+def get_spool_interval():
+  return int(os.getenv('ecostat_spool', 0))
 
-def print_multi_series(data, names, graph, low=None, high=None):
-  """print last value of multiple json data series"""
+def print_simple_series(output, tails, name, graph, low=None, high=None, timestamps=None):
+  """print last values of first json data series"""
+  print_multi_series(output, tails, [name], graph, low, high, timestamps)
 
-  print("multigraph " + graph)
-  series = data['series']
+def print_multi_series(output, tails, names, graph, low=None, high=None, timestamps=None):
+  """print last values of multiple json data series, with their timestamps if given"""
+
+  output.multigraph(graph)
   for i in range(len(names)):
-    s = series[i]
     n = names[i]
-    val = s[-1] # last entry is latest measurement
-    if (low is None or float(val) > low) and (high is None or float(val) < high):
-      print(n + '.value ' + str(val))
-    else:
-      print("# " + str(val) + " exceeded limits " + str(low) + " - " + str(high))
+    tail = tails[i] # last entry is latest measurement
+    for j in range(len(tail)):
+      val = tail[j]
+      if timestamps is None:
+        value = str(val)
+      else:
+        value = str(timestamps[j - len(tail)]) + ':' + str(val)
+      if (low is None or float(val) > low) and (high is None or float(val) < high):
+        output.value(n, value)
+      else:
+        output.line("# " + str(val) + " exceeded limits " + str(low) + " - " + str(high))
 
 def print_system_stats():
   """print the current system statistics"""
@@ -57,71 +73,76 @@ def print_system_stats():
   modes = get_modes()
 
   # download the graphs
-  data = FritzboxInterface().postPageWithLogin(PAGE, data=PARAMS)
-  jsondata = json.loads(data)['data']
+  interface = FritzboxInterface()
+  data = interface.postPageWithLogin(PAGE, data=PARAMS)
+
+  count = 1
+  timestamps = None
+  interval = get_spool_interval()
+  if interval:
+    # print the history since the last fetch, the latest value was measured now
+    spool = FritzboxSpool(FritzboxConfig(), 'fritzbox_ecostat')
+    now = int(time.time())
+    last = spool.lastEmitted()
+    if last is not None:
+      count = max(1, min(MAX_SPOOLED, (now - last) // interval))
+    timestamps = [now - i * interval for i in range(count - 1, -1, -1)]
+
+  # only the latest values are decoded, not the whole history of the series
+  with interface.parsing(PAGE, PARAMS):
+    cpuload_data = seriesTails(data, 'cpuutil', count) if 'cpu' in modes else None
+    cputemp_data = seriesTails(data, 'cputemp', count) if 'temp' in modes else None
+    ramusage_data = seriesTails(data, 'ramusage', count) if 'ram' in modes else None
+
+  with OutputBuffer() as output:
+    if 'cpu' in modes:
+      print_simple_series(output, cpuload_data, 'load', 'cpuload', timestamps=timestamps)
+
+    if 'temp' in modes:
+      print_simple_series(output, cputemp_data, 'temp', 'cputemp', low=0, high=120, timestamps=timestamps)
+
+    if 'ram' in modes:
+      print_multi_series(output, ramusage_data, RAMLABELS, 'ramusage', timestamps=timestamps)
+
+  if interval:
+    spool.setLastEmitted(now)
+
+@lru_cache()
+def get_graphs(modes, interval):
+  """the graphs of the modes, kept per settings so their config is rendered once"""
+  spool = getSpoolAttributes(interval)
+  graphs = []
 
   if 'cpu' in modes:
-    cpuload_data = jsondata['cpuutil']
-    print_simple_series(cpuload_data, 'load', 'cpuload')
+    graphs.append(Graph('cpuload', [
+      Field('load', label='system', type='GAUGE', graph='LINE1', min=0, info='Fritzbox CPU usage')],
+      title='CPU usage', **spool, vlabel='%', category='system', order='cpu', scale='no'))
 
   if 'temp' in modes:
-    cputemp_data = jsondata['cputemp']
-    print_simple_series(cputemp_data, 'temp', 'cputemp', low=0, high=120)
+    graphs.append(Graph('cputemp', [
+      Field('temp', label='CPU temperature', type='GAUGE', graph='LINE1', min=0, info='Fritzbox CPU temperature')],
+      title='CPU temperature', **spool, vlabel='degrees Celsius', category='sensors', order='tmp', scale='no'))
 
   if 'ram' in modes:
-    ramusage_data = jsondata['ramusage']
-    print_multi_series(ramusage_data, RAMLABELS, 'ramusage')
+    graphs.append(Graph('ramusage', [Field(l, label=l, type='GAUGE', draw='AREASTACK') for l in RAMLABELS],
+      title='Memory', **spool, vlabel='%', args='--base 1000 -r --lower-limit 0 --upper-limit 100',
+      category='system', order='strict cache free', info='This graph shows what the Fritzbox uses memory for.',
+      scale='no'))
 
-def print_config():
-  modes = get_modes()
-
-  if 'cpu' in modes:
-    print("multigraph cpuload")
-    print("graph_title CPU usage")
-    print("graph_vlabel %")
-    print("graph_category system")
-    print("graph_order cpu")
-    print("graph_scale no")
-    print("load.label system")
-    print("load.type GAUGE")
-    print("load.graph LINE1")
-    print("load.min 0")
-    print("load.info Fritzbox CPU usage")
+  return graphs
 
-  if 'temp' in modes:
-    print("multigraph cputemp")
-    print("graph_title CPU temperature")
-    print("graph_vlabel degrees Celsius")
-    print("graph_category sensors")
-    print("graph_order tmp")
-    print("graph_scale no")
-    print("temp.label CPU temperature")
-    print("temp.type GAUGE")
-    print("temp.graph LINE1")
-    print("temp.min 0")
-    print("temp.info Fritzbox CPU temperature")
-
-  if 'ram' in modes:
-    print("multigraph ramusage")
-    print("graph_title Memory")
-    print("graph_vlabel %")
-    print("graph_args --base 1000 -r --lower-limit 0 --upper-limit 100")
-    print("graph_category system")
-    print("graph_order strict cache free")
-    print("graph_info This graph shows what the Fritzbox uses memory for.")
-    print("graph_scale no")
-    for l in RAMLABELS:
-      print(l + ".label " + l)
-      print(l + ".type GAUGE")
-      print(l + ".draw AREASTACK")
+def print_config():
+  with OutputBuffer() as output:
+    output.config(get_graphs(tuple(get_modes()), get_spool_interval()))
 
 if __name__ == "__main__":
   if len(sys.argv) == 2 and sys.argv[1] == 'config':
-    print_config()
+    printCachedConfig('fritzbox_ecostat')
   elif len(sys.argv) == 2 and sys.argv[1] == 'autoconf':
     print("yes")  # Some docs say it'll be called with fetch, some say no arg at all
   elif len(sys.argv) == 1 or (len(sys.argv) == 2 and sys.argv[1] == 'fetch'):
     try:
-      print_system_stats()
+      if not printCachedFetch('fritzbox_ecostat') and not printTargets('fritzbox_ecostat'):
+        print_system_stats()
     except Exception as e:
       sys.exit("Couldn't retrieve fritzbox system stats: " + str(e))
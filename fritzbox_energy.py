@@ -24,8 +24,11 @@
 import os
 import re
 import sys
-import json
+from functools import lru_cache
 from FritzboxInterface import FritzboxInterface
+from FritzboxOutput import Field, Graph, OutputBuffer
+from FritzboxJson import findValue
+from FritzboxCollector import printCachedConfig, printCachedFetch, printTargets
 
 PAGE = 'data.lua'
 PARAMS = {'xhr':1, 'lang':'de', 'page':'energy', 'xhrId':'all', 'useajax':1, 'no_sidrenew':None}
@@ -63,113 +66,107 @@ def get_devices_for(type):
     return DEVICES_REPEATER
   raise Exception("No such type")
 
-def print_energy_stats():
-    """print the current energy statistics"""
-
-    modes = get_modes()
-    type = get_type()
-
-    # download the graphs
-    data = FritzboxInterface().postPageWithLogin(PAGE, data=PARAMS)
-    jsondata = json.loads(data)['data']['drain']
-
-    devices = get_devices_for(type)
+def parse_energy_stats(data, modes, devices):
+    """parse the values of the enabled modes from the energy page"""
+    jsondata = findValue(data, 'drain')
+    values = {}
 
     if 'power' in modes:
-      print("multigraph power")
+      values['power'] = {}
       for i in range(len(devices)):
-        if not HASPOWERSTATS[devices[i]]:
-          continue
-        val = jsondata[i]['actPerc']
-        print(devices[i] + ".value " + str(val))
-    
+        if HASPOWERSTATS[devices[i]]:
+          values['power'][devices[i]] = jsondata[i]['actPerc']
+
     if 'devices' in modes:
-      print("multigraph devices")
+      values['devices'] = {}
       # this is an array
       statuses_wifi = jsondata[devices.index('wifi')]['statuses']
       if len(statuses_wifi) == 2:
         line = statuses_wifi[1]
-        num = line.split()[0]
-        print('wifi.value ' + num)
+        values['devices']['wifi'] = line.split()[0]
       # this is a string (AVM, whyyy?)
       status_lan = jsondata[devices.index('lan')]['statuses']
-      num = status_lan.split()[0]
-      print('lan.value ' + num)
-      
+      values['devices']['lan'] = status_lan.split()[0]
+
     if 'uptime' in modes:
-      print("multigraph uptime")
       status_uptime = jsondata[devices.index('system')]['statuses']
-      matches = re.finditer(pattern, status_uptime)
-      if matches:
-        hours = 0.0
-        for m in matches:
-            if m.group(2) == dayLoc[locale]:
-                hours += 24 * int(m.group(1))
-            if m.group(2) == hourLoc[locale]:
-                hours += int(m.group(1))
-            if m.group(2) == minutesLoc[locale]:
-                hours += int(m.group(1)) / 60.0
-        uptime = hours / 24
-        print("uptime.value %.2f" % uptime)
+      hours = 0.0
+      for m in re.finditer(pattern, status_uptime):
+        if m.group(2) == dayLoc[locale]:
+          hours += 24 * int(m.group(1))
+        if m.group(2) == hourLoc[locale]:
+          hours += int(m.group(1))
+        if m.group(2) == minutesLoc[locale]:
+          hours += int(m.group(1)) / 60.0
+      values['uptime'] = hours / 24
+
+    return values
+
+def print_energy_stats():
+    """print the current energy statistics"""
 
-def print_config():
     modes = get_modes()
     type = get_type()
     devices = get_devices_for(type)
 
+    # download the graphs
+    interface = FritzboxInterface()
+    data = interface.postPageWithLogin(PAGE, data=PARAMS)
+    with interface.parsing(PAGE, PARAMS):
+      values = parse_energy_stats(data, modes, devices)
+
+    with OutputBuffer() as output:
+      if 'power' in modes:
+        output.multigraph("power")
+        for device, val in values['power'].items():
+          output.value(device, val)
+
+      if 'devices' in modes:
+        output.multigraph("devices")
+        for device, num in values['devices'].items():
+          output.value(device, num)
+
+      if 'uptime' in modes:
+        output.multigraph("uptime")
+        output.value("uptime", "%.2f" % values['uptime'])
+
+@lru_cache()
+def get_graphs(type, modes):
+    """the graphs of the modes, kept per settings so their config is rendered once"""
+    devices = get_devices_for(type)
+    graphs = []
+
     if 'power' in modes:
-      print("multigraph power")
-      print("graph_title Power Consumption")
-      print("graph_vlabel %")
-      print("graph_args --lower-limit 0 --upper-limit 100 --rigid")
-      print("graph_category system")
-      order = ""
-      for d in devices:
-        if HASPOWERSTATS[d]:
-          order += " " + d
-      print("graph_order" + order)
-      for d in devices:
-        if not HASPOWERSTATS[d]:
-          continue
-        print(d + ".label " + d)
-        print(d + ".type GAUGE")
-        print(d + ".graph LINE1")
-        print(d + ".min 0")
-        print(d + ".max 100")
-        print(d + ".info " + INFO[d])
+      powered = [d for d in devices if HASPOWERSTATS[d]]
+      graphs.append(Graph('power', [
+        Field(d, label=d, type='GAUGE', graph='LINE1', min=0, max=100, info=INFO[d]) for d in powered],
+        title='Power Consumption', vlabel='%', args='--lower-limit 0 --upper-limit 100 --rigid',
+        category='system', order=' '.join(powered)))
 
     if 'devices' in modes:
-      print("multigraph devices")
-      print("graph_title Connected Devices")
-      print("graph_vlabel Number of devices")
-      print("graph_args --base 1000")
-      print("graph_category network")
-      print("wifi.type GAUGE")
-      print("wifi.graph LINE1")
-      print("wifi.label wifi")
-      print("wifi.info Wifi Connections on 2.4 & 5 Ghz")
-      print("lan.type GAUGE")
-      print("lan.graph LINE1")
-      print("lan.label lan")
-      print("lan.info LAN Connections")
+      graphs.append(Graph('devices', [
+        Field('wifi', type='GAUGE', graph='LINE1', label='wifi', info='Wifi Connections on 2.4 & 5 Ghz'),
+        Field('lan', type='GAUGE', graph='LINE1', label='lan', info='LAN Connections')],
+        title='Connected Devices', vlabel='Number of devices', args='--base 1000', category='network'))
 
     if 'uptime' in modes:
-      print("multigraph uptime")
-      print("graph_title Uptime")
-      print("graph_vlabel uptime in days")
-      print("graph_args --base 1000 -l 0")
-      print("graph_scale no")
-      print("graph_category system")
-      print("uptime.label uptime")
-      print("uptime.draw AREA")
+      graphs.append(Graph('uptime', [Field('uptime', label='uptime', draw='AREA')],
+        title='Uptime', vlabel='uptime in days', args='--base 1000 -l 0', scale='no', category='system'))
+
+    return graphs
+
+def print_config():
+    with OutputBuffer() as output:
+      output.config(get_graphs(get_type(), tuple(get_modes())))
 
 if __name__ == "__main__":
   if len(sys.argv) == 2 and sys.argv[1] == 'config':
-    print_config()
+    printCachedConfig('fritzbox_energy')
   elif len(sys.argv) == 2 and sys.argv[1] == 'autoconf':
     print("yes")  # Some docs say it'll be called with fetch, some say no arg at all
   elif len(sys.argv) == 1 or (len(sys.argv) == 2 and sys.argv[1] == 'fetch'):
     try:
-      print_energy_stats()
+      if not printCachedFetch('fritzbox_energy') and not printTargets('fritzbox_energy'):
+        print_energy_stats()
     except Exception as e:
       sys.exit("Couldn't retrieve fritzbox energy stats: " + str(e))
@@ -13,6 +13,8 @@
   env.fritzbox_ip [ip address of the fritzbox]
   env.fritzbox_password [fritzbox password]
   env.fritzbox_user [fritzbox user, set any value if not required]
+  env.saturation_stats [min] [max] [p95] (optional, adds a sub-graph per
+                       statistic of the sample window to both graphs)
 
   This plugin supports the following munin configuration parameters:
   #%# family=auto contrib
@@ -20,10 +22,13 @@
 """
 
 import os
-import re
 import sys
 import json
+from functools import lru_cache
 from FritzboxInterface import FritzboxInterface
+from FritzboxOutput import Field, Graph, OutputBuffer
+from FritzboxStatistics import RunningStatistics
+from FritzboxCollector import printCachedConfig, printCachedFetch, printTargets
 
 PAGE = 'internet/inetstat_monitor.lua'
 PARAMS = {'useajax':1, 'action':'get_graphic', 'xhr':1, 'myXhr':1}
@@ -31,72 +36,103 @@ DATA_UP   = ['us_realtime_bps_curr', 'us_important_bps_curr', 'us_default_bps_cu
 LABELS_UP = ['realtime', 'high', 'default', 'low']
 DATA_DN   = ['ds_bps_curr', 'ds_mc_bps_curr']
 LABELS_DN = ['internet', 'iptv']
+STATS = {
+  'min': ('minimum', lambda s: s.minimum),
+  'max': ('maximum', lambda s: s.maximum),
+  'p95': ('95th percentile', lambda s: s.percentile()),
+}
 
-def average_bps(datapoints):
-  avg = 0
-  for d in datapoints:
-    avg+=d
-  avg = avg//len(datapoints)
-  return avg
+def get_stats():
+  return [s for s in os.getenv('saturation_stats', '').split(' ') if s in STATS]
+
+def series_stats(datapoints):
+  stats = RunningStatistics(len(datapoints))
+  stats.update(datapoints)
+  return stats
+
+def series_mean(datapoints):
+  """the mean of a series without the heap RunningStatistics keeps for the percentile"""
+  return sum(datapoints) // len(datapoints) if datapoints else None
+
+def unknown(value):
+  """munin's U for the statistics of an empty series"""
+  return 'U' if value is None else value
 
 def print_link_saturation():
   """get the current DSL link saturation"""
 
-  data = FritzboxInterface().getPageWithLogin(PAGE, data=PARAMS)
-  # all data is embedded in a one-element array, so strip that array away
-  jsondata = json.loads(data)[0]
+  interface = FritzboxInterface()
+  data = interface.getPageWithLogin(PAGE, data=PARAMS)
+  with interface.parsing(PAGE, PARAMS):
+    # all data is embedded in a one-element array, so strip that array away
+    jsondata = json.loads(data)[0]
 
   # parse scientific notations of integers
   maxup = int(float(jsondata['upstream']))
   maxdown = int(float(jsondata['downstream']))
 
-  print("multigraph saturation_up")
-  for i in range(len(DATA_UP)):
-    print('up_' + LABELS_UP[i] + '.value ' + str(average_bps(jsondata[DATA_UP[i]])))
-  print("maxup.value " + str(maxup))
-  print("multigraph saturation_down")
-  for i in range(len(DATA_DN)):
-    print('dn_' + LABELS_DN[i] + '.value ' + str(average_bps(jsondata[DATA_DN[i]])))
-  print("maxdown.value " + str(maxdown))
+  stats = get_stats()
+  if stats:
+    # one pass over every series for the mean and all other statistics
+    up = [series_stats(jsondata[d]) for d in DATA_UP]
+    down = [series_stats(jsondata[d]) for d in DATA_DN]
+    upMeans = [s.mean() for s in up]
+    downMeans = [s.mean() for s in down]
+  else:
+    upMeans = [series_mean(jsondata[d]) for d in DATA_UP]
+    downMeans = [series_mean(jsondata[d]) for d in DATA_DN]
+
+  with OutputBuffer() as output:
+    output.multigraph("saturation_up")
+    for i in range(len(DATA_UP)):
+      output.value('up_' + LABELS_UP[i], unknown(upMeans[i]))
+    output.value("maxup", maxup)
+    for stat in stats:
+      output.multigraph("saturation_up." + stat)
+      for i in range(len(DATA_UP)):
+        output.value('up_' + LABELS_UP[i], unknown(STATS[stat][1](up[i])))
+
+    output.multigraph("saturation_down")
+    for i in range(len(DATA_DN)):
+      output.value('dn_' + LABELS_DN[i], unknown(downMeans[i]))
+    output.value("maxdown", maxdown)
+    for stat in stats:
+      output.multigraph("saturation_down." + stat)
+      for i in range(len(DATA_DN)):
+        output.value('dn_' + LABELS_DN[i], unknown(STATS[stat][1](down[i])))
+
+def get_direction_graphs(name, title, vlabel, prefix, labels, maxField, order, stats):
+  """the graph of one direction and its sub-graphs with statistics"""
+  def fields(draw):
+    return [Field(prefix + l, label=l, type='GAUGE', draw=draw, cdef=prefix + l + ',8,*') for l in labels]
+
+  graphs = [Graph(name, fields('AREASTACK') + [Field(maxField, label='MAX', type='GAUGE', graph='LINE1')],
+    title=title, vlabel=vlabel, category='network', args='--base 1000 --lower-limit 0', order=order)]
+  for stat in stats:
+    graphs.append(Graph(name + '.' + stat, fields('LINE1'),
+      title=title + ', ' + STATS[stat][0], vlabel=vlabel, category='network', args='--base 1000 --lower-limit 0'))
+  return graphs
+
+@lru_cache()
+def get_graphs(stats):
+  """the graphs with the statistics, kept per settings so their config is rendered once"""
+  return (get_direction_graphs('saturation_up', 'Uplink saturation', 'bits out per ${graph_period}', 'up_',
+                               LABELS_UP, 'maxup', ' '.join(LABELS_UP) + ' maxdown', stats)
+          + get_direction_graphs('saturation_down', 'Downlink saturation', 'bits in per ${graph_period}', 'dn_',
+                                 LABELS_DN, 'maxdown', ' '.join(LABELS_DN) + ' maxup', stats))
 
 def print_config():
-  print("multigraph saturation_up")
-  print("graph_title Uplink saturation")
-  print("graph_vlabel bits out per ${graph_period}")
-  print("graph_category network")
-  print("graph_args --base 1000 --lower-limit 0")
-  print("graph_order " + ' '.join(LABELS_UP) + " maxdown")
-  for l in LABELS_UP:
-    print('up_' + l + '.label ' + l)
-    print('up_' + l + '.type GAUGE')
-    print('up_' + l + '.draw AREASTACK')
-    print('up_' + l + '.cdef up_' + l + ',8,*')
-  print("maxup.label MAX")
-  print("maxup.type GAUGE")
-  print("maxup.graph LINE1")
-
-  print("multigraph saturation_down")
-  print("graph_title Downlink saturation")
-  print("graph_vlabel bits in per ${graph_period}")
-  print("graph_category network")
-  print("graph_args --base 1000 --lower-limit 0")
-  print("graph_order " + ' '.join(LABELS_DN) + " maxup")
-  for l in LABELS_DN:
-    print('dn_' + l + '.label ' + l)
-    print('dn_' + l + '.type GAUGE')
-    print('dn_' + l + '.draw AREASTACK')
-    print('dn_' + l + '.cdef dn_' + l + ',8,*')
-  print("maxdown.label MAX")
-  print("maxdown.type GAUGE")
-  print("maxdown.graph LINE1")
+  with OutputBuffer() as output:
+    output.config(get_graphs(tuple(get_stats())))
 
 if __name__ == "__main__":
   if len(sys.argv) == 2 and sys.argv[1] == 'config':
-    print_config()
+    printCachedConfig('fritzbox_link_saturation')
   elif len(sys.argv) == 2 and sys.argv[1] == 'autoconf':
     print("yes")  # Some docs say it'll be called with fetch, some say no arg at all
   elif len(sys.argv) == 1 or (len(sys.argv) == 2 and sys.argv[1] == 'fetch'):
     try:
-      print_link_saturation()
+      if not printCachedFetch('fritzbox_link_saturation') and not printTargets('fritzbox_link_saturation'):
+        print_link_saturation()
     except Exception as e:
       sys.exit("Couldn't retrieve fritzbox link saturation: " + str(e))
@@ -2,39 +2,148 @@
 """
   fritzbox_smart_home_temperature - A munin plugin for Linux to monitor AVM Fritzbox SmartHome temperatures
 
+  @see https://avm.de/fileadmin/user_upload/Global/Service/Schnittstellen/AHA-HTTP-Interface.pdf
   @see https://avm.de/fileadmin/user_upload/Global/Service/Schnittstellen/x_homeauto.pdf
+
+  All devices are read with a single getdevicelistinfos request of the AHA
+  interface, falling back to one TR-064 request per device if that fails.
+  If the box refuses the AHA request or lacks it, e.g. because the user has
+  no smart home permission, TR-064 is used right away for a day.
+  The device list is kept for config, so config does not rescan the devices.
+
+  Add the following section to your munin-node's plugin configuration:
+
+  [fritzbox_*]
+  env.fritzbox_ip [ip address of the fritzbox]
+  env.fritzbox_password [fritzbox password]
+  env.fritzbox_user [fritzbox user with smart home permission]
+  env.smarthome_devices_maxage [seconds config reuses the device list, optional, default 3600]
 """
 
 import os
-import re
 import sys
-from fritzconnection import FritzConnection
+import json
+import time
 from FritzboxConfig import FritzboxConfig
+from FritzboxConfigCache import FritzboxConfigCache
+from FritzboxInterface import FritzboxInterface
+from FritzboxOutput import Field, Graph, OutputBuffer
+from FritzboxStateFile import writeStateFile
+from FritzboxTR064 import getConnection
+from FritzboxCollector import printCachedConfig, printCachedFetch, printTargets
+
+PAGE = 'webservices/homeautoswitch.lua'
+PARAMS = {'switchcmd': 'getdevicelistinfos'}
+DEVICES_MAXAGE = 3600
+# users refused the AHA interface are tried again after a day, they might have been given the permission
+AHA_UNSUPPORTED_MAXAGE = 86400
 
 def printSmartHomeTemperature():
     """get the current cpu temperature"""
 
-    for data in retrieveSmartHomeTemps():
-      print ("t{}.value {}".format(data['NewDeviceId'],float(data['NewTemperatureCelsius']) / 10))
+    with OutputBuffer() as output:
+      for data in retrieveSmartHomeTemps():
+        output.value('t{}'.format(data['NewDeviceId']), float(data['NewTemperatureCelsius']) / 10)
 
 def printConfig():
-    print("graph_title Smart Home temperature")
-    print("graph_vlabel degrees Celsius")
-    print("graph_category sensors")
-    print("graph_scale no")
+    fields = [Field('t{}'.format(data['NewDeviceId']), label=data['NewDeviceName'], type='GAUGE', graph='LINE',
+                    info='Temperature [{}]'.format(data['NewProductName'])) for data in retrieveSmartHomeDevices()]
+    with OutputBuffer() as output:
+      output.config(Graph(None, fields,
+        title='Smart Home temperature', vlabel='degrees Celsius', category='sensors', scale='no'))
+
+def getDevicesFilename():
+    return os.getenv('MUNIN_PLUGSTATE') + '/fritzbox/' + FritzboxConfig().server + '__smart_home_devices.json'
+
+def saveSmartHomeDevices(smartHomeData):
+    filename = getDevicesFilename()
+    if not os.path.exists(os.path.dirname(filename)):
+      os.makedirs(os.path.dirname(filename))
+    devices = [{k: data[k] for k in ('NewDeviceId', 'NewDeviceName', 'NewProductName')} for data in smartHomeData]
+    # the config lists the devices, it is generated again when they changed
+    FritzboxConfigCache(FritzboxConfig(), 'fritzbox_smart_home_temperature').setCapabilities(devices)
+    writeStateFile(filename, json.dumps(devices))
 
-    for data in retrieveSmartHomeTemps():
-        print ("t{}.label {}".format(data['NewDeviceId'],data['NewDeviceName']))
-        print ("t{}.type GAUGE".format(data['NewDeviceId']))
-        print ("t{}.graph LINE".format(data['NewDeviceId']))
-        print ("t{}.info Temperature [{}]".format(data['NewDeviceId'],data['NewProductName']))
+def retrieveSmartHomeDevices():
+    """get the devices with temperature sensor, reusing the list of the last fetch"""
+
+    filename = getDevicesFilename()
+    maxage = int(os.getenv('smarthome_devices_maxage', DEVICES_MAXAGE))
+    try:
+      if time.time() - os.path.getmtime(filename) <= maxage:
+        with open(filename, 'r') as devicesfile:
+          return json.load(devicesfile)
+    except (OSError, ValueError):
+      pass
+    return retrieveSmartHomeTemps()
+
+def getAhaUnsupportedFilename():
+    config = FritzboxConfig()
+    return os.getenv('MUNIN_PLUGSTATE') + '/fritzbox/' + config.server + '__' + config.user + '__aha_unsupported'
+
+def ahaSupported():
+    """False if the AHA interface was recently refused"""
+    try:
+      return time.time() - os.path.getmtime(getAhaUnsupportedFilename()) > AHA_UNSUPPORTED_MAXAGE
+    except OSError:
+      return True
+
+def setAhaUnsupported():
+    filename = getAhaUnsupportedFilename()
+    if not os.path.exists(os.path.dirname(filename)):
+      os.makedirs(os.path.dirname(filename))
+    with open(filename, 'w'):
+      pass
 
 def retrieveSmartHomeTemps():
+    smartHomeData = None
+    if ahaSupported():
+      from requests.exceptions import HTTPError
+
+      try:
+        smartHomeData = retrieveSmartHomeTempsAha()
+      except HTTPError as e:
+        # the AHA interface needs a user with smart home permission, TR-064 does not
+        if e.response is not None and e.response.status_code in (403, 404):
+          setAhaUnsupported()
+      except (Exception, SystemExit):
+        # e.g. the box is busy, the AHA interface is tried again next time
+        pass
+    if smartHomeData is None:
+      smartHomeData = retrieveSmartHomeTempsTr064()
+    saveSmartHomeDevices(smartHomeData)
+    return smartHomeData
+
+def retrieveSmartHomeTempsAha():
+    """get all devices with a single request, in the format of GetGenericDeviceInfos"""
+
+    from lxml import etree
+
+    smartHomeData = []
+    interface = FritzboxInterface()
+    data = interface.getPageWithLogin(PAGE, data=PARAMS)
+    with interface.parsing(PAGE, PARAMS):
+      root = etree.fromstring(data)
+    for device in root.iter('device'):
+      celsius = device.findtext('temperature/celsius')
+      # devices without sensor have no temperature, disconnected ones an empty one
+      if not celsius:
+        continue
+      smartHomeData.append({
+        'NewDeviceId': device.get('id'),
+        'NewDeviceName': device.findtext('name'),
+        'NewProductName': device.get('productname'),
+        'NewTemperatureCelsius': celsius
+      })
+
+    return smartHomeData
+
+def retrieveSmartHomeTempsTr064():
     smartHomeData = []
     config = FritzboxConfig()
 
     try:
-      connection = FritzConnection(address=config.server, password=config.password, use_tls=config.useTls)
+      connection = getConnection(config)
     except Exception as e:
       sys.exit("Couldn't get temperature: " + str(e))
 
@@ -51,12 +160,13 @@ def retrieveSmartHomeTemps():
 
 if __name__ == '__main__':
   if len(sys.argv) == 2 and sys.argv[1] == 'config':
-    printConfig()
+    printCachedConfig('fritzbox_smart_home_temperature')
   elif len(sys.argv) == 2 and sys.argv[1] == 'autoconf':
     print('yes')
   elif len(sys.argv) == 1 or len(sys.argv) == 2 and sys.argv[1] == 'fetch':
     # Some docs say it'll be called with fetch, some say no arg at all
     try:
-      printSmartHomeTemperature()
+      if not printCachedFetch('fritzbox_smart_home_temperature') and not printTargets('fritzbox_smart_home_temperature'):
+        printSmartHomeTemperature()
     except Exception as e:
       sys.exit("Couldn't retrieve fritzbox smarthome temperatures: " + str(e))
\ No newline at end of file
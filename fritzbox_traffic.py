@@ -13,6 +13,11 @@
   [fritzbox_*]
   env.fritzbox_ip [ip address of the fritzbox]
   env.traffic_remove_max [0|1]
+  env.traffic_spool [seconds between two samples] (optional)
+
+  With traffic_spool, fetch prints the samples taken since the last fetch by
+  running the plugin with the argument sample every traffic_spool seconds,
+  e.g. from cron: munin-run fritzbox_traffic sample
 
   This plugin supports the following munin configuration parameters:
   #%# family=auto contrib
@@ -21,66 +26,129 @@
 
 import os
 import sys
-from fritzconnection.lib.fritzstatus import FritzStatus
+import json
+import time
+from functools import lru_cache
 from FritzboxConfig import FritzboxConfig
+from FritzboxConfigCache import FritzboxConfigCache
+from FritzboxTR064 import getConnection
+from FritzboxOutput import Field, Graph, OutputBuffer
+from FritzboxSpool import FritzboxSpool, getSpoolAttributes
+from FritzboxStateFile import writeStateFile
+from FritzboxCollector import printCachedConfig, printCachedFetch, printTargets
+
+# the link properties only change on resync, share them within a munin cycle
+LINK_PROPERTIES_MAXAGE = 300
+
+def getSpoolInterval():
+  return int(os.getenv('traffic_spool', 0))
+
+def showMax():
+  return not os.environ.get('traffic_remove_max') or "false" in os.environ.get('traffic_remove_max')
+
+@lru_cache()
+def getGraph(interval, max_traffic, withMax):
+  """the graph, kept per settings and link rate so its config is rendered once"""
+  fields = [
+    Field('down', label='received', type='DERIVE', graph='no', cdef='down,8,*', min=0, max='%d' % max_traffic[1]),
+    Field('up', label='bps', type='DERIVE', draw='LINE', cdef='up,8,*', min=0, max='%d' % max_traffic[0],
+          negative='down', info='Traffic of the WAN interface.'),
+  ]
+  if withMax:
+    fields += [
+      Field('maxdown', label='received', type='GAUGE', graph='no'),
+      Field('maxup', label='MAX', type='GAUGE', negative='maxdown', draw='LINE1', info='Maximum speed of the WAN interface.'),
+    ]
+  return Graph(None, fields, title='WAN traffic', **getSpoolAttributes(interval), args='--base 1000',
+               vlabel='bit in (-) / out (+) per ${graph_period}', category='network', order='down up maxdown maxup')
 
 class FritzboxTraffic:
+  __config = None
+  __connection = None
+
   def __init__(self):
-    config = FritzboxConfig()
+    self.__config = FritzboxConfig()
+
+  def __getConnection(self):
+    if self.__connection is None:
+      try:
+        self.__connection = getConnection(self.__config)
+      except Exception as e:
+        sys.exit("Couldn't get WAN traffic: " + str(e))
+    return self.__connection
+
+  def getTransmissionRate(self):
+    """upstream and downstream in bytes per second, read with a single action"""
+    status = self.__getConnection().call_action('WANCommonIFC1', 'GetAddonInfos')
+    return (status['NewByteSendRate'], status['NewByteReceiveRate'])
+
+  def getMaxBitRate(self):
+    """upstream and downstream link rate in bits per second, read at most once per munin cycle"""
+    filename = os.getenv('MUNIN_PLUGSTATE') + '/fritzbox/' + self.__config.server + '__link_properties.json'
     try:
-      self.__connection = FritzStatus(address=config.server, password=config.password, use_tls=config.useTls)
-    except Exception as e:
-      sys.exit("Couldn't get WAN traffic: " + str(e))
+      if time.time() - os.path.getmtime(filename) <= LINK_PROPERTIES_MAXAGE:
+        with open(filename, 'r') as statefile:
+          return tuple(json.load(statefile))
+    except (OSError, ValueError):
+      pass
+
+    status = self.__getConnection().call_action('WANCommonIFC1', 'GetCommonLinkProperties')
+    max_traffic = (status['NewLayer1UpstreamMaxBitRate'], status['NewLayer1DownstreamMaxBitRate'])
+    # the config shows the link rate, it is generated again when it changed
+    FritzboxConfigCache(self.__config, 'fritzbox_traffic').setCapabilities(max_traffic)
+    if not os.path.exists(os.path.dirname(filename)):
+      os.makedirs(os.path.dirname(filename))
+    writeStateFile(filename, json.dumps(max_traffic))
+    return max_traffic
+
+  def sampleTraffic(self):
+    """add the current transmission rate to the spool"""
+    traffic = self.getTransmissionRate()
+    FritzboxSpool(self.__config, 'fritzbox_traffic', fields=2).append(time.time(), traffic)
 
   def printTraffic(self):
-    traffic = self.__connection.transmission_rate
-    print('down.value %d' % traffic[1])
-    print('up.value %d' % traffic[0])
+    samples = []
+    if getSpoolInterval():
+      samples = FritzboxSpool(self.__config, 'fritzbox_traffic', fields=2).drain()
+    with OutputBuffer() as output:
+      if samples:
+        for timestamp, traffic in samples:
+          output.value('down', '%d:%d' % (timestamp, traffic[1]))
+          output.value('up', '%d:%d' % (timestamp, traffic[0]))
+      else:
+        # no sampler ran since the last fetch
+        traffic = self.getTransmissionRate()
+        output.value('down', '%d' % traffic[1])
+        output.value('up', '%d' % traffic[0])
 
-    if not os.environ.get('traffic_remove_max') or "false" in os.environ.get('traffic_remove_max'):
-      max_traffic = self.__connection.max_bit_rate
-      print('maxdown.value %d' % max_traffic[1])
-      print('maxup.value %d' % max_traffic[0])
+      if showMax():
+        max_traffic = self.getMaxBitRate()
+        output.value('maxdown', '%d' % max_traffic[1])
+        output.value('maxup', '%d' % max_traffic[0])
 
   def printConfig(self):
-    max_traffic = self.__connection.max_bit_rate
-
-    print("graph_title WAN traffic")
-    print("graph_args --base 1000")
-    print("graph_vlabel bit in (-) / out (+) per ${graph_period}")
-    print("graph_category network")
-    print("graph_order down up maxdown maxup")
-    print("down.label received")
-    print("down.type DERIVE")
-    print("down.graph no")
-    print("down.cdef down,8,*")
-    print("down.min 0")
-    print("down.max %d" % max_traffic[1])
-    print("up.label bps")
-    print("up.type DERIVE")
-    print("up.draw LINE")
-    print("up.cdef up,8,*")
-    print("up.min 0")
-    print("up.max %d" % max_traffic[0])
-    print("up.negative down")
-    print("up.info Traffic of the WAN interface.")
-    if not os.environ.get('traffic_remove_max') or "false" in os.environ.get('traffic_remove_max'):
-      print("maxdown.label received")
-      print("maxdown.type GAUGE")
-      print("maxdown.graph no")
-      print("maxup.label MAX")
-      print("maxup.type GAUGE")
-      print("maxup.negative maxdown")
-      print("maxup.draw LINE1")
-      print("maxup.info Maximum speed of the WAN interface.")
+    with OutputBuffer() as output:
+      output.config(getGraph(getSpoolInterval(), tuple(self.getMaxBitRate()), showMax()))
 
 if __name__ == "__main__":
-    traffic = FritzboxTraffic()
     if len(sys.argv) == 2 and sys.argv[1] == 'config':
-        traffic.printConfig()
+        printCachedConfig('fritzbox_traffic')
     elif len(sys.argv) == 2 and sys.argv[1] == 'autoconf':
         print("yes")  # Some docs say it'll be called with fetch, some say no arg at all
+    elif len(sys.argv) == 2 and sys.argv[1] == 'sample':
+        from FritzboxTargets import forEachTarget, getTargets
+        try:
+            targets = getTargets()
+            if targets is None:
+                FritzboxTraffic().sampleTraffic()
+            else:
+                forEachTarget(targets, lambda target: FritzboxTraffic().sampleTraffic())
+        except Exception as e:
+            sys.exit("Couldn't sample fritzbox traffic: " + str(e))
     elif len(sys.argv) == 1 or (len(sys.argv) == 2 and sys.argv[1] == 'fetch'):
+        if printCachedFetch('fritzbox_traffic') or printTargets('fritzbox_traffic'):
+            sys.exit(0)
+        traffic = FritzboxTraffic()
         try:
             traffic.printTraffic()
         except Exception as e:
@@ -15,6 +15,8 @@
   env.fritzbox_user [fritzbox user, set any value if not required]
   env.wifi_freqs [24] [5]
   env.wifi_modes [freqs] [neighbors]
+  env.wifi_stats [max] [p95] (optional, adds the maximum and 95th percentile
+                             of the 10-minute view to the bandwidth graphs)
 
   This plugin supports the following munin configuration parameters:
   #%# family=auto contrib
@@ -22,27 +24,25 @@
 """
 
 import os
-import re
 import sys
 import json
+from functools import lru_cache
 from FritzboxInterface import FritzboxInterface
+from FritzboxOutput import Field, Graph, OutputBuffer
+from FritzboxStatistics import parsePairs, summarize
+from FritzboxCollector import printCachedConfig, printCachedFetch, printTargets
 
 PAGE = 'data.lua'
 PARAMS = {'xhr':1, 'lang':'de', 'page':'chan', 'xhrId':'environment', 'useajax':1, 'no_sidrenew':None}
 PARAMS_INIT = {'xhr':1, 'lang':'de', 'page':'chan', 'xhrId':'setairtime', 'slot':1, 'useajax':1, 'no_sidrenew':None}
 
-def average_load(datapoints):
-  """ average send and receive series """
-  recv = 0
-  send = 0
-  for d in datapoints:
-    parts = d.split(u':')
-    recv += int(parts[0])
-    send += int(parts[1])
-  datalen = len(datapoints)
-  recv //= datalen
-  send //= datalen
-  return (recv,send)
+STATS = {'max': 'maximum', 'p95': '95th percentile'}
+
+def load_stats(airtimedata, meanOnly=False):
+  """ mean, max and 95th percentile of the receive and send series """
+  # three header fields are followed by 300 recv:send points
+  recv, send = parsePairs(airtimedata, skip=3, count=300)
+  return (summarize(recv, meanOnly=meanOnly), summarize(send, meanOnly=meanOnly))
 
 def get_freqs():
   return os.getenv('wifi_freqs').split(' ')
@@ -50,6 +50,9 @@ def get_freqs():
 def get_modes():
   return os.getenv('wifi_modes').split(' ')
 
+def get_stats():
+  return [s for s in os.getenv('wifi_stats', '').split(' ') if s in STATS]
+
 def print_wifi_load():
   """get the current wifi bandwidth usage"""
 
@@ -58,72 +61,77 @@ def print_wifi_load():
   fritzboxHelper.postPageWithLogin(PAGE, data=PARAMS_INIT)
   # download the graphs
   data = fritzboxHelper.postPageWithLogin(PAGE, data=PARAMS)
-  jsondata = json.loads(data)['data']
+  with fritzboxHelper.parsing(PAGE, PARAMS):
+    jsondata = json.loads(data)['data']
 
   freqs = get_freqs()
   modes = get_modes()
-  # parse data from all available frequencies
-  for freq in freqs:
-    freqdata = jsondata[freq + 'ghz']
-    if freqdata == None:
-      continue
-    if 'freqs' in modes:
-      airtimedata = freqdata['airtimedata']
-      datapoints = airtimedata.split(',')[3:303]
-      average_recv, average_send = average_load(datapoints)
-      print('multigraph bandwidth_' + freq + 'ghz')
-      print(freq + 'ghz_recv.value ' + str(average_recv))
-      print(freq + 'ghz_send.value ' + str(average_send))
-    if 'neighbors' in modes:
-      chans = freqdata['usedChannels']
-      chanData = freqdata['channels']
-      total = int(jsondata['cnt_' + freq].split(' ')[0])
-      sameChan = 0
-      for chan in chanData:
-        num = chan['value']
-        if num in chans:
-          sameChan+=int(chan['envApCount'])
-      otherChans = total - sameChan
-      print('multigraph neighbors_' + freq + 'ghz')
-      print(freq + 'ghz_samechan.value ' + str(sameChan))
-      print(freq + 'ghz_otherchans.value ' + str(otherChans))
+  stats = get_stats()
+  with OutputBuffer() as output:
+    # parse data from all available frequencies
+    for freq in freqs:
+      freqdata = jsondata[freq + 'ghz']
+      if freqdata == None:
+        continue
+      if 'freqs' in modes:
+        recv, send = load_stats(freqdata['airtimedata'], meanOnly=not stats)
+        output.multigraph('bandwidth_' + freq + 'ghz')
+        output.value(freq + 'ghz_recv', recv[0])
+        output.value(freq + 'ghz_send', send[0])
+        for stat in stats:
+          i = 1 if stat == 'max' else 2
+          output.value(freq + 'ghz_recv_' + stat, recv[i])
+          output.value(freq + 'ghz_send_' + stat, send[i])
+      if 'neighbors' in modes:
+        chans = freqdata['usedChannels']
+        chanData = freqdata['channels']
+        total = int(jsondata['cnt_' + freq].split(' ')[0])
+        sameChan = 0
+        for chan in chanData:
+          num = chan['value']
+          if num in chans:
+            sameChan+=int(chan['envApCount'])
+        otherChans = total - sameChan
+        output.multigraph('neighbors_' + freq + 'ghz')
+        output.value(freq + 'ghz_samechan', sameChan)
+        output.value(freq + 'ghz_otherchans', otherChans)
 
-def print_config():
-  freqs = get_freqs()
-  modes = get_modes()
+@lru_cache()
+def get_graphs(freqs, modes, stats):
+  """the graphs of the frequencies, kept per settings so their config is rendered once"""
+  graphs = []
   for freq in freqs:
     if 'freqs' in modes:
-      print("multigraph bandwidth_" + freq + 'ghz')
-      print("graph_title WIFI " + freq + "GHz bandwidth usage")
-      print("graph_vlabel percent")
-      print("graph_category network")
-      print("graph_args --lower-limit 0 --upper-limit 100 --rigid")
-      print("graph_order " + freq + "ghz_recv " + freq + "ghz_send")
+      fields = []
       for p,l in {'recv' : 'receive', 'send': 'send'}.items():
-        multiP = freq + 'ghz_' + p
-        print(multiP + '.label ' + l)
-        print(multiP + '.type GAUGE')
-        print(multiP + '.draw AREASTACK')
+        fields.append(Field(freq + 'ghz_' + p, label=l, type='GAUGE', draw='AREASTACK'))
+      for stat in stats:
+        for p,l in {'recv' : 'receive', 'send': 'send'}.items():
+          fields.append(Field(freq + 'ghz_' + p + '_' + stat, label=l + ' ' + STATS[stat], type='GAUGE', draw='LINE1'))
+      graphs.append(Graph('bandwidth_' + freq + 'ghz', fields,
+        title='WIFI ' + freq + 'GHz bandwidth usage', vlabel='percent', category='network',
+        args='--lower-limit 0 --upper-limit 100 --rigid', order=freq + 'ghz_recv ' + freq + 'ghz_send'))
     if 'neighbors' in modes:
-      print("multigraph neighbors_" + freq + 'ghz')
-      print("graph_title WIFI " + freq + "GHz neighbor APs")
-      print("graph_vlabel number of APs")
-      print("graph_category network")
-      print("graph_args --lower-limit 0")
-      print("graph_order " + freq + "ghz_samechan " + freq + "ghz_otherchans")
+      fields = []
       for p,l in {'samechan' : 'same channel', 'otherchans': 'other channels'}.items():
-        multiP = freq + 'ghz_' + p
-        print(multiP + '.label ' + l)
-        print(multiP + '.type GAUGE')
-        print(multiP + '.draw AREASTACK')
+        fields.append(Field(freq + 'ghz_' + p, label=l, type='GAUGE', draw='AREASTACK'))
+      graphs.append(Graph('neighbors_' + freq + 'ghz', fields,
+        title='WIFI ' + freq + 'GHz neighbor APs', vlabel='number of APs', category='network',
+        args='--lower-limit 0', order=freq + 'ghz_samechan ' + freq + 'ghz_otherchans'))
+  return graphs
+
+def print_config():
+  with OutputBuffer() as output:
+    output.config(get_graphs(tuple(get_freqs()), tuple(get_modes()), tuple(get_stats())))
 
 if __name__ == "__main__":
   if len(sys.argv) == 2 and sys.argv[1] == 'config':
-    print_config()
+    printCachedConfig('fritzbox_wifi_load')
   elif len(sys.argv) == 2 and sys.argv[1] == 'autoconf':
     print("yes")  # Some docs say it'll be called with fetch, some say no arg at all
   elif len(sys.argv) == 1 or (len(sys.argv) == 2 and sys.argv[1] == 'fetch'):
     try:
-      print_wifi_load()
+      if not printCachedFetch('fritzbox_wifi_load') and not printTargets('fritzbox_wifi_load'):
+        print_wifi_load()
     except Exception as e:
       sys.exit("Couldn't retrieve fritzbox wifi load: " + str(e))
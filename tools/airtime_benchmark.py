@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+  airtime_benchmark - compares the airtime parsing of fritzbox_wifi_load with
+  the loop it replaced
+  Like Munin, this plugin is licensed under the GNU GPL v2 license
+  http://www.opensource.org/licenses/GPL-2.0
+
+  Reports the time per frequency of the former split and int() loop, which
+  only computed the mean, against FritzboxStatistics, which computes the mean
+  only as well unless env.wifi_stats asks for the maximum and 95th
+  percentile, without and with NumPy if it is installed.
+
+  Usage: tools/airtime_benchmark.py [--points 300] [--number 2000]
+"""
+
+import argparse
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# FritzboxConfig reads it when the plugin is imported
+os.environ.setdefault('MUNIN_CONFDIR', '/etc/munin')
+
+import FritzboxStatistics
+from fritzbox_wifi_load import load_stats
+
+def average_load(datapoints):
+  """ the former average of send and receive series """
+  recv = 0
+  send = 0
+  for d in datapoints:
+    parts = d.split(u':')
+    recv += int(parts[0])
+    send += int(parts[1])
+  datalen = len(datapoints)
+  recv //= datalen
+  send //= datalen
+  return (recv,send)
+
+def loop(airtimedata):
+  return average_load(airtimedata.split(',')[3:303])
+
+def main():
+  parser = argparse.ArgumentParser(description='Benchmark the airtime parsing of fritzbox_wifi_load')
+  parser.add_argument('--points', type=int, default=300)
+  parser.add_argument('--number', type=int, default=2000)
+  args = parser.parse_args()
+
+  airtimedata = '0,0,0,' + ','.join('%d:%d' % (random.randint(0, 100), random.randint(0, 100)) for _ in range(args.points))
+  expected = loop(airtimedata)
+
+  def measure(name, function):
+    seconds = timeit.timeit(lambda: function(airtimedata), number=args.number) / args.number
+    print('{:<20} {:>8.1f} us'.format(name, seconds * 1e6))
+
+  measure('former loop (mean)', loop)
+  for name in ('python', 'numpy'):
+    if name == 'python':
+      FritzboxStatistics.numpy = None
+    elif not FritzboxStatistics.useNumpy():
+      break
+    recv, send = load_stats(airtimedata, meanOnly=True)
+    assert (recv[0], send[0]) == expected, name + ' differs from the loop'
+    measure(name + ' (mean)', lambda data: load_stats(data, meanOnly=True))
+    stats = load_stats(airtimedata)
+    assert (stats[0][0], stats[1][0]) == expected, name + ' differs from the loop'
+    measure(name + ' (mean/max/p95)', load_stats)
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+  benchmark - runs config and fetch of every plugin against the fake box and
+  reports wall time, requests, logins and peak memory
+  Like Munin, this plugin is licensed under the GNU GPL v2 license
+  http://www.opensource.org/licenses/GPL-2.0
+
+  Every plugin runs as its own process, like munin-node starts it, with a
+  fresh plugin state directory per benchmark. The first round therefore
+  includes the logins, later rounds reuse the stored session id.
+
+  Usage: tools/benchmark.py [--rounds 3] [--latency seconds] [--port 80]
+                            [--tr064-port 49000] [plugin ...]
+         tools/benchmark.py --importtime [--import-budget ms] [--import-runs 5] [plugin ...]
+
+  With --importtime the plugins are only run with autoconf under
+  python -X importtime, which must not import any of the HEAVY_MODULES and
+  stay within the import budget. The import time varies by several
+  milliseconds from run to run, the median of the runs is checked. It
+  includes the about 10 ms the interpreter takes to import site and the
+  encodings. The exit status is 1 on a regression.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+from fakebox import FakeBox, start
+
+PLUGINDIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PLUGINS = [
+  'fritzbox_collector_stats',
+  'fritzbox_connection_uptime',
+  'fritzbox_dsl',
+  'fritzbox_ecostat',
+  'fritzbox_energy',
+  'fritzbox_link_saturation',
+  'fritzbox_smart_home_temperature',
+  'fritzbox_traffic',
+  'fritzbox_wifi_load',
+]
+# modules only needed once a plugin talks to the box
+HEAVY_MODULES = ('requests', 'lxml', 'fritzconnection', 'urllib3')
+IMPORT_BUDGET = 50
+IMPORT_RUNS = 5
+
+def plugin_environment(statedir, port):
+  """the environment of munin-node's [fritzbox_*] section with all modes enabled"""
+  env = dict(os.environ)
+  env.update({
+    'MUNIN_PLUGSTATE': statedir,
+    'MUNIN_CONFDIR': statedir,
+    'fritzbox_ip': '127.0.0.1',
+    'fritzbox_port': str(port),
+    'fritzbox_use_tls': 'false',
+    'fritzbox_user': 'munin',
+    'fritzbox_password': 'secret',
+    'dsl_modes': 'capacity snr damping errors crc',
+    'ecostat_modes': 'cpu temp ram',
+    'energy_modes': 'power devices uptime',
+    'energy_product': 'DSL',
+    'wifi_freqs': '24 5',
+    'wifi_modes': 'freqs neighbors',
+  })
+  return env
+
+def stats(port, reset=False):
+  with urllib.request.urlopen('http://127.0.0.1:{}/{}'.format(port, '__reset' if reset else '__stats')) as response:
+    return json.load(response)
+
+def run(plugin, action, env, port, plugindir=PLUGINDIR):
+  """run a plugin once, returns wall time, exit status, peak rss in kB and the box's counters"""
+  stats(port, reset=True)
+  started = time.perf_counter()
+  process = subprocess.Popen([sys.executable, os.path.join(plugindir, plugin + '.py'), action],
+                             env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+  _, status, rusage = os.wait4(process.pid, 0)
+  elapsed = time.perf_counter() - started
+  process.returncode = os.waitstatus_to_exitcode(status)
+  error = process.stderr.read().decode('utf-8', 'replace').strip()
+  process.stderr.close()
+  return elapsed, process.returncode, error, rusage.ru_maxrss, stats(port)
+
+def importtime(plugin, env):
+  """import a plugin for autoconf, returns the summed import time in ms and the heavy modules imported"""
+  process = subprocess.run([sys.executable, '-X', 'importtime', os.path.join(PLUGINDIR, plugin + '.py'), 'autoconf'],
+                           env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+  total = 0
+  heavy = []
+  for line in process.stderr.decode('utf-8', 'replace').splitlines():
+    if not line.startswith('import time:') or 'cumulative' in line:
+      continue
+    _, cumulative, name = line[len('import time:'):].split('|')
+    module = name.strip()
+    # top level imports are not indented, their cumulative times add up to the total
+    if name[1:2] != ' ':
+      total += int(cumulative)
+    if module.split('.')[0] in HEAVY_MODULES and module.split('.')[0] not in heavy:
+      heavy.append(module.split('.')[0])
+  return total / 1000, heavy
+
+def checkImports(plugins, budget, runs):
+  regressions = 0
+  print('{:<32} {:>9} {:>9} {:>9} {}'.format('plugin', 'median ms', 'min ms', 'max ms', 'heavy modules'))
+  with tempfile.TemporaryDirectory() as statedir:
+    env = plugin_environment(statedir, 80)
+    for plugin in plugins:
+      totals = []
+      heavy = []
+      for _ in range(runs):
+        total, imported = importtime(plugin, env)
+        totals.append(total)
+        heavy += [module for module in imported if module not in heavy]
+      median = statistics.median(totals)
+      print('{:<32} {:>9.1f} {:>9.1f} {:>9.1f} {}'.format(plugin, median, min(totals), max(totals), ' '.join(heavy)))
+      if heavy or median > budget:
+        regressions += 1
+  return regressions
+
+def main():
+  parser = argparse.ArgumentParser(description='Benchmark the plugins against the fake box')
+  parser.add_argument('--rounds', type=int, default=3)
+  parser.add_argument('--latency', type=float, default=0.0, help='seconds the fake box adds to every request')
+  parser.add_argument('--port', type=int, default=80, help='port of the fake web interface; fritzconnection checks its cache on port 80')
+  parser.add_argument('--tr064-port', type=int, default=49000)
+  parser.add_argument('--importtime', action='store_true', help='check the import time of autoconf instead')
+  parser.add_argument('--import-budget', type=float, default=IMPORT_BUDGET, help='milliseconds a plugin may spend importing')
+  parser.add_argument('--import-runs', type=int, default=IMPORT_RUNS, help='runs per plugin, the median is checked')
+  parser.add_argument('plugins', nargs='*', default=PLUGINS)
+  args = parser.parse_args()
+
+  if args.importtime:
+    sys.exit(1 if checkImports(args.plugins, args.import_budget, args.import_runs) else 0)
+
+  servers = start(FakeBox('secret', latency=args.latency), port=args.port, tr064Port=args.tr064_port)
+  print('{:<32} {:<6} {:>5} {:>9} {:>8} {:>6} {:>6} {:>9}'.format('plugin', 'action', 'round', 'wall ms', 'requests', 'soap', 'logins', 'rss kB'))
+  with tempfile.TemporaryDirectory() as statedir:
+    env = plugin_environment(statedir, args.port)
+    for plugin in args.plugins:
+      for action in ('config', 'fetch'):
+        for round in range(1, args.rounds + 1):
+          elapsed, code, error, rss, counters = run(plugin, action, env, args.port)
+          print('{:<32} {:<6} {:>5} {:>9.1f} {:>8} {:>6} {:>6} {:>9}'.format(
+            plugin, action, round, elapsed * 1000, counters['requests'], counters['soap_actions'], counters['logins'], rss))
+          if code != 0:
+            print('  failed with exit code {}: {}'.format(code, error.splitlines()[-1] if error else ''))
+  for server in servers:
+    server.shutdown()
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+  dsl_benchmark - compares the parsing of the DSL statistics by fritzbox_dsl
+  as JSON and as HTML with the separate XPath queries it replaced
+  Like Munin, this plugin is licensed under the GNU GPL v2 license
+  http://www.opensource.org/licenses/GPL-2.0
+
+  Parses recorded internet/dsl_stats_tab.lua and data.lua dslStat pages, or
+  those of the fake box, reads the values of all modes from each and reports
+  the size and the time per fetch. The values read by row label have to
+  match those of the former fixed positions, and those of the JSON page
+  those of the HTML page.
+
+  Usage: tools/dsl_benchmark.py [--number 500] [--json page] [recorded page]
+"""
+
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# FritzboxConfig reads it when the plugin is imported
+os.environ.setdefault('MUNIN_CONFDIR', '/etc/munin')
+
+from fakebox import build_payloads
+from fritzbox_dsl import get_row, parse_dsl_json, parse_dsl_stats
+
+NAMES = ['capacity', 'snr', 'damping', 'es', 'ses', 'crc']
+
+def xpath(data):
+  """ the former queries of all modes """
+  import lxml.html as html
+
+  root = html.fragments_fromstring(data)
+  return [
+    (root[1].xpath('tr[position() = 4]/td[position() = 3]')[0].text, root[1].xpath('tr[position() = 4]/td[position() = 4]')[0].text),
+    (root[1].xpath('tr[position() = 13]/td[position() = 3]')[0].text, root[1].xpath('tr[position() = 13]/td[position() = 4]')[0].text),
+    (root[1].xpath('tr[position() = 15]/td[position() = 3]')[0].text, root[1].xpath('tr[position() = 15]/td[position() = 4]')[0].text),
+    (root[4].xpath('tr[position() = 3]/td[position() = 2]')[0].text, root[4].xpath('tr[position() = 3]/td[position() = 3]')[0].text),
+    (root[4].xpath('tr[position() = 4]/td[position() = 2]')[0].text, root[4].xpath('tr[position() = 4]/td[position() = 3]')[0].text),
+    (root[4].xpath('tr[position() = 7]/td[position() = 2]')[0].text, root[4].xpath('tr[position() = 7]/td[position() = 3]')[0].text),
+  ]
+
+def index(data):
+  rows = parse_dsl_stats(data)
+  return [get_row(rows, name) for name in NAMES]
+
+def jsonIndex(data):
+  rows = parse_dsl_json(data)
+  return [get_row(rows, name) for name in NAMES]
+
+def main():
+  parser = argparse.ArgumentParser(description='Benchmark the parsing of the DSL page')
+  parser.add_argument('--number', type=int, default=500)
+  parser.add_argument('--json', help='a recorded data.lua dslStat page')
+  parser.add_argument('page', nargs='?', help='a recorded internet/dsl_stats_tab.lua page')
+  args = parser.parse_args()
+
+  payloads = build_payloads()
+  data = payloads['internet-dsl_stats_tab.lua.html'].encode('utf-8')
+  if args.page:
+    with open(args.page, 'rb') as pagefile:
+      data = pagefile.read()
+  jsonData = payloads['data.lua-dslStat.json'].encode('utf-8')
+  if args.json:
+    with open(args.json, 'rb') as pagefile:
+      jsonData = pagefile.read()
+
+  expected = [(recv.strip(), send.strip()) for recv, send in xpath(data)]
+  if index(data) != expected:
+    sys.exit('values by label {} differ from those by position {}'.format(index(data), expected))
+  if jsonIndex(jsonData) != expected:
+    sys.exit('values of the JSON page {} differ from those of the HTML page {}'.format(jsonIndex(jsonData), expected))
+
+  for name, function, page in (('xpath per value', xpath, data), ('single pass index', index, data), ('json', jsonIndex, jsonData)):
+    seconds = min(timeit.repeat(lambda: function(page), number=args.number, repeat=5)) / args.number
+    print('{:<20} {:>8.1f} us {:>7} bytes'.format(name, seconds * 1e6, len(page)))
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,466 @@
+#!/usr/bin/env python3
+"""
+  fakebox - a fake AVM Fritzbox for trying and benchmarking the munin plugins
+  without a router
+  Like Munin, this plugin is licensed under the GNU GPL v2 license
+  http://www.opensource.org/licenses/GPL-2.0
+
+  Serves the web interface pages used by the plugins (login_sid.lua with MD5
+  and PBKDF2 challenges, data.lua for the energy, ecoStat, chan and dslStat pages,
+  internet/dsl_stats_tab.lua, internet/inetstat_monitor.lua and the AHA
+  device list) and the TR-064 descriptions and actions used by the
+  fritzconnection based plugins.
+
+  Payloads recorded from a real box can be replayed by putting them into a
+  directory given with --payloads, named like the built-in ones in PAYLOADS,
+  e.g. data.lua-energy.json or internet-dsl_stats_tab.lua.html.
+
+  Request, login, connection and per action counters are served as JSON on
+  /__stats and reset on /__reset. /__busy?seconds=60 makes the box answer
+  every request with 503 for a minute, /__block?seconds=60 makes
+  login_sid.lua refuse logins with that BlockTime.
+
+  Usage: tools/fakebox.py [--port 80] [--tr064-port 49000] [--password secret]
+                          [--login pbkdf2|md5] [--iterations 10000] [--latency seconds]
+                          [--sid-lifetime seconds] [--payloads directory]
+                          [--legacy] [--tls certificate key]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import secrets
+import ssl
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+INVALID_SID = '0000000000000000'
+MODEL = 'FRITZ!Box 7590'
+VERSION = '154.07.10'
+
+# TR-064 services: name -> (description file, service type, control url, actions)
+# actions: name -> output arguments with their data type and value
+SERVICES = {
+  'WANCommonIFC1': ('igddesc.xml', 'urn:schemas-upnp-org:service:WANCommonInterfaceConfig:1', '/igdupnp/control/WANCommonIFC1', {
+    'GetAddonInfos': lambda box, args: {
+      'NewByteSendRate': ('ui4', 12500),
+      'NewByteReceiveRate': ('ui4', 312500),
+      'NewX_AVM_DE_TotalBytesSent64': ('string', str(int(box.uptime() * 12500))),
+      'NewX_AVM_DE_TotalBytesReceived64': ('string', str(int(box.uptime() * 312500))),
+    },
+    'GetCommonLinkProperties': lambda box, args: {
+      'NewWANAccessType': ('string', 'DSL'),
+      'NewLayer1UpstreamMaxBitRate': ('ui4', 40000000),
+      'NewLayer1DownstreamMaxBitRate': ('ui4', 100000000),
+      'NewPhysicalLinkStatus': ('string', 'Up'),
+    },
+  }),
+  'WANIPConn1': ('igddesc.xml', 'urn:schemas-upnp-org:service:WANIPConnection:1', '/igdupnp/control/WANIPConn1', {
+    'GetStatusInfo': lambda box, args: {
+      'NewConnectionStatus': ('string', 'Connected'),
+      'NewLastConnectionError': ('string', 'ERROR_NONE'),
+      'NewUptime': ('ui4', int(box.uptime()) + 3600),
+    },
+    'GetExternalIPAddress': lambda box, args: {
+      'NewExternalIPAddress': ('string', '192.0.2.1'),
+    },
+    'X_AVM_DE_GetExternalIPv6Address': lambda box, args: {
+      'NewExternalIPv6Address': ('string', '2001:db8::1'),
+      'NewPrefixLength': ('ui1', 64),
+      'NewValidLifetime': ('ui4', 7200),
+      'NewPreferedLifetime': ('ui4', 3600),
+    },
+  }),
+  'X_AVM-DE_Homeauto1': ('tr64desc.xml', 'urn:dslforum-org:service:X_AVM-DE_Homeauto:1', '/upnp/control/x_homeauto', {
+    'GetGenericDeviceInfos': lambda box, args: box.homeautoDevice(int(args.get('NewIndex', 0))),
+  }),
+}
+
+SMART_HOME_DEVICES = [
+  (16, 'Wohnzimmer', 'FRITZ!DECT 301', 215),
+  (17, 'Bad', 'FRITZ!DECT 301', 230),
+  (18, 'Steckdose Flur', 'FRITZ!DECT 200', 198),
+]
+
+def series(length, low, high):
+  """a history series as sent by data.lua, oldest value first"""
+  return [low + (i * 7) % (high - low + 1) for i in range(length)]
+
+def build_payloads():
+  """the built-in payloads, keyed by file name"""
+  ecostat = {'data': {
+    'cputemp': {'series': [series(360, 50, 70)], 'labels': list(range(360))},
+    'cpuutil': {'series': [series(360, 5, 60)], 'labels': list(range(360))},
+    'ramusage': {'series': [series(360, 20, 30), series(360, 10, 20), series(360, 40, 60)], 'labels': list(range(360))},
+  }}
+  energy = {'data': {'drain': [
+    {'name': 'Gesamtsystem', 'actPerc': 42, 'statuses': 'FRITZ!Box seit 3 Tagen 4 Stunden 5 Minuten in Betrieb'},
+    {'name': 'Hauptprozessor', 'actPerc': 35, 'statuses': ''},
+    {'name': 'WLAN', 'actPerc': 60, 'statuses': ['WLAN an', '7 WLAN-Geräte verbunden']},
+    {'name': 'DSL', 'actPerc': 80, 'statuses': ''},
+    {'name': 'Telefonie', 'actPerc': 10, 'statuses': ''},
+    {'name': 'USB', 'actPerc': 0, 'statuses': ''},
+    {'name': 'LAN', 'actPerc': 0, 'statuses': '3 LAN-Geräte verbunden'},
+  ]}}
+  airtime = 'a,b,c,' + ','.join('%d:%d' % (i % 40, i % 15) for i in range(300))
+  chan = {'data': {
+    'cnt_24': '12 Funknetze', 'cnt_5': '4 Funknetze',
+    '24ghz': {'airtimedata': airtime, 'usedChannels': [1], 'channels': [{'value': 1, 'envApCount': 5}, {'value': 6, 'envApCount': 7}]},
+    '5ghz': {'airtimedata': airtime, 'usedChannels': [36], 'channels': [{'value': 36, 'envApCount': 1}, {'value': 100, 'envApCount': 3}]},
+  }}
+  inetstat = [{
+    'upstream': '4.0e7', 'downstream': '1.0e8',
+    'us_realtime_bps_curr': series(20, 0, 20000), 'us_important_bps_curr': series(20, 0, 50000),
+    'us_default_bps_curr': series(20, 0, 400000), 'us_background_bps_curr': series(20, 0, 10000),
+    'ds_bps_curr': series(20, 1000, 9000000), 'ds_mc_bps_curr': series(20, 0, 0),
+  }]
+
+  def row(cells, tag='td'):
+    return '<tr>' + ''.join('<{0}>{1}</{0}>'.format(tag, c) for c in cells) + '</tr>'
+  lines = [
+    ('', 'Empfangsrichtung', 'Senderichtung'),
+    ('Max. DSLAM-Datenrate', 'kbit/s', '116800', '46720'),
+    ('Min. DSLAM-Datenrate', 'kbit/s', '1024', '1024'),
+    ('Leitungskapazität', 'kbit/s', '129451', '46325'),
+    ('Aktuelle Datenrate', 'kbit/s', '116797', '46719'),
+    ('Nahtlose Ratenadaption', '', 'aus', 'aus'),
+    ('Latenz', '', 'fast', 'fast'),
+    ('Impulsstörungsschutz (INP)', '', '47', '46'),
+    ('G.INP', '', 'an', 'an'),
+    ('Trägertausch (Bitswap)', '', 'an', 'an'),
+    ('Leitungsrückmeldung', '', '-', '-'),
+    ('Vectoring', '', 'full', 'full'),
+    ('Störabstandsmarge', 'dB', '8', '9'),
+    ('Leitungsdämpfung (Abschätzung)', 'dB', '14', '14'),
+    ('Leitungsdämpfung', 'dB', '13', '13'),
+  ]
+  errors = [
+    ('', 'FRITZ!Box', 'Vermittlungsstelle'),
+    ('', '', ''),
+    ('Sekunden mit Fehlern', '12', '3'),
+    ('Sekunden mit vielen Fehlern', '1', '0'),
+    ('Fehler pro Minute (15 min)', '0.00', '0.00'),
+    ('Fehler pro Minute (letzte Stunde)', '0.00', '0.00'),
+    ('Nicht behebbare Fehler (CRC)', '5', '2'),
+  ]
+  def values(r):
+    return {'title': r[0], 'unit': r[1], 'val': [{'ds': r[2], 'us': r[3]}]}
+  dslStat = {'pid': 'dslStat', 'data': {
+    'negotiatedValues': [values(r) for r in lines[1:12]],
+    'connectionValues': [values(r) for r in lines[12:]],
+    'errorCounters': [values((r[0], '', r[1], r[2])) for r in errors[2:]],
+  }}
+  dsl = ('<h4>DSL</h4>'
+    + '<table class="zebra">' + row(lines[0], 'th') + ''.join(row(r) for r in lines[1:]) + '</table>'
+    + '<h4>Fehler</h4><p>Statistik</p>'
+    + '<table class="zebra">' + ''.join(row(r) for r in errors) + '</table>')
+
+  devices = ''.join(
+    '<device identifier="11657 000000{0}" id="{0}" functionbitmask="320" fwversion="05.08" manufacturer="AVM" productname="{2}">'
+    '<present>1</present><txbusy>0</txbusy><name>{1}</name>'
+    '<temperature><celsius>{3}</celsius><offset>0</offset></temperature></device>'.format(*d) for d in SMART_HOME_DEVICES)
+
+  return {
+    'data.lua-ecoStat.json': json.dumps(ecostat),
+    'data.lua-energy.json': json.dumps(energy),
+    'data.lua-chan.json': json.dumps(chan),
+    'internet-inetstat_monitor.lua.json': json.dumps(inetstat),
+    'internet-dsl_stats_tab.lua.html': dsl,
+    'data.lua-dslStat.json': json.dumps(dslStat),
+    'webservices-homeautoswitch.lua.xml': '<devicelist version="1">' + devices + '</devicelist>',
+  }
+
+class FakeBox:
+  """the state of the fake box shared by the web interface and TR-064 servers"""
+
+  def __init__(self, password, login='pbkdf2', latency=0.0, sidLifetime=1200, payloads=None, legacy=False, iterations=10000):
+    self.password = password
+    self.login = login
+    self.iterations = iterations
+    self.latency = latency
+    self.sidLifetime = sidLifetime
+    self.started = time.time()
+    self.payloads = build_payloads()
+    if legacy:
+      # older firmware only has the HTML page of the DSL statistics
+      del self.payloads['data.lua-dslStat.json']
+    if payloads:
+      for name in os.listdir(payloads):
+        with open(os.path.join(payloads, name), 'r') as payloadfile:
+          self.payloads[name] = payloadfile.read()
+    self.salt1 = secrets.token_hex(16)
+    self.lock = threading.Lock()
+    self.sessions = {}
+    self.challenges = set()
+    self.busyUntil = 0
+    self.blockUntil = 0
+    self.reset()
+
+  def reset(self):
+    with self.lock:
+      self.stats = {'requests': 0, 'connections': 0, 'logins': 0, 'failed_logins': 0, 'soap_actions': 0, 'pages': {}, 'actions': {}}
+
+  def count(self, counter, page=None, action=None):
+    with self.lock:
+      self.stats[counter] += 1
+      if page is not None:
+        self.stats['pages'][page] = self.stats['pages'].get(page, 0) + 1
+      if action is not None:
+        self.stats['actions'][action] = self.stats['actions'].get(action, 0) + 1
+
+  def uptime(self):
+    return time.time() - self.started
+
+  def challenge(self, version):
+    if self.login == 'pbkdf2' and version == '2':
+      challenge = '2${}${}$1000${}'.format(self.iterations, self.salt1, secrets.token_hex(16))
+    else:
+      challenge = secrets.token_hex(4)
+    with self.lock:
+      self.challenges.add(challenge)
+    return challenge
+
+  def checkResponse(self, response):
+    """returns a new session id for a valid response to an issued challenge, None otherwise"""
+    with self.lock:
+      challenges = list(self.challenges)
+    for challenge in challenges:
+      # only hash for the challenge answered, unanswered ones pile up
+      if challenge.startswith('2$'):
+        _, iter1, salt1, iter2, salt2 = challenge.split('$')
+        if not response.startswith(salt2 + '$'):
+          continue
+        hash1 = hashlib.pbkdf2_hmac('sha256', self.password.encode('utf-8'), bytes.fromhex(salt1), int(iter1))
+        hash2 = hashlib.pbkdf2_hmac('sha256', hash1, bytes.fromhex(salt2), int(iter2))
+        expected = '{}${}'.format(salt2, hash2.hex())
+      else:
+        if not response.startswith(challenge + '-'):
+          continue
+        md5 = hashlib.md5('{}-{}'.format(challenge, self.password).encode('utf-16le')).hexdigest()
+        expected = '{}-{}'.format(challenge, md5)
+      if response == expected:
+        session_id = secrets.token_hex(8)
+        with self.lock:
+          self.challenges.discard(challenge)
+          self.sessions[session_id] = time.time()
+        return session_id
+    return None
+
+  def checkSession(self, session_id, renew):
+    """whether a session id is valid, renewing its lifetime if requested"""
+    with self.lock:
+      lastUse = self.sessions.get(session_id)
+      if lastUse is None or time.time() - lastUse > self.sidLifetime:
+        self.sessions.pop(session_id, None)
+        return False
+      if renew:
+        self.sessions[session_id] = time.time()
+      return True
+
+  def homeautoDevice(self, index):
+    if index >= len(SMART_HOME_DEVICES):
+      raise IndexError(index)
+    device_id, name, product, celsius = SMART_HOME_DEVICES[index]
+    return {
+      'NewAIN': ('string', '11657 000000' + str(device_id)),
+      'NewDeviceId': ('ui2', device_id),
+      'NewFunctionBitMask': ('ui2', 320),
+      'NewFirmwareVersion': ('string', '05.08'),
+      'NewManufacturer': ('string', 'AVM'),
+      'NewProductName': ('string', product),
+      'NewDeviceName': ('string', name),
+      'NewPresent': ('string', 'CONNECTED'),
+      'NewTemperatureIsEnabled': ('string', 'ENABLED'),
+      'NewTemperatureIsValid': ('string', 'VALID'),
+      'NewTemperatureCelsius': ('i4', celsius),
+      'NewTemperatureOffset': ('i4', 0),
+    }
+
+class FakeBoxHandler(BaseHTTPRequestHandler):
+  protocol_version = 'HTTP/1.1'
+  # headers and body are written separately, Nagle would hold the body back for the delayed ACK
+  disable_nagle_algorithm = True
+  box = None
+
+  def setup(self):
+    super().setup()
+    self.box.count('connections')
+
+  def log_message(self, format, *args):
+    pass
+
+  def send(self, body, contentType='text/html', code=200):
+    if isinstance(body, str):
+      body = body.encode('utf-8')
+    self.send_response(code)
+    self.send_header('Content-Type', contentType + '; charset=utf-8')
+    self.send_header('Content-Length', str(len(body)))
+    self.end_headers()
+    self.wfile.write(body)
+
+  def do_GET(self):
+    url = urllib.parse.urlparse(self.path)
+    self.dispatch(url.path, dict(urllib.parse.parse_qsl(url.query, keep_blank_values=True)))
+
+  def do_POST(self):
+    url = urllib.parse.urlparse(self.path)
+    body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+    if self.headers.get('SOAPACTION'):
+      return self.dispatchSoap(url.path, body)
+    params = dict(urllib.parse.parse_qsl(url.query, keep_blank_values=True))
+    params.update(urllib.parse.parse_qsl(body.decode('utf-8'), keep_blank_values=True))
+    self.dispatch(url.path, params)
+
+  def dispatch(self, path, params):
+    if path == '/__stats':
+      with self.box.lock:
+        return self.send(json.dumps(self.box.stats), 'application/json')
+    if path == '/__reset':
+      self.box.reset()
+      return self.send('{}', 'application/json')
+    if path == '/__busy':
+      self.box.busyUntil = time.time() + float(params.get('seconds', 60))
+      return self.send('{}', 'application/json')
+    if path == '/__block':
+      self.box.blockUntil = time.time() + float(params.get('seconds', 60))
+      return self.send('{}', 'application/json')
+
+    self.box.count('requests', path)
+    time.sleep(self.box.latency)
+    if time.time() < self.box.busyUntil:
+      return self.send('Service Unavailable', 'text/plain', 503)
+
+    if path == '/login_sid.lua':
+      return self.login(params)
+    if path == '/jason_boxinfo.xml':
+      return self.send('<e:BoxInfo xmlns:e="http://jason.avm.de/updatecheck/"><e:Name>{}</e:Name><e:Version>{}</e:Version></e:BoxInfo>'.format(MODEL, VERSION), 'text/xml')
+    if path in ('/igddesc.xml', '/tr64desc.xml'):
+      return self.send(self.description(path[1:]), 'text/xml')
+    if path.startswith('/scpd/'):
+      return self.send(self.scpd(path[len('/scpd/'):]), 'text/xml')
+
+    if not self.box.checkSession(params.get('sid'), 'no_sidrenew' not in params):
+      return self.send('Forbidden', 'text/plain', 403)
+
+    name = path[1:].replace('/', '-')
+    if path == '/data.lua':
+      name += '-' + params.get('page', '')
+    for extension, contentType in (('.json', 'application/json'), ('.html', 'text/html'), ('.xml', 'text/xml')):
+      if name + extension in self.box.payloads:
+        return self.send(self.box.payloads[name + extension], contentType)
+    if path == '/data.lua' and params.get('xhrId') == 'setairtime':
+      return self.send('{"data":{}}', 'application/json')
+    self.send('Not Found', 'text/plain', 404)
+
+  def login(self, params):
+    blockTime = max(0, int(self.box.blockUntil - time.time()))
+    if blockTime:
+      session_id = INVALID_SID
+    elif 'response' in params:
+      session_id = self.box.checkResponse(params['response'])
+      if session_id is None:
+        self.box.count('failed_logins')
+        session_id = INVALID_SID
+      else:
+        self.box.count('logins')
+    elif params.get('sid') and self.box.checkSession(params['sid'], True):
+      session_id = params['sid']
+    else:
+      session_id = INVALID_SID
+    challenge = self.box.challenge(params.get('version'))
+    self.send('<?xml version="1.0" encoding="utf-8"?><SessionInfo><SID>{}</SID><Challenge>{}</Challenge><BlockTime>{}</BlockTime><Rights></Rights></SessionInfo>'.format(session_id, challenge, blockTime), 'text/xml')
+
+  def description(self, filename):
+    services = ''.join(
+      '<service><serviceType>{}</serviceType><serviceId>urn:fakebox:serviceId:{}</serviceId><controlURL>{}</controlURL>'
+      '<eventSubURL>/unused</eventSubURL><SCPDURL>/scpd/{}.xml</SCPDURL></service>'.format(serviceType, name, controlUrl, name)
+      for name, (descriptionFile, serviceType, controlUrl, _) in SERVICES.items() if descriptionFile == filename)
+    major, minor, patch = VERSION.split('.')
+    return ('<?xml version="1.0"?><root xmlns="urn:dslforum-org:device-1-0"><specVersion><major>1</major><minor>0</minor></specVersion>'
+      + '<systemVersion><HW>226</HW><Major>{}</Major><Minor>{}</Minor><Patch>{}</Patch><Buildnumber>1</Buildnumber><Display>{}</Display></systemVersion>'.format(major, minor, patch, VERSION)
+      + '<device><deviceType>urn:fakebox:device:fakebox:1</deviceType><friendlyName>{0}</friendlyName><manufacturer>AVM</manufacturer>'
+        '<modelName>{0}</modelName><UDN>uuid:fakebox</UDN><serviceList>{1}</serviceList></device></root>'.format(MODEL, services))
+
+  def scpd(self, filename):
+    name = filename[:-len('.xml')]
+    actions = SERVICES[name][3]
+    actionList = ''
+    variables = {}
+    for action, output in actions.items():
+      # call the action with a dummy index to learn its output arguments and types
+      arguments = ''
+      if action == 'GetGenericDeviceInfos':
+        arguments += '<argument><name>NewIndex</name><direction>in</direction><relatedStateVariable>NewIndex</relatedStateVariable></argument>'
+        variables['NewIndex'] = 'ui2'
+      for argument, (dataType, _) in output(self.box, {}).items():
+        arguments += '<argument><name>{0}</name><direction>out</direction><relatedStateVariable>{0}</relatedStateVariable></argument>'.format(argument)
+        variables[argument] = dataType
+      actionList += '<action><name>{}</name><argumentList>{}</argumentList></action>'.format(action, arguments)
+    stateTable = ''.join('<stateVariable sendEvents="no"><name>{}</name><dataType>{}</dataType></stateVariable>'.format(n, t) for n, t in variables.items())
+    return ('<?xml version="1.0"?><scpd xmlns="urn:dslforum-org:service-1-0"><specVersion><major>1</major><minor>0</minor></specVersion>'
+      '<actionList>{}</actionList><serviceStateTable>{}</serviceStateTable></scpd>'.format(actionList, stateTable))
+
+  def dispatchSoap(self, path, body):
+    serviceType, action = self.headers.get('SOAPACTION').strip('"').split('#')
+    self.box.count('soap_actions', path, action)
+    time.sleep(self.box.latency)
+    for name, (_, candidateType, controlUrl, actions) in SERVICES.items():
+      if controlUrl == path and candidateType == serviceType and action in actions:
+        arguments = dict(re.findall(r'<(New\w+)>([^<]*)</', body.decode('utf-8')))
+        try:
+          output = actions[action](self.box, arguments)
+        except IndexError:
+          return self.send('<?xml version="1.0"?><s:Envelope xmlns:s="http://schemas.xmlsoap.org/soap/envelope/"><s:Body><s:Fault>'
+            '<faultcode>s:Client</faultcode><faultstring>UPnPError</faultstring><detail><UPnPError xmlns="urn:schemas-upnp-org:control-1-0">'
+            '<errorCode>713</errorCode><errorDescription>SpecifiedArrayIndexInvalid</errorDescription></UPnPError></detail></s:Fault></s:Body></s:Envelope>', 'text/xml', 500)
+        values = ''.join('<{0}>{1}</{0}>'.format(k, v) for k, (_, v) in output.items())
+        return self.send('<?xml version="1.0"?><s:Envelope xmlns:s="http://schemas.xmlsoap.org/soap/envelope/" s:encodingStyle="http://schemas.xmlsoap.org/soap/encoding/">'
+          '<s:Body><u:{0}Response xmlns:u="{1}">{2}</u:{0}Response></s:Body></s:Envelope>'.format(action, serviceType, values), 'text/xml')
+    self.send('Not Found', 'text/plain', 404)
+
+def start(box, host='127.0.0.1', port=80, tr064Port=49000, tls=None):
+  """serve the web interface and TR-064 of box in background threads
+
+  :return: the two servers, call shutdown() on them to stop
+  """
+  handler = type('BoundFakeBoxHandler', (FakeBoxHandler,), {'box': box})
+  servers = [ThreadingHTTPServer((host, port), handler), ThreadingHTTPServer((host, tr064Port), handler)]
+  if tls:
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(*tls)
+    servers[0].socket = context.wrap_socket(servers[0].socket, server_side=True)
+  for server in servers:
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+  return servers
+
+def main():
+  parser = argparse.ArgumentParser(description='A fake AVM Fritzbox for the munin plugins')
+  parser.add_argument('--host', default='127.0.0.1')
+  parser.add_argument('--port', type=int, default=80, help='port of the web interface')
+  parser.add_argument('--tr064-port', type=int, default=49000)
+  parser.add_argument('--password', default='secret')
+  parser.add_argument('--login', choices=('pbkdf2', 'md5'), default='pbkdf2', help='challenge offered on login_sid.lua?version=2')
+  parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every request')
+  parser.add_argument('--iterations', type=int, default=10000, help='iterations of the first PBKDF2 hash')
+  parser.add_argument('--sid-lifetime', type=int, default=1200, help='seconds a session id stays valid without renewal')
+  parser.add_argument('--payloads', help='directory with recorded payloads replacing the built-in ones')
+  parser.add_argument('--legacy', action='store_true', help='serve no data.lua dslStat page, like older firmware')
+  parser.add_argument('--tls', nargs=2, metavar=('CERTIFICATE', 'KEY'), help='serve the web interface with TLS')
+  args = parser.parse_args()
+
+  box = FakeBox(args.password, args.login, args.latency, args.sid_lifetime, args.payloads, args.legacy, args.iterations)
+  start(box, args.host, args.port, args.tr064_port, args.tls)
+  print('fake box listening on {}:{} (TR-064 on {})'.format(args.host, args.port, args.tr064_port))
+  try:
+    while True:
+      time.sleep(3600)
+  except KeyboardInterrupt:
+    pass
+
+if __name__ == "__main__":
+  main()
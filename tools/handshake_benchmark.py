@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+  handshake_benchmark - counts the connections, i.e. TCP and TLS handshakes,
+  every plugin run opens to the web interface of the fake box
+  Like Munin, this plugin is licensed under the GNU GPL v2 license
+  http://www.opensource.org/licenses/GPL-2.0
+
+  Runs fetch of every plugin twice as its own process, the first run logging
+  in, the second reusing the stored session id, and reports the requests and
+  connections the fake box counted. With --tls the fake box serves the web
+  interface with TLS and the time of the handshakes is summed from the
+  trace, see FritzboxTrace.
+
+  --baseline runs the plugins of another checkout the same way, e.g. one
+  made with git worktree add /tmp/baseline <revision> of a revision before
+  the pooled session, which opened a connection per request and two for a
+  login. Older revisions always connect to port 443, hence the default port.
+  The fake box has no TLS for TR-064, so with --tls the TR-064 fallback of
+  fritzbox_smart_home_temperature and the older revisions of it fail.
+
+  Usage: tools/handshake_benchmark.py [--port 443] [--tls certificate key]
+                                      [--baseline directory] [plugin ...]
+
+  A certificate for the fake box can be made with
+  openssl req -x509 -newkey rsa:2048 -nodes -days 1 -subj /CN=127.0.0.1
+          -addext subjectAltName=IP:127.0.0.1 -keyout key.pem -out cert.pem
+"""
+
+import argparse
+import json
+import os
+import tempfile
+
+from benchmark import PLUGINDIR, plugin_environment, run
+from fakebox import FakeBox, start
+
+# the plugins using the web interface, the others talk TR-064 with fritzconnection
+PLUGINS = [
+  'fritzbox_dsl',
+  'fritzbox_ecostat',
+  'fritzbox_energy',
+  'fritzbox_link_saturation',
+  'fritzbox_smart_home_temperature',
+  'fritzbox_wifi_load',
+]
+
+def handshakeTime(tracefile):
+  """the milliseconds spent connecting and in TLS handshakes since the last call"""
+  try:
+    with open(tracefile, 'r') as trace:
+      records = [json.loads(line) for line in trace]
+    os.remove(tracefile)
+  except OSError:
+    return None
+  return sum(r.get('connect', 0.0) + r.get('tls', 0.0) for r in records if r['event'] == 'request') * 1000
+
+def measure(name, plugindir, plugins, args):
+  with tempfile.TemporaryDirectory() as statedir:
+    env = plugin_environment(statedir, args.port)
+    tracefile = os.path.join(statedir, 'trace')
+    env['fritzbox_trace'] = tracefile
+    if args.tls:
+      env.update({'fritzbox_use_tls': 'true', 'fritzbox_certificate': args.tls[0]})
+    for plugin in plugins:
+      for round in (1, 2):
+        # the counters are asked for on the TR-064 port, which never has TLS
+        _, code, error, _, counters = run(plugin, 'fetch', env, args.tr064_port, plugindir)
+        handshakes = handshakeTime(tracefile)
+        # the request for the counters opened a connection as well
+        connections = counters['connections'] - 1
+        print('{:<9} {:<32} {:>5} {:>8} {:>6} {:>11} {:>13}'.format(
+          name, plugin, round, counters['requests'], counters['logins'], connections,
+          '-' if handshakes is None else '{:.1f}'.format(handshakes)))
+        if code != 0:
+          print('  failed with exit code {}: {}'.format(code, error.splitlines()[-1] if error else ''))
+
+def main():
+  parser = argparse.ArgumentParser(description='Count the connections the plugins open to the fake box')
+  parser.add_argument('--port', type=int, default=443)
+  parser.add_argument('--tr064-port', type=int, default=49000)
+  parser.add_argument('--tls', nargs=2, metavar=('CERTIFICATE', 'KEY'), help='serve the web interface with TLS')
+  parser.add_argument('--baseline', help='a checkout of an older revision to compare with')
+  parser.add_argument('plugins', nargs='*', default=PLUGINS)
+  args = parser.parse_args()
+
+  servers = start(FakeBox('secret'), port=args.port, tr064Port=args.tr064_port, tls=args.tls)
+  print('{:<9} {:<32} {:>5} {:>8} {:>6} {:>11} {:>13}'.format('tree', 'plugin', 'round', 'requests', 'logins', 'connections', 'handshake ms'))
+  if args.baseline:
+    measure('baseline', os.path.abspath(args.baseline), args.plugins, args)
+  measure('current', PLUGINDIR, args.plugins, args)
+  for server in servers:
+    server.shutdown()
+
+if __name__ == "__main__":
+  main()
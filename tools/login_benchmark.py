@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+  login_benchmark - measures the latency of a login into the fake box with
+  MD5 and PBKDF2 challenges
+  Like Munin, this plugin is licensed under the GNU GPL v2 license
+  http://www.opensource.org/licenses/GPL-2.0
+
+  Starts a fake box offering MD5 and one offering PBKDF2 challenges and logs
+  into each of them repeatedly in this process, dropping the stored session
+  id before every login. PBKDF2 is measured without the stored first hash,
+  which every login then calculates, and with it, as after the first login.
+  The time of a login is that of both requests to login_sid.lua and of the
+  hashing, as recorded in the trace, see FritzboxTrace. The fake box checks
+  a PBKDF2 response by calculating both hashes itself, like a real box.
+
+  Usage: tools/login_benchmark.py [--rounds 20] [--iterations 10000]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+
+from benchmark import PLUGINDIR, plugin_environment
+from fakebox import FakeBox, start
+
+# scheme -> port of the web interface and of TR-064 of its fake box
+BOXES = {'md5': (8081, 49001), 'pbkdf2': (8082, 49002)}
+
+def login(interface, statedir, port, keepKey):
+  """log in once, returns the milliseconds the login took"""
+  sidfile = os.path.join(statedir, 'fritzbox', '127.0.0.1__{}__munin.sid'.format(port))
+  for filename in (sidfile,) if keepKey else (sidfile, sidfile + '.pbkdf2'):
+    try:
+      os.remove(filename)
+    except OSError:
+      pass
+  interface.getPageWithLogin('internet/inetstat_monitor.lua')
+  tracefile = os.environ['fritzbox_trace']
+  with open(tracefile, 'r') as trace:
+    records = [json.loads(line) for line in trace]
+  os.remove(tracefile)
+  return sum(r['total'] for r in records if r['event'] == 'login') * 1000
+
+def main():
+  parser = argparse.ArgumentParser(description='Measure the login latency with MD5 and PBKDF2 challenges')
+  parser.add_argument('--rounds', type=int, default=20)
+  parser.add_argument('--iterations', type=int, default=10000, help='iterations of the first PBKDF2 hash')
+  args = parser.parse_args()
+
+  servers = []
+  for scheme, (port, tr064Port) in BOXES.items():
+    servers += start(FakeBox('secret', login=scheme, iterations=args.iterations), port=port, tr064Port=tr064Port)
+
+  statedir = tempfile.TemporaryDirectory()
+  os.environ.update(plugin_environment(statedir.name, 80))
+  os.environ['fritzbox_trace'] = os.path.join(statedir.name, 'trace')
+  sys.path.insert(0, PLUGINDIR)
+  from FritzboxInterface import FritzboxInterface
+
+  print('{:<24} {:>7} {:>10} {:>10} {:>10}'.format('scheme', 'logins', 'mean ms', 'median ms', 'max ms'))
+  for name, scheme, keepKey in (('md5', 'md5', False), ('pbkdf2', 'pbkdf2', False), ('pbkdf2, stored hash', 'pbkdf2', True)):
+    port = BOXES[scheme][0]
+    os.environ['fritzbox_port'] = str(port)
+    interface = FritzboxInterface()
+    # the first login opens the connection and stores the first hash
+    login(interface, statedir.name, port, False)
+    times = [login(interface, statedir.name, port, keepKey) for _ in range(args.rounds)]
+    print('{:<24} {:>7} {:>10.2f} {:>10.2f} {:>10.2f}'.format(name, len(times), statistics.mean(times), statistics.median(times), max(times)))
+
+  for server in servers:
+    server.shutdown()
+  statedir.cleanup()
+
+if __name__ == "__main__":
+  main()
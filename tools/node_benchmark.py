@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+  node_benchmark - a load test of FritzboxMuninNode against the fake box,
+  compared with munin-node starting a Python interpreter per plugin and poll
+  Like Munin, this plugin is licensed under the GNU GPL v2 license
+  http://www.opensource.org/licenses/GPL-2.0
+
+  A poll is what munin-update does per plugin, config and then fetch. The
+  fork model runs both as their own process for every plugin, one after
+  another like munin-node does for a single master. The node model starts
+  FritzboxMuninNode.py once and lets every number of masters given with
+  --masters poll all plugins over their own connection at the same time.
+  Both report the polls per second after a first round that logs in and, for
+  the node, loads the plugins.
+
+  Usage: tools/node_benchmark.py [--rounds 3] [--latency 0.0] [--masters 1 4]
+                                 [--node-port 14949] [plugin ...]
+"""
+
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from benchmark import PLUGINDIR, PLUGINS, plugin_environment, stats
+from fakebox import FakeBox, start
+
+def forkPolls(plugins, rounds, env):
+  """poll every plugin with a process per config and fetch, returns the seconds taken and the failures"""
+  failures = 0
+  started = time.perf_counter()
+  for _ in range(rounds):
+    for plugin in plugins:
+      for action in ('config', 'fetch'):
+        process = subprocess.run([sys.executable, os.path.join(PLUGINDIR, plugin + '.py'), action],
+                                 env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        failures += process.returncode != 0
+  return time.perf_counter() - started, failures
+
+class Master:
+  """a connection to the node, polling like munin-update"""
+  __socket = None
+  __file = None
+
+  def __init__(self, port):
+    self.__socket = socket.create_connection(('127.0.0.1', port))
+    self.__file = self.__socket.makefile('rw')
+    # the banner
+    self.__file.readline()
+
+  def ask(self, command):
+    """send a command, returns the lines of the answer up to the final '.'"""
+    self.__file.write(command + '\n')
+    self.__file.flush()
+    lines = []
+    while True:
+      line = self.__file.readline()
+      if not line or line == '.\n':
+        return lines
+      lines.append(line)
+
+  def poll(self, plugins, rounds):
+    """poll every plugin rounds times, returns the failures"""
+    failures = 0
+    for _ in range(rounds):
+      for plugin in plugins:
+        for action in ('config', 'fetch'):
+          lines = self.ask(action + ' ' + plugin)
+          failures += not lines or lines[0].startswith('# ')
+    return failures
+
+  def close(self):
+    self.__file.write('quit\n')
+    self.__file.flush()
+    self.__socket.close()
+
+def startNode(env, port):
+  env = dict(env, fritzbox_node_port=str(port), fritzbox_node_name='fakebox')
+  process = subprocess.Popen([sys.executable, os.path.join(PLUGINDIR, 'FritzboxMuninNode.py')],
+                             env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+  for _ in range(100):
+    try:
+      socket.create_connection(('127.0.0.1', port)).close()
+      return process
+    except ConnectionRefusedError:
+      time.sleep(0.05)
+  process.kill()
+  raise Exception("FritzboxMuninNode.py did not listen on port " + str(port))
+
+def nodePolls(plugins, rounds, masters, port):
+  """poll every plugin from several masters at once, returns the seconds taken and the failures"""
+  connections = [Master(port) for _ in range(masters)]
+  failures = [0] * masters
+  def poll(i):
+    failures[i] = connections[i].poll(plugins, rounds)
+  threads = [threading.Thread(target=poll, args=(i,)) for i in range(masters)]
+  started = time.perf_counter()
+  for thread in threads:
+    thread.start()
+  for thread in threads:
+    thread.join()
+  elapsed = time.perf_counter() - started
+  for connection in connections:
+    connection.close()
+  return elapsed, sum(failures)
+
+def report(model, masters, polls, elapsed, failures, port):
+  counters = stats(port)
+  print('{:<6} {:>7} {:>6} {:>9.1f} {:>9.1f} {:>8} {:>6} {:>8}'.format(
+    model, masters, polls, elapsed * 1000, polls / elapsed, counters['requests'], counters['logins'], failures))
+
+def main():
+  parser = argparse.ArgumentParser(description='Load test the munin-node server against the fake box')
+  parser.add_argument('--rounds', type=int, default=3)
+  parser.add_argument('--latency', type=float, default=0.0, help='seconds the fake box adds to every request')
+  parser.add_argument('--port', type=int, default=80, help='port of the fake web interface; fritzconnection checks its cache on port 80')
+  parser.add_argument('--tr064-port', type=int, default=49000)
+  parser.add_argument('--node-port', type=int, default=14949)
+  parser.add_argument('--masters', type=int, nargs='+', default=[1, 4])
+  parser.add_argument('plugins', nargs='*', default=PLUGINS)
+  args = parser.parse_args()
+
+  servers = start(FakeBox('secret', latency=args.latency), port=args.port, tr064Port=args.tr064_port)
+  print('{:<6} {:>7} {:>6} {:>9} {:>9} {:>8} {:>6} {:>8}'.format('model', 'masters', 'polls', 'wall ms', 'polls/s', 'requests', 'logins', 'failures'))
+  with tempfile.TemporaryDirectory() as statedir:
+    env = plugin_environment(statedir, args.port)
+    # log in and fill the caches of the descriptions, so neither model pays for it
+    forkPolls(args.plugins, 1, env)
+    stats(args.port, reset=True)
+    elapsed, failures = forkPolls(args.plugins, args.rounds, env)
+    report('fork', 1, len(args.plugins) * args.rounds, elapsed, failures, args.port)
+
+    node = startNode(env, args.node_port)
+    try:
+      # the first poll loads the descriptions of fritzconnection into the node
+      nodePolls(args.plugins, 1, 1, args.node_port)
+      for masters in args.masters:
+        stats(args.port, reset=True)
+        elapsed, failures = nodePolls(args.plugins, args.rounds, masters, args.node_port)
+        report('node', masters, len(args.plugins) * args.rounds * masters, elapsed, failures, args.port)
+    finally:
+      node.terminate()
+      node.wait()
+  for server in servers:
+    server.shutdown()
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+  output_benchmark - measures what printing the config and fetch output of
+  the plugins costs per poll, like the collector daemon and the munin-node
+  server run them
+  Like Munin, this plugin is licensed under the GNU GPL v2 license
+  http://www.opensource.org/licenses/GPL-2.0
+
+  Loads the plugins into this process, requests every page of the fake box
+  once and then runs config and fetch of every plugin repeatedly from the
+  page cache, with stdout replaced by a sink that counts the write calls.
+  Config is rendered without the config cache. Fetch includes parsing the
+  cached pages. The TR-064 plugins are left out by default, every fetch
+  would call an action.
+
+  Usage: tools/output_benchmark.py [--rounds 200] [--port 80] [plugin ...]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+from benchmark import PLUGINDIR, plugin_environment
+from fakebox import FakeBox, start
+
+PLUGINS = [
+  'fritzbox_collector_stats',
+  'fritzbox_dsl',
+  'fritzbox_ecostat',
+  'fritzbox_energy',
+  'fritzbox_link_saturation',
+  'fritzbox_smart_home_temperature',
+  'fritzbox_wifi_load',
+]
+
+class CountingSink:
+  """stdout counting the write calls and characters written"""
+  writes = 0
+  characters = 0
+
+  def write(self, text):
+    self.writes += 1
+    self.characters += len(text)
+    return len(text)
+
+  def flush(self):
+    pass
+
+def measure(function, module, rounds):
+  """run a plugin function rounds times, returns microseconds, writes and characters per round"""
+  sink = CountingSink()
+  stdout = sys.stdout
+  sys.stdout = sink
+  try:
+    function(module)
+    sink.writes = sink.characters = 0
+    started = time.perf_counter()
+    for _ in range(rounds):
+      function(module)
+    elapsed = time.perf_counter() - started
+  finally:
+    sys.stdout = stdout
+  return elapsed / rounds * 1e6, sink.writes / rounds, sink.characters / rounds
+
+def main():
+  parser = argparse.ArgumentParser(description='Benchmark printing the plugin output')
+  parser.add_argument('--rounds', type=int, default=200)
+  parser.add_argument('--port', type=int, default=80)
+  parser.add_argument('--tr064-port', type=int, default=49000)
+  parser.add_argument('plugins', nargs='*', default=PLUGINS)
+  args = parser.parse_args()
+
+  servers = start(FakeBox('secret'), port=args.port, tr064Port=args.tr064_port)
+  statedir = tempfile.TemporaryDirectory()
+  os.environ.update(plugin_environment(statedir.name, args.port))
+  os.environ.update({'wifi_stats': 'max p95', 'saturation_stats': 'min max p95'})
+  sys.path.insert(0, PLUGINDIR)
+
+  from FritzboxCollector import CONFIG, FETCH, load_modules
+  from FritzboxInterface import FritzboxInterface
+
+  modules = load_modules(args.plugins)
+  FritzboxInterface.enablePageCache()
+  print('{:<32} {:<6} {:>10} {:>8} {:>8}'.format('plugin', 'action', 'us/poll', 'writes', 'chars'))
+  totals = {'config': [0, 0], 'fetch': [0, 0]}
+  for plugin, module in modules.items():
+    for action, functions in (('config', CONFIG), ('fetch', FETCH)):
+      micros, writes, characters = measure(functions[plugin], module, args.rounds)
+      totals[action][0] += micros
+      totals[action][1] += writes
+      print('{:<32} {:<6} {:>10.1f} {:>8.0f} {:>8.0f}'.format(plugin, action, micros, writes, characters))
+  for action, (micros, writes) in totals.items():
+    print('{:<32} {:<6} {:>10.1f} {:>8.0f}'.format('all', action, micros, writes))
+
+  FritzboxInterface.disablePageCache()
+  for server in servers:
+    server.shutdown()
+  statedir.cleanup()
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+  ringbuffer_benchmark - shows that appending to a FritzboxRingBuffer takes
+  constant time, however full the buffer is
+  Like Munin, this plugin is licensed under the GNU GPL v2 license
+  http://www.opensource.org/licenses/GPL-2.0
+
+  Appends a sample per second for longer than a week to a buffer holding a
+  week and reports the time per append in every tenth of the run, the time
+  of a single append from a new process and of reading the latest five
+  minutes. Finally several processes append at once, none of their samples
+  may get lost.
+
+  Usage: tools/ringbuffer_benchmark.py [--days 7] [--processes 4]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from multiprocessing import Process
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from FritzboxRingBuffer import FritzboxRingBuffer
+
+START = 1700000000
+
+class Config:
+  server = 'benchmark'
+
+def appendMany(name, capacity, offset, number):
+  with FritzboxRingBuffer(Config(), name, fields=2, capacity=capacity) as ring:
+    for i in range(number):
+      ring.append(START + offset + i, (i, i))
+
+def main():
+  parser = argparse.ArgumentParser(description='Benchmark the FritzboxRingBuffer')
+  parser.add_argument('--days', type=int, default=7)
+  parser.add_argument('--processes', type=int, default=4)
+  args = parser.parse_args()
+
+  capacity = args.days * 86400
+  samples = capacity + capacity // 10
+  with tempfile.TemporaryDirectory() as statedir:
+    os.environ['MUNIN_PLUGSTATE'] = statedir
+
+    print('{} samples at 1 Hz into a buffer of {}'.format(samples, capacity))
+    with FritzboxRingBuffer(Config(), 'week', fields=2, capacity=capacity) as ring:
+      ring.append(START - 1, (0, 0))
+      step = samples // 10
+      for part in range(10):
+        started = time.perf_counter()
+        for i in range(part * step, (part + 1) * step):
+          ring.append(START + i, (i, i))
+        elapsed = time.perf_counter() - started
+        print('  samples {:>8} - {:>8} {:>6.2f} us per append'.format(part * step, (part + 1) * step, elapsed / step * 1e6))
+
+      started = time.perf_counter()
+      latest = ring.read(since=START + 10 * step - 301)
+      print('read of the latest 5 minutes {:>8.1f} us, {} samples'.format((time.perf_counter() - started) * 1e6, len(latest)))
+
+    started = time.perf_counter()
+    with FritzboxRingBuffer(Config(), 'week', fields=2, capacity=capacity) as ring:
+      ring.append(START + 10 * step, (0, 0))
+    print('append from a new process {:>8.1f} us'.format((time.perf_counter() - started) * 1e6))
+
+    number = 5000
+    processes = [Process(target=appendMany, args=('concurrent', args.processes * number, p * number, number))
+                 for p in range(args.processes)]
+    for process in processes:
+      process.start()
+    for process in processes:
+      process.join()
+    with FritzboxRingBuffer(Config(), 'concurrent', fields=2, capacity=args.processes * number) as ring:
+      stored = len(ring.read())
+    print('{} processes appended {} samples, {} stored'.format(args.processes, args.processes * number, stored))
+    if stored != args.processes * number:
+      sys.exit(1)
+
+if __name__ == "__main__":
+  main()
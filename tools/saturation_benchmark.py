@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+  saturation_benchmark - compares the statistics of fritzbox_link_saturation
+  with the per-series loop they replaced
+  Like Munin, this plugin is licensed under the GNU GPL v2 license
+  http://www.opensource.org/licenses/GPL-2.0
+
+  Reports the time for all six QoS series of the former loop, which only
+  computed the mean, against series_mean, which the plugin uses unless
+  env.saturation_stats is set, and RunningStatistics, which also computes
+  minimum, maximum and 95th percentile in the same pass. The results are
+  checked against a sorted copy of every series.
+
+  Usage: tools/saturation_benchmark.py [--points 20] [--number 2000]
+"""
+
+import argparse
+import math
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# FritzboxConfig reads it when the plugin is imported
+os.environ.setdefault('MUNIN_CONFDIR', '/etc/munin')
+
+from fritzbox_link_saturation import DATA_DN, DATA_UP, series_mean, series_stats
+
+def average_bps(datapoints):
+  """ the former mean of a series """
+  avg = 0
+  for d in datapoints:
+    avg+=d
+  avg = avg//len(datapoints)
+  return avg
+
+def check(series):
+  ordered = sorted(series)
+  stats = series_stats(series)
+  expected = (sum(series) // len(series), ordered[0], ordered[-1], ordered[math.ceil(0.95 * len(series)) - 1])
+  actual = (series_mean(series), stats.minimum, stats.maximum, stats.percentile())
+  assert stats.mean() == actual[0], 'means of {} differ'.format(series)
+  assert actual == expected, 'statistics of {} are {}, expected {}'.format(series, actual, expected)
+
+def main():
+  parser = argparse.ArgumentParser(description='Benchmark the statistics of fritzbox_link_saturation')
+  parser.add_argument('--points', type=int, default=20)
+  parser.add_argument('--number', type=int, default=2000)
+  args = parser.parse_args()
+
+  for length in list(range(1, 45)) + [args.points]:
+    check([random.randint(0, 3) for _ in range(length)])
+    check([random.randint(0, 10 ** 9) for _ in range(length)])
+
+  jsondata = {d: [random.randint(0, 10 ** 7) for _ in range(args.points)] for d in DATA_UP + DATA_DN}
+  for name, function in (('loop (mean only)', average_bps), ('series_mean', series_mean),
+                         ('RunningStatistics', series_stats)):
+    seconds = timeit.timeit(lambda: [function(jsondata[d]) for d in DATA_UP + DATA_DN], number=args.number) / args.number
+    print('{:<20} {:>8.1f} us'.format(name, seconds * 1e6))
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+  targets_benchmark - runs the collector against several fake boxes listed in
+  a fritzbox_targets file and reports how the cycle time scales with the
+  number of workers
+  Like Munin, this plugin is licensed under the GNU GPL v2 license
+  http://www.opensource.org/licenses/GPL-2.0
+
+  Starts a fake box with its own password on 127.0.1.1, 127.0.1.2, ... and
+  runs FritzboxCollector.py --once with every number of workers twice, the
+  first run logging into every box, the second reusing the stored session
+  ids. The collected output of every plugin has to hold the graphs of all
+  boxes.
+
+  Usage: tools/targets_benchmark.py [--boxes 8] [--latency 0.05] [--workers 1 8]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+from benchmark import PLUGINDIR, plugin_environment
+from fakebox import FakeBox, start
+
+def address(box):
+  return '127.0.1.{}'.format(box + 1)
+
+def stats(box, reset=False):
+  with urllib.request.urlopen('http://{}/{}'.format(address(box), '__reset' if reset else '__stats')) as response:
+    return json.load(response)
+
+def writeTargets(filename, boxes):
+  with open(filename, 'w') as targetsfile:
+    targetsfile.write('[DEFAULT]\nfritzbox_user = munin\nfritzbox_use_tls = false\n')
+    for box in range(boxes):
+      targetsfile.write('\n[branch{:02}.example.com]\nfritzbox_ip = {}\nfritzbox_password = secret{}\n'.format(box, address(box), box))
+
+def collect(env, boxes):
+  """run the collector once, returns wall time, exit status and the summed counters of the boxes"""
+  for box in range(boxes):
+    stats(box, reset=True)
+  started = time.perf_counter()
+  process = subprocess.run([sys.executable, os.path.join(PLUGINDIR, 'FritzboxCollector.py'), '--once'],
+                           env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+  elapsed = time.perf_counter() - started
+  counters = [stats(box) for box in range(boxes)]
+  return elapsed, process.returncode, process.stderr.decode('utf-8', 'replace').strip(), {
+    key: sum(c[key] for c in counters) for key in ('requests', 'logins', 'soap_actions')}
+
+def checkOutput(statedir, boxes):
+  """the number of plugins whose collected output misses a box"""
+  collectordir = os.path.join(statedir, 'fritzbox', 'collector')
+  incomplete = 0
+  for filename in sorted(os.listdir(collectordir)):
+    with open(os.path.join(collectordir, filename), 'r') as cachefile:
+      output = cachefile.read()
+    missing = [box for box in range(boxes) if 'multigraph branch{:02}_example_com_'.format(box) not in output]
+    if missing:
+      print('  {} misses the boxes {}'.format(filename, missing))
+      incomplete += 1
+  return incomplete
+
+def main():
+  parser = argparse.ArgumentParser(description='Benchmark polling several boxes from one collector')
+  parser.add_argument('--boxes', type=int, default=8)
+  parser.add_argument('--latency', type=float, default=0.05, help='seconds every fake box adds to every request')
+  parser.add_argument('--workers', type=int, nargs='+', default=[1, 8])
+  args = parser.parse_args()
+
+  servers = []
+  for box in range(args.boxes):
+    servers += start(FakeBox('secret{}'.format(box), latency=args.latency), host=address(box))
+
+  failed = 0
+  print('{:>7} {:>5} {:>9} {:>8} {:>6} {:>6}'.format('workers', 'run', 'wall ms', 'requests', 'soap', 'logins'))
+  for workers in args.workers:
+    with tempfile.TemporaryDirectory() as statedir:
+      env = plugin_environment(statedir, 80)
+      del env['fritzbox_password']
+      env['fritzbox_targets'] = os.path.join(statedir, 'targets.conf')
+      env['fritzbox_targets_workers'] = str(workers)
+      env['fritzbox_collector_jitter'] = '0'
+      writeTargets(env['fritzbox_targets'], args.boxes)
+      for run in (1, 2):
+        elapsed, code, error, counters = collect(env, args.boxes)
+        print('{:>7} {:>5} {:>9.1f} {:>8} {:>6} {:>6}'.format(
+          workers, run, elapsed * 1000, counters['requests'], counters['soap_actions'], counters['logins']))
+        if code != 0 or error:
+          print('  exit code {}: {}'.format(code, error.splitlines()[-1] if error else ''))
+          failed += 1
+      failed += checkOutput(statedir, args.boxes)
+  for server in servers:
+    server.shutdown()
+  sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+  main()
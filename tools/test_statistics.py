@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+  test_statistics - checks FritzboxStatistics and the statistics of
+  fritzbox_link_saturation against sorted copies of random series
+  Like Munin, this plugin is licensed under the GNU GPL v2 license
+  http://www.opensource.org/licenses/GPL-2.0
+
+  The series are decoded and summarized without NumPy, and with it as well
+  if it is installed.
+
+  Usage: python3 -m unittest discover tools
+"""
+
+import math
+import os
+import random
+import sys
+import unittest
+
+from benchmark import PLUGINDIR
+
+if PLUGINDIR not in sys.path:
+  sys.path.insert(0, PLUGINDIR)
+# FritzboxConfig reads it when the plugin is imported
+os.environ.setdefault('MUNIN_CONFDIR', '/etc/munin')
+
+import FritzboxStatistics
+from FritzboxStatistics import RunningStatistics, parsePairs, summarize
+from fritzbox_link_saturation import series_mean, series_stats, unknown
+
+def expected(series, percentile=95):
+  """mean, minimum, maximum and nearest-rank percentile of a sorted copy"""
+  ordered = sorted(series)
+  return (sum(series) // len(series), ordered[0], ordered[-1], ordered[math.ceil(percentile / 100 * len(series)) - 1])
+
+def series():
+  """random series of all lengths up to 45 and of 300 values, with few and many distinct values"""
+  for length in list(range(1, 45)) + [300]:
+    yield [random.randint(0, 3) for _ in range(length)]
+    yield [random.randint(0, 10 ** 9) for _ in range(length)]
+
+class StatisticsTest(unittest.TestCase):
+  numpy = None
+
+  @classmethod
+  def setUpClass(cls):
+    cls.numpy = FritzboxStatistics.numpy
+
+  @classmethod
+  def tearDownClass(cls):
+    FritzboxStatistics.numpy = cls.numpy
+
+  def modes(self):
+    """run the following checks without NumPy and with it, if it is installed"""
+    FritzboxStatistics.numpy = None
+    yield 'python'
+    if FritzboxStatistics.useNumpy():
+      yield 'numpy'
+
+  def test_parsePairs(self):
+    for mode in self.modes():
+      with self.subTest(mode=mode):
+        first, second = parsePairs('0,0,0,12:3,14:0,7:100', skip=3)
+        self.assertEqual((list(first), list(second)), ([12, 14, 7], [3, 0, 100]))
+        first, second = parsePairs('12:3,14:0,7:100', count=2)
+        self.assertEqual((list(first), list(second)), ([12, 14], [3, 0]))
+        first, second = parsePairs('1;2,3;4', separator=';')
+        self.assertEqual((list(first), list(second)), ([1, 3], [2, 4]))
+        first, second = parsePairs('0,0,0', skip=3)
+        self.assertEqual((len(first), len(second)), (0, 0))
+
+  def test_parsePairs_incomplete(self):
+    for mode in self.modes():
+      with self.subTest(mode=mode):
+        self.assertRaises(ValueError, parsePairs, '12:3,14')
+        self.assertRaises(ValueError, parsePairs, '12:3:4')
+
+  def test_summarize(self):
+    for mode in self.modes():
+      for values in series():
+        with self.subTest(mode=mode, values=values):
+          mean, _, maximum, percentile = expected(values)
+          pairs = ','.join('{}:0'.format(v) for v in values)
+          decoded = parsePairs(pairs)[0]
+          self.assertEqual(summarize(decoded), (mean, maximum, percentile))
+          self.assertEqual(summarize(decoded, meanOnly=True), (mean, None, None))
+          self.assertEqual(summarize(values), (mean, maximum, percentile))
+
+  def test_summarize_empty(self):
+    for mode in self.modes():
+      with self.subTest(mode=mode):
+        self.assertIsNone(summarize(parsePairs('')[0]))
+        self.assertIsNone(summarize([], meanOnly=True))
+
+  def test_running(self):
+    for values in series():
+      with self.subTest(values=values):
+        stats = RunningStatistics(len(values))
+        # in two parts, as a series may arrive
+        stats.update(values[:len(values) // 2])
+        stats.update(values[len(values) // 2:])
+        self.assertEqual((stats.mean(), stats.minimum, stats.maximum, stats.percentile()), expected(values))
+        self.assertEqual(stats.count, len(values))
+
+  def test_running_percentile(self):
+    values = list(range(1, 101))
+    random.shuffle(values)
+    for percentile in (1, 50, 95, 100):
+      with self.subTest(percentile=percentile):
+        stats = RunningStatistics(len(values), percentile=percentile)
+        stats.update(values)
+        self.assertEqual(stats.percentile(), percentile)
+
+  def test_running_empty(self):
+    stats = RunningStatistics(0)
+    stats.update([])
+    self.assertEqual((stats.mean(), stats.minimum, stats.maximum, stats.percentile()), (None, None, None, None))
+
+  def test_saturation(self):
+    for values in series():
+      with self.subTest(values=values):
+        self.assertEqual(series_mean(values), series_stats(values).mean())
+    self.assertEqual(unknown(series_mean([])), 'U')
+    self.assertEqual(unknown(series_stats([]).percentile()), 'U')
+    self.assertEqual(unknown(0), 0)
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+  test_traffic - counts the TR-064 calls fritzbox_traffic makes against the
+  SOAP answers of the fake box
+  Like Munin, this plugin is licensed under the GNU GPL v2 license
+  http://www.opensource.org/licenses/GPL-2.0
+
+  fritzconnection checks its cached descriptions on port 80, so the fake box
+  listens on 127.0.0.1:80 and 49000.
+
+  Usage: python3 -m unittest discover tools
+"""
+
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import unittest
+
+from benchmark import PLUGINDIR, plugin_environment, stats
+from fakebox import FakeBox, start
+
+PORT = 80
+# the HTTP calls of a run: fritzconnection checks the model and firmware of
+# the box before it uses the cached descriptions, then the action
+HTTP_CALLS = {'/jason_boxinfo.xml': 1, '/igdupnp/control/WANCommonIFC1': 1}
+
+class TrafficTest(unittest.TestCase):
+  servers = None
+  statedir = None
+  environ = None
+
+  @classmethod
+  def setUpClass(cls):
+    cls.servers = start(FakeBox('secret'), port=PORT)
+    cls.statedir = tempfile.TemporaryDirectory()
+    cls.environ = dict(os.environ)
+    os.environ.update(plugin_environment(cls.statedir.name, PORT))
+    if PLUGINDIR not in sys.path:
+      sys.path.insert(0, PLUGINDIR)
+
+  @classmethod
+  def tearDownClass(cls):
+    os.environ.clear()
+    os.environ.update(cls.environ)
+    for server in cls.servers:
+      server.shutdown()
+      server.server_close()
+    cls.statedir.cleanup()
+
+  def run_plugin(self, config):
+    """run config or fetch in this process, returns the output and the counters of the box"""
+    import fritzbox_traffic
+
+    stats(PORT, reset=True)
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+      if config:
+        fritzbox_traffic.FritzboxTraffic().printConfig()
+      else:
+        fritzbox_traffic.FritzboxTraffic().printTraffic()
+    return output.getvalue(), stats(PORT)
+
+  def test_cycle(self):
+    """config and fetch of a munin cycle read the link properties once and the rates with one action"""
+    # the first connection downloads the descriptions, later ones read them from the state directory
+    self.run_plugin(False)
+    os.remove(os.path.join(self.statedir.name, 'fritzbox', '127.0.0.1__link_properties.json'))
+
+    output, counters = self.run_plugin(True)
+    self.assertIn('up.max 40000000\n', output)
+    self.assertIn('down.max 100000000\n', output)
+    self.assertEqual(counters['actions'], {'GetCommonLinkProperties': 1})
+    self.assertEqual(counters['pages'], HTTP_CALLS)
+
+    output, counters = self.run_plugin(False)
+    self.assertEqual(output, 'down.value 312500\nup.value 12500\nmaxdown.value 100000000\nmaxup.value 40000000\n')
+    self.assertEqual(counters['actions'], {'GetAddonInfos': 1})
+    self.assertEqual(counters['pages'], HTTP_CALLS)
+
+  def test_remove_max(self):
+    """without the maximum, fetch needs no link properties"""
+    os.environ['traffic_remove_max'] = '1'
+    try:
+      self.run_plugin(False)
+      os.remove(os.path.join(self.statedir.name, 'fritzbox', '127.0.0.1__link_properties.json'))
+      output, counters = self.run_plugin(False)
+    finally:
+      del os.environ['traffic_remove_max']
+    self.assertEqual(output, 'down.value 312500\nup.value 12500\n')
+    self.assertEqual(counters['actions'], {'GetAddonInfos': 1})
+
+if __name__ == "__main__":
+  unittest.main()